@@ -0,0 +1,339 @@
+# app/api.py
+"""
+Serviciu HTTP (ASGI) pentru generarea NIR din cod, fără UI.
+
+    python -m app.api --host 0.0.0.0 --port 8080 --workers 4 --queue 16
+
+    POST /parse   corp = XML UBL  -> JSON (payload-ul parserului)
+    POST /pdf     corp = XML UBL  -> NIR PDF
+    POST /xlsx    corp = XML UBL  -> NIR XLSX
+    POST /docx    corp = XML UBL  -> NIR DOCX (șablonul din NIR_DOCX_TEMPLATE sau cel inclus)
+    GET  /health                  -> JSON cu starea pool-ului
+    GET  /metrics                 -> text Prometheus (API + etapele măsurate în workeri)
+
+Munca CPU (parsare, PDF, XLSX, DOCX) rulează într-un pool de procese mărginit. Exporturile
+se scriu de worker într-un fișier temporar și se servesc de pe disc (șters după
+răspuns): documentele mari nu trec ca bytes prin IPC și nu se copiază în memorie. Peste
+`workers + queue` cereri în lucru, serviciul răspunde imediat 429 cu `Retry-After`
+în loc să acumuleze o coadă nelimitată; corpurile peste `max_bytes` -> 413.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.background import BackgroundTask
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from app import core
+from app.batch import available_workers
+from app.metrics import METRICS, Span, collect
+from app.models.lines import plain_payload
+from app.nir import filename_safe_id, s
+from app.parsers.cache import default_cache
+
+KINDS = {
+    "parse": "application/json",
+    "pdf":   "application/pdf",
+    "xlsx":  "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "docx":  "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+
+
+# ------------------------ worker (rulează în procesele din pool) ------------------------
+class InvoiceError(ValueError):
+    """XML-ul primit nu poate fi transformat în NIR (răspuns 422)."""
+
+
+def payload_json(inv: Dict[str, Any]) -> bytes:
+    """Payload-ul parserului ca JSON."""
+    return json.dumps(plain_payload(inv), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _parse(raw: bytes) -> Dict[str, Any]:
+    try:
+        return default_cache().get_or_parse(raw)
+    except Exception as e:
+        raise InvoiceError(f"XML invalid: {type(e).__name__}: {e}") from None
+
+
+def render(kind: str, raw: bytes) -> Tuple[bytes, str]:
+    """Parse + export pentru un XML; întoarce (corp, numărul facturii)."""
+    inv = _parse(raw)
+    invoice_id = s(inv.get("id"))
+    if kind == "parse":
+        return payload_json(inv), invoice_id
+    return core.render(kind, inv), invoice_id
+
+
+def render_file(kind: str, raw: bytes) -> Tuple[str, str]:
+    """Ca `render` pentru pdf / xlsx, dar exportul rămâne într-un fișier temporar; întoarce (cale, număr factură)."""
+    inv = _parse(raw)
+    fd, path = tempfile.mkstemp(prefix="nir_", suffix=f".{kind}")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            core.render_to(f, kind, inv)
+    except BaseException:
+        _unlink(path)
+        raise
+    return path, s(inv.get("id"))
+
+
+def _init_worker(metrics_mode: str) -> None:
+    """Initializer: instrumentarea ca în procesul API (serverul forkserver are mediul de la pornirea lui) + fonturile."""
+    os.environ["NIR_METRICS"] = metrics_mode
+    METRICS.configure_from_env()
+    core.preload_pdf()
+
+
+def job(kind: str, raw: bytes) -> Tuple[Any, str, List[Span]]:
+    """
+    Ce rulează în worker: (corp sau cale, număr factură, span-uri). Etapele se măsoară
+    în worker, deci span-urile se întorc cu rezultatul și intră în /metrics al procesului API.
+    """
+    with collect() as spans:
+        body, invoice_id = render(kind, raw) if kind == "parse" else render_file(kind, raw)
+    return body, invoice_id, spans
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+# ------------------------ serviciu ------------------------
+class NirService:
+    """Pool-ul de procese, controlul de admisie și contoarele expuse pe /metrics."""
+
+    def __init__(self, workers: Optional[int] = None, queue: Optional[int] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES, timeout_s: Optional[float] = None):
+        self.workers   = max(1, workers or available_workers())
+        self.queue     = max(0, self.workers * 2 if queue is None else queue)
+        self.max_bytes = max_bytes
+        self.timeout_s = timeout_s
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self._lock     = threading.Lock()
+        self.in_flight = 0
+        self.started   = time.time()
+        self.counters: Dict[Tuple[str, int], int] = {}
+        self.seconds:  Dict[str, float] = {}
+
+    @property
+    def limit(self) -> int:
+        return self.workers + self.queue
+
+    def start(self) -> None:
+        if self.pool is None:
+            # workerii încarcă fpdf la pornire, nu la primul PDF; forkserver:
+            # fork direct din serverul uvicorn (cu fire active) poate moșteni lock-uri ținute
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(os.environ.get("NIR_METRICS", ""),),
+                                            mp_context=multiprocessing.get_context("forkserver"))
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+    # ---- admisie ----
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def count(self, route: str, status: int, seconds: float = 0.0) -> None:
+        with self._lock:
+            self.counters[(route, status)] = self.counters.get((route, status), 0) + 1
+            self.seconds[route] = self.seconds.get(route, 0.0) + seconds
+
+    # ---- rulare ----
+    async def run(self, kind: str, raw: bytes) -> Tuple[Any, str]:
+        """
+        (corp, număr factură) pentru `parse`; (cale fișier temporar, număr factură) pentru exporturi.
+
+        Preia slotul de admisie al cererii și îl eliberează abia când termină worker-ul:
+        la 504 (sau la o cerere abandonată) procesul din pool lucrează în continuare
+        (`wait_for` nu-l poate opri), deci slotul rămâne ocupat și limita `workers + queue`
+        se respectă.
+        """
+        try:
+            if self.pool is None:
+                raise RuntimeError("Pool-ul de procese nu e pornit")
+            cf = self.pool.submit(job, kind, raw)
+        except BaseException:
+            self.release()
+            raise
+        # înaintea lui wrap_future: slotul e liber până se trezește cererea
+        cf.add_done_callback(lambda _: self.release())
+        try:
+            fut = asyncio.wrap_future(cf)
+            body, invoice_id, spans = await asyncio.wait_for(fut, self.timeout_s) if self.timeout_s else await fut
+        except BaseException:
+            if kind != "parse":  # răspunsul nu mai pleacă: fișierul se șterge când termină worker-ul
+                cf.add_done_callback(_discard_file)
+            raise
+        METRICS.absorb(spans)
+        return body, invoice_id
+
+    # ---- stare ----
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "status":    "ok" if self.pool is not None else "stopped",
+                "workers":   self.workers,
+                "queue":     self.queue,
+                "in_flight": self.in_flight,
+                "uptime_s":  round(time.time() - self.started, 1),
+            }
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            counters = dict(self.counters)
+            seconds  = dict(self.seconds)
+            in_flight = self.in_flight
+        out = [
+            "# HELP nir_api_requests_total Cereri HTTP după rută și cod de răspuns",
+            "# TYPE nir_api_requests_total counter",
+        ]
+        for (route, status), n in sorted(counters.items()):
+            out.append(f'nir_api_requests_total{{route="{route}",status="{status}"}} {n}')
+        out += ["# HELP nir_api_seconds_total Timp total de răspuns după rută (s)",
+                "# TYPE nir_api_seconds_total counter"]
+        for route, sec in sorted(seconds.items()):
+            out.append(f'nir_api_seconds_total{{route="{route}"}} {sec:.6f}')
+        out += ["# HELP nir_api_in_flight Cereri în lucru sau în coadă", "# TYPE nir_api_in_flight gauge",
+                f"nir_api_in_flight {in_flight}",
+                "# HELP nir_api_capacity Limita de admisie (workers + coadă)", "# TYPE nir_api_capacity gauge",
+                f"nir_api_capacity {self.limit}"]
+        return "\n".join(out) + "\n" + METRICS.prometheus_text()
+
+
+def _discard_file(cf) -> None:
+    if not cf.cancelled() and cf.exception() is None:
+        _unlink(cf.result()[0])
+
+
+def _error(status: int, msg: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse({"error": msg}, status_code=status, headers=headers)
+
+
+async def _read_limited(request: Request, max_bytes: int) -> Optional[bytes]:
+    """Corpul cererii, sau None dacă depășește `max_bytes` (fără să-l citească tot în memorie)."""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes:
+        return None
+    buf = bytearray()
+    async for chunk in request.stream():
+        buf += chunk
+        if len(buf) > max_bytes:
+            return None
+    return bytes(buf)
+
+
+def create_app(service: Optional[NirService] = None) -> Starlette:
+    service = service or NirService()
+
+    async def convert(request: Request) -> Response:
+        kind = request.url.path.strip("/")
+        t0 = time.perf_counter()
+        status = 500
+        owned = True  # slotul de admisie; după `service.run` îl eliberează worker-ul, la terminare
+        if not service.try_acquire():
+            status = 429
+            service.count(kind, status)
+            return _error(429, "Serviciu ocupat, reîncercați", {"Retry-After": "1"})
+        try:
+            raw = await _read_limited(request, service.max_bytes)
+            if raw is None:
+                status = 413
+                return _error(413, f"Corp prea mare (max {service.max_bytes} octeți)")
+            if not raw.strip():
+                status = 400
+                return _error(400, "Corp gol: trimiteți XML-ul UBL")
+            owned = False
+            try:
+                body, invoice_id = await service.run(kind, raw)
+            except InvoiceError as e:
+                status = 422
+                return _error(422, str(e))
+            except asyncio.TimeoutError:
+                status = 504
+                return _error(504, "Timp de procesare depășit")
+            status = 200
+            if kind == "parse":
+                return Response(body, media_type=KINDS[kind])
+            headers = {"Content-Disposition": f'attachment; filename="NIR_{filename_safe_id(invoice_id)}.{kind}"'}
+            return FileResponse(body, media_type=KINDS[kind], headers=headers,
+                                background=BackgroundTask(_unlink, body))
+        finally:
+            if owned:
+                service.release()
+            service.count(kind, status, time.perf_counter() - t0)
+
+    async def health(request: Request) -> Response:
+        h = service.health()
+        return JSONResponse(h, status_code=200 if h["status"] == "ok" else 503)
+
+    async def metrics(request: Request) -> Response:
+        return PlainTextResponse(service.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+    @asynccontextmanager
+    async def lifespan(app):
+        service.start()
+        try:
+            yield
+        finally:
+            service.close()
+
+    app = Starlette(
+        routes=[Route(f"/{k}", convert, methods=["POST"]) for k in KINDS]
+        + [Route("/health", health), Route("/metrics", metrics)],
+        lifespan=lifespan,
+    )
+    app.state.service = service
+    return app
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    import uvicorn
+
+    ap = argparse.ArgumentParser(prog="python -m app.api", description="API HTTP: XML UBL -> JSON / NIR PDF / XLSX")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("-w", "--workers", type=int, default=int(os.environ.get("NIR_API_WORKERS", "0")) or None,
+                    help="procese de randare (implicit: nucleele disponibile)")
+    ap.add_argument("-q", "--queue", type=int, default=None, help="cereri în așteptare peste workers (implicit 2×workers)")
+    ap.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES, help="mărimea maximă a XML-ului")
+    ap.add_argument("--timeout", type=float, default=None, help="limită de timp per cerere (s)")
+    args = ap.parse_args(argv)
+
+    service = NirService(args.workers, args.queue, args.max_bytes, args.timeout)
+    print(f"NIR API pe http://{args.host}:{args.port} — {service.workers} procese, coadă {service.queue}",
+          file=sys.stderr)
+    uvicorn.run(create_app(service), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
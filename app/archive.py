@@ -0,0 +1,282 @@
+# app/archive.py
+"""
+Arhivă SQLite a facturilor parsate: antet, părți, totaluri, sub-totaluri TVA și linii.
+
+    arch = Archive("nir_arhiva.sqlite")
+    pk, new = arch.add(inv, raw=xml_bytes, source="f1.xml")
+    arch.by_supplier_month("RO1234567", 2025, 10)      # NIR-urile unui furnizor într-o lună
+    arch.duplicates()                                   # aceeași factură primită de mai multe ori
+
+Fiecare factură (cu liniile ei) se scrie într-o singură tranzacție, liniile prin
+`executemany` direct din coloanele `LineBlock`. Indexuri pe CUI furnizor/cumpărător
+(+ dată), data emiterii, numărul facturii și hash-ul conținutului (unic: același
+XML nu se arhivează de două ori).
+
+CUI-urile se compară normalizat (fără „RO”, spații, zerouri de umplutură), deci
+„RO 1234567” și „1234567” găsesc aceleași facturi. Un CUI lipsă („”, „-”, „RO”)
+se arhivează ca NULL și nu leagă între ele facturi fără furnizor identificat.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from itertools import repeat
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.models.lines import LineBlock, plain_payload
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    pk               INTEGER PRIMARY KEY,
+    content_hash     TEXT NOT NULL UNIQUE,
+    invoice_id       TEXT NOT NULL,
+    issue_date       TEXT NOT NULL,
+    currency         TEXT NOT NULL,
+    supplier_name    TEXT, supplier_cui TEXT, supplier_key TEXT, supplier_address TEXT,
+    buyer_name       TEXT, buyer_cui    TEXT, buyer_key    TEXT, buyer_address    TEXT,
+    net REAL, vat REAL, gross REAL, payable REAL,
+    calc_net_from_lines REAL, calc_vat_from_lines REAL,
+    line_count       INTEGER NOT NULL,
+    validations      TEXT NOT NULL,
+    attachments      TEXT NOT NULL,
+    source           TEXT,
+    archived_at      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_invoices_supplier ON invoices (supplier_key, issue_date);
+CREATE INDEX IF NOT EXISTS ix_invoices_buyer    ON invoices (buyer_key, issue_date);
+CREATE INDEX IF NOT EXISTS ix_invoices_date     ON invoices (issue_date);
+CREATE INDEX IF NOT EXISTS ix_invoices_id       ON invoices (invoice_id, supplier_key);
+
+CREATE TABLE IF NOT EXISTS tax_subtotals (
+    invoice_pk INTEGER NOT NULL REFERENCES invoices(pk) ON DELETE CASCADE,
+    rate REAL, taxable REAL, tax REAL
+);
+CREATE INDEX IF NOT EXISTS ix_tax_subtotals_invoice ON tax_subtotals (invoice_pk);
+
+CREATE TABLE IF NOT EXISTS lines (
+    invoice_pk INTEGER NOT NULL REFERENCES invoices(pk) ON DELETE CASCADE,
+    line_no    INTEGER NOT NULL,
+    name TEXT, qty REAL, unit TEXT, price REAL, line_net REAL, vat_pct REAL,
+    PRIMARY KEY (invoice_pk, line_no)
+) WITHOUT ROWID;
+"""
+
+_HEADER_COLS = ("pk", "invoice_id", "issue_date", "currency", "supplier_name", "supplier_cui", "buyer_name",
+                "buyer_cui", "net", "vat", "gross", "payable", "line_count", "source", "archived_at", "content_hash")
+
+
+def normalize_cui(cui: Any) -> Optional[str]:
+    """„RO 01234567” -> „1234567”; None dacă nu rămâne nimic (ex. „-”, „RO”, „”)."""
+    raw = re.sub(r"[\s.\-]", "", str(cui or "")).upper()
+    if raw.startswith("RO"):
+        raw = raw[2:]
+    if raw.isdigit():
+        raw = raw.lstrip("0")
+    return raw or None
+
+
+def content_hash(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _month_range(year: int, month: int) -> Tuple[str, str]:
+    nxt = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year:04d}-{month:02d}-01", f"{nxt[0]:04d}-{nxt[1]:02d}-01"
+
+
+class Archive:
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        # autocommit; tranzacțiile se deschid explicit (BEGIN IMMEDIATE) la scriere
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30.0)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            # WAL: cititorii nu blochează scrierile (mai mulți workeri de lot pe aceeași bază)
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+        with self._lock:
+            self.conn.executescript(_SCHEMA)
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---- scriere ----
+    def _insert(self, inv: Dict[str, Any], digest: str, source: str, now: str) -> Tuple[int, bool]:
+        cur = self.conn.execute("SELECT pk FROM invoices WHERE content_hash = ?", (digest,)).fetchone()
+        if cur is not None:
+            return cur[0], False
+
+        sp = inv.get("supplier") or {}
+        bp = inv.get("buyer") or {}
+        t  = inv.get("totals") or {}
+        lines = inv.get("lines") or []
+        pk = self.conn.execute(
+            "INSERT INTO invoices (content_hash, invoice_id, issue_date, currency,"
+            " supplier_name, supplier_cui, supplier_key, supplier_address,"
+            " buyer_name, buyer_cui, buyer_key, buyer_address,"
+            " net, vat, gross, payable, calc_net_from_lines, calc_vat_from_lines,"
+            " line_count, validations, attachments, source, archived_at)"
+            " VALUES (?,?,?,?, ?,?,?,?, ?,?,?,?, ?,?,?,?,?,?, ?,?,?,?,?)",
+            (digest, str(inv.get("id") or ""), str(inv.get("issue_date") or ""), str(inv.get("currency") or ""),
+             sp.get("name"), sp.get("cui"), normalize_cui(sp.get("cui")), sp.get("address"),
+             bp.get("name"), bp.get("cui"), normalize_cui(bp.get("cui")), bp.get("address"),
+             t.get("net"), t.get("vat"), t.get("gross"), t.get("payable"),
+             t.get("calc_net_from_lines"), t.get("calc_vat_from_lines"),
+             len(lines), json.dumps(inv.get("validations") or [], ensure_ascii=False),
+             json.dumps(inv.get("attachments") or [], ensure_ascii=False), source, now),
+        ).lastrowid
+
+        self.conn.executemany(
+            "INSERT INTO tax_subtotals (invoice_pk, rate, taxable, tax) VALUES (?,?,?,?)",
+            [(pk, st.get("rate"), st.get("taxable"), st.get("tax")) for st in t.get("tax_subtotals") or []],
+        )
+        if isinstance(lines, LineBlock):
+            rows = zip(repeat(pk), range(1, len(lines) + 1), lines.name, lines.qty, lines.unit,
+                       lines.price, lines.line_net, lines.vat_pct)
+        else:
+            rows = ((pk, i, r.get("name"), r.get("qty"), r.get("unit"), r.get("price"), r.get("line_net"),
+                     r.get("vat_pct")) for i, r in enumerate(lines, 1))
+        self.conn.executemany(
+            "INSERT INTO lines (invoice_pk, line_no, name, qty, unit, price, line_net, vat_pct)"
+            " VALUES (?,?,?,?,?,?,?,?)",
+            rows,
+        )
+        return pk, True
+
+    def add_many(self, items: Iterable[Tuple[Dict[str, Any], Optional[bytes], str]]) -> List[Tuple[int, bool]]:
+        """
+        Arhivează (payload, xml, sursă) într-o singură tranzacție. Fără XML, hash-ul se
+        calculează din payload. Întoarce (pk, nou) per factură; `nou=False` = exista deja.
+        """
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        out: List[Tuple[int, bool]] = []
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for inv, raw, source in items:
+                    digest = content_hash(raw if raw is not None else _payload_bytes(inv))
+                    out.append(self._insert(inv, digest, source, now))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return out
+
+    def add(self, inv: Dict[str, Any], raw: Optional[bytes] = None, source: str = "") -> Tuple[int, bool]:
+        return self.add_many([(inv, raw, source)])[0]
+
+    # ---- citire ----
+    def _headers(self, where: str, params: Tuple[Any, ...]) -> List[Dict[str, Any]]:
+        sql = f"SELECT {', '.join(_HEADER_COLS)} FROM invoices WHERE {where} ORDER BY issue_date, invoice_id, pk"
+        with self._lock:
+            return [dict(r) for r in self.conn.execute(sql, params)]
+
+    def find(self, invoice_id: Optional[str] = None, supplier_cui: Optional[str] = None,
+             buyer_cui: Optional[str] = None, date_from: Optional[str] = None,
+             date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Antetele facturilor după criteriile date (toate opționale; `date_to` exclusiv, ISO AAAA-LL-ZZ)."""
+        where, params = ["1=1"], []
+        if invoice_id is not None:
+            where.append("invoice_id = ?"); params.append(invoice_id)
+        if supplier_cui is not None:
+            where.append("supplier_key IS ?"); params.append(normalize_cui(supplier_cui))
+        if buyer_cui is not None:
+            where.append("buyer_key IS ?"); params.append(normalize_cui(buyer_cui))
+        if date_from is not None:
+            where.append("issue_date >= ?"); params.append(date_from)
+        if date_to is not None:
+            where.append("issue_date < ?"); params.append(date_to)
+        return self._headers(" AND ".join(where), tuple(params))
+
+    def by_supplier_month(self, supplier_cui: str, year: int, month: int) -> List[Dict[str, Any]]:
+        """Facturile (NIR-urile) unui furnizor emise în luna dată."""
+        start, end = _month_range(year, month)
+        return self.find(supplier_cui=supplier_cui, date_from=start, date_to=end)
+
+    def by_hash(self, raw: bytes) -> Optional[Dict[str, Any]]:
+        found = self._headers("content_hash = ?", (content_hash(raw),))
+        return found[0] if found else None
+
+    def duplicates(self) -> List[Dict[str, Any]]:
+        """
+        Aceeași factură (furnizor + număr) arhivată din XML-uri diferite — retransmiteri,
+        corecturi sau dubluri din SPV. Copiile identice byte cu byte nu ajung aici (hash unic),
+        nici facturile fără CUI de furnizor (nu se știe dacă e același emitent).
+        """
+        sql = ("SELECT supplier_key, invoice_id, COUNT(*) AS copies, GROUP_CONCAT(pk) AS pks"
+               " FROM invoices WHERE invoice_id <> '' AND supplier_key IS NOT NULL"
+               " GROUP BY supplier_key, invoice_id HAVING COUNT(*) > 1 ORDER BY supplier_key, invoice_id")
+        with self._lock:
+            rows = [dict(r) for r in self.conn.execute(sql)]
+        for r in rows:
+            r["pks"] = [int(p) for p in r["pks"].split(",")]
+        return rows
+
+    def get(self, pk: int) -> Optional[Dict[str, Any]]:
+        """Payload-ul complet (forma parserului, liniile ca LineBlock) al unei facturi arhivate."""
+        with self._lock:
+            h = self.conn.execute("SELECT * FROM invoices WHERE pk = ?", (pk,)).fetchone()
+            if h is None:
+                return None
+            subs = self.conn.execute("SELECT rate, taxable, tax FROM tax_subtotals WHERE invoice_pk = ?"
+                                     " ORDER BY rowid", (pk,)).fetchall()
+            rows = self.conn.execute("SELECT name, qty, unit, price, line_net, vat_pct FROM lines"
+                                     " WHERE invoice_pk = ? ORDER BY line_no", (pk,)).fetchall()
+        lines = LineBlock()
+        for r in rows:
+            lines.append(r[0] or "", r[1] or 0.0, r[2] or "", r[3] or 0.0, r[4] or 0.0, r[5] or 0.0)
+        return {
+            "id": h["invoice_id"], "issue_date": h["issue_date"], "currency": h["currency"],
+            "supplier": {"name": h["supplier_name"], "cui": h["supplier_cui"], "address": h["supplier_address"]},
+            "buyer":    {"name": h["buyer_name"], "cui": h["buyer_cui"], "address": h["buyer_address"]},
+            "totals": {
+                "net": h["net"], "vat": h["vat"], "gross": h["gross"], "payable": h["payable"],
+                "calc_net_from_lines": h["calc_net_from_lines"], "calc_vat_from_lines": h["calc_vat_from_lines"],
+                "tax_subtotals": [dict(s) for s in subs],
+            },
+            "lines": lines,
+            "attachments": json.loads(h["attachments"]),
+            "validations": json.loads(h["validations"]),
+        }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+
+
+def _payload_bytes(inv: Dict[str, Any]) -> bytes:
+    return json.dumps(plain_payload(inv), ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+
+
+# ------------------------ instanță implicită per proces ------------------------
+_DEFAULT: Optional[Archive] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_archive() -> Optional[Archive]:
+    """Arhiva procesului din NIR_ARCHIVE_DB, sau None dacă variabila nu e setată."""
+    global _DEFAULT
+    path = os.environ.get("NIR_ARCHIVE_DB")
+    if not path:
+        return None
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None or _DEFAULT.path != path:
+            _DEFAULT = Archive(path)
+        return _DEFAULT
@@ -0,0 +1,456 @@
+# app/batch.py
+"""
+Procesare în lot: un director sau o arhivă ZIP cu XML-uri e-Factura -> NIR PDF/XLSX.
+
+    python -m app.batch facturi/ -o iesire/
+    python -m app.batch facturi_octombrie.zip -o iesire/ --workers 8 --no-xlsx
+    python -m app.batch descarcari_spv/ -o iesire/      # director cu ZIP-urile descărcate din SPV
+    python -m app.batch facturi/ -o iesire/ --docx --docx-template sablon_nir.docx
+
+Arhivele din SPV conțin factura și semnătura ANAF (`semnatura_*.xml`); semnătura se
+ignoră, iar factura se parsează direct din arhivă (flux de membru ZIP, fără fișiere
+temporare). Directoarele pot amesteca XML-uri și ZIP-uri.
+
+Fiecare fișier trece prin parser -> tabel NIR -> export, într-un pool de procese
+dimensionat după nucleele disponibile; fișierele merg la workeri în grupuri mici,
+validate împreună (`rules.validate_batch`). La final se scrie `manifest.json` cu
+statusul și timpii pe fiecare fișier. Șablonul DOCX se compilează o singură dată
+în fiecare worker și se refolosește pentru toate facturile lui.
+
+Același worker servește și UI-ul (upload multiplu): job-urile pot purta conținutul
+XML în memorie (`Job.data`), iar fără `out_dir` exporturile rămân în intrarea de
+manifest (`files`), de unde `zip_outputs` le pune într-o singură arhivă.
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app import core
+from app.archive import Archive
+from app.metrics import METRICS, collect
+from app.nir import filename_safe_id
+from app.parsers.ubl_stream import Source, parse_invoice_stream
+from app.rules import validate_batch
+
+MANIFEST_NAME = "manifest.json"
+SIGNATURE_PREFIX = "semnatura"  # SPV: <id>.xml = factura, semnatura_<id>.xml = semnătura ANAF
+
+
+@dataclass(frozen=True)
+class Job:
+    """Un fișier de procesat: cale pe disc, membru dintr-o arhivă ZIP sau conținut în memorie."""
+    source: str                     # cale afișată în manifest (relativă la intrare)
+    path: str                       # fișierul de pe disc (XML sau ZIP); "" pentru `data`
+    member: Optional[str] = None    # numele din arhivă, dacă e cazul
+    out_dir: Optional[str] = "."    # None -> exporturile rămân în memorie (`entry["files"]`)
+    pdf: bool = True
+    xlsx: bool = True
+    data: Optional[bytes] = None    # XML-ul deja citit (upload)
+    archive: Optional[str] = None   # baza SQLite în care se arhivează payload-ul (app/archive.py)
+    docx: bool = False
+    docx_template: Optional[str] = None  # șablonul Word (implicit NIR_DOCX_TEMPLATE / cel inclus)
+
+
+def available_workers() -> int:
+    """Nucleele pe care procesul are voie să ruleze (cgroup/affinity), nu cele fizice."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+# ------------------------ colectare intrări ------------------------
+def is_signature_member(name: str) -> bool:
+    return os.path.basename(name).lower().startswith(SIGNATURE_PREFIX)
+
+
+def invoice_members(zf: zipfile.ZipFile) -> List[str]:
+    """Membrii XML de factură dintr-o arhivă (fără directoare și fără semnăturile SPV)."""
+    return [info.filename for info in zf.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(".xml") and not is_signature_member(info.filename)]
+
+
+def iter_jobs(input_path: str, out_dir: Optional[str], pdf: bool = True, xlsx: bool = True,
+              archive: Optional[str] = None, docx: bool = False,
+              docx_template: Optional[str] = None) -> Iterator[Job]:
+    """
+    Job-uri din fișier XML, arhivă ZIP sau director (recursiv, inclusiv ZIP-urile din el).
+    `out_dir=None`: exporturile rămân în memorie (`entry["files"]`), ca la upload —
+    folosit de `scan` și `book`, care nu scriu fișiere per factură.
+    """
+    extra = dict(archive=archive, docx=docx, docx_template=docx_template)
+    p = Path(input_path)
+    if p.is_dir():
+        for f in sorted(p.rglob("*")):
+            if not f.is_file():
+                continue
+            rel = str(f.relative_to(p))
+            suffix = f.suffix.lower()
+            if suffix == ".xml" and not is_signature_member(f.name):
+                yield Job(rel, str(f), None, out_dir, pdf, xlsx, **extra)
+            elif suffix == ".zip" and zipfile.is_zipfile(f):
+                with zipfile.ZipFile(f) as zf:
+                    for member in invoice_members(zf):
+                        yield Job(f"{rel}/{member}", str(f), member, out_dir, pdf, xlsx, **extra)
+    elif zipfile.is_zipfile(p):
+        with zipfile.ZipFile(p) as zf:
+            for member in invoice_members(zf):
+                yield Job(member, str(p), member, out_dir, pdf, xlsx, **extra)
+    elif p.is_file():
+        yield Job(p.name, str(p), None, out_dir, pdf, xlsx, **extra)
+    else:
+        raise FileNotFoundError(f"Intrare inexistentă: {input_path}")
+
+
+def jobs_from_uploads(uploads: Iterable[Tuple[str, bytes]], pdf: bool = True, xlsx: bool = True,
+                      archive: Optional[str] = None, docx: bool = False,
+                      docx_template: Optional[str] = None) -> List[Job]:
+    """Job-uri în memorie din fișiere încărcate (nume, conținut): XML-uri și/sau arhive ZIP cu XML-uri."""
+    jobs: List[Job] = []
+    for name, data in uploads:
+        if name.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                for member in invoice_members(zf):
+                    jobs.append(Job(f"{name}/{member}", "", None, None, pdf, xlsx, zf.read(member), archive,
+                                    docx, docx_template))
+        else:
+            jobs.append(Job(name, "", None, None, pdf, xlsx, data, archive, docx, docx_template))
+    return jobs
+
+
+_ZIPS: "OrderedDict[str, zipfile.ZipFile]" = OrderedDict()
+_ZIPS_MAX = 4
+
+
+def _zip(path: str) -> zipfile.ZipFile:
+    """
+    Arhivele deschise în worker, refolosite între job-uri: directorul central al unui ZIP
+    mare se citește o dată per proces, nu o dată per membru.
+    """
+    zf = _ZIPS.get(path)
+    if zf is None:
+        zf = _ZIPS[path] = zipfile.ZipFile(path)
+        while len(_ZIPS) > _ZIPS_MAX:
+            _ZIPS.popitem(last=False)[1].close()
+    else:
+        _ZIPS.move_to_end(path)
+    return zf
+
+
+def _read_job(job: Job) -> bytes:
+    if job.data is not None:
+        return job.data
+    if job.member is None:
+        with open(job.path, "rb") as f:
+            return f.read()
+    return _zip(job.path).read(job.member)
+
+
+def _job_source(job: Job) -> Source:
+    """Intrarea parserului: bytes din memorie, calea fișierului sau fluxul membrului din ZIP."""
+    if job.data is not None:
+        return job.data
+    if job.member is None:
+        return job.path
+    return _zip(job.path).open(job.member)
+
+
+_ARCHIVES: Dict[str, Archive] = {}
+
+
+def _archive(path: str) -> Archive:
+    """O conexiune per proces și bază (workerii scriu concurent; WAL + busy timeout)."""
+    arch = _ARCHIVES.get(path)
+    if arch is None:
+        arch = _ARCHIVES[path] = Archive(path)
+    return arch
+
+
+def _output_stem(source: str) -> str:
+    # numele vine din calea sursă (unic în lot); ID-urile de factură se pot repeta între furnizori
+    return "NIR_" + filename_safe_id(os.path.splitext(source)[0])
+
+
+# ------------------------ worker ------------------------
+class _Run:
+    """Un job în curs: intrarea de manifest, payload-ul și etapa curentă (pentru mesajul de eroare)."""
+
+    def __init__(self, job: Job):
+        self.job   = job
+        self.entry: Dict[str, Any] = {"source": job.source, "status": "ok", "outputs": [], "timings_ms": {}}
+        self.inv:  Optional[Dict[str, Any]] = None
+        self.raw:  Optional[bytes] = None
+        self.spans: List[Any] = []
+        self.stage = "read"
+        self.t     = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        t1 = time.perf_counter()
+        self.entry["timings_ms"][stage] = round((t1 - self.t) * 1000, 2)
+        self.t = t1
+
+    def fail(self, e: Exception) -> None:
+        self.inv = self.raw = None
+        self.entry["status"] = "error"
+        self.entry["error"] = f"{self.stage}: {type(e).__name__}: {e}"
+
+
+def _parse_job(run: _Run) -> None:
+    job, entry = run.job, run.entry
+    with collect() as spans:  # span-urile etapelor (doar cu NIR_METRICS activ)
+        try:
+            # arhiva cere bytes (hash de conținut); altfel parserul citește direct fișierul / membrul ZIP
+            run.raw = _read_job(job) if job.archive else None
+            run.lap("read")
+
+            run.stage = "parse"
+            src = run.raw if run.raw is not None else _job_source(job)
+            try:
+                inv = parse_invoice_stream(src, validate=False)  # validările: pe tot grupul, în process_jobs
+            finally:
+                if hasattr(src, "close"):
+                    src.close()
+            run.lap("parse")
+            entry["invoice_id"] = inv.get("id") or ""
+            entry["lines"] = len(inv.get("lines") or [])
+            entry["warnings"] = []
+            entry["validation"] = "ok"
+            entry["supplier"] = (inv.get("supplier") or {}).get("name") or ""
+            totals = inv.get("totals") or {}
+            entry["totals"] = {k: totals.get(k) for k in ("net", "vat", "gross")}
+            run.inv = inv
+        except Exception as e:
+            run.fail(e)
+    run.spans += spans
+
+
+def _export_job(run: _Run) -> None:
+    job, entry, inv = run.job, run.entry, run.inv
+    run.t = time.perf_counter()
+    with collect() as spans:
+        try:
+            if job.archive:
+                run.stage = "archive"
+                entry["archive_pk"], entry["archived_new"] = _archive(job.archive).add(inv, run.raw, job.source)
+                run.lap("archive")
+
+            # fără exporturi (doar parsare/arhivare) pandas/fpdf/xlsxwriter nu se încarcă deloc
+            if job.pdf or job.xlsx or job.docx:
+                run.stage = "nir_table"
+                df, nir_data = core.nir_table(inv)
+                run.lap("nir_table")
+
+                stem = _output_stem(job.source)
+                in_memory = job.out_dir is None
+                if in_memory:
+                    entry["files"] = {}
+                else:
+                    stem = os.path.join(job.out_dir, stem)
+                if job.pdf:
+                    run.stage = "pdf"
+                    target = io.BytesIO() if in_memory else stem + ".pdf"
+                    core.save_pdf(target, nir_data)
+                    if in_memory:
+                        entry["files"][stem + ".pdf"] = target.getvalue()
+                    entry["outputs"].append(os.path.basename(stem + ".pdf"))
+                    run.lap("pdf")
+                if job.xlsx:
+                    run.stage = "xlsx"
+                    target = io.BytesIO() if in_memory else stem + ".xlsx"
+                    core.save_xlsx(target, df, nir_data)
+                    if in_memory:
+                        entry["files"][stem + ".xlsx"] = target.getvalue()
+                    entry["outputs"].append(os.path.basename(stem + ".xlsx"))
+                    run.lap("xlsx")
+                if job.docx:
+                    run.stage = "docx"
+                    target = io.BytesIO() if in_memory else stem + ".docx"
+                    core.save_docx(target, nir_data, job.docx_template)
+                    if in_memory:
+                        entry["files"][stem + ".docx"] = target.getvalue()
+                    entry["outputs"].append(os.path.basename(stem + ".docx"))
+                    run.lap("docx")
+        except Exception as e:
+            run.fail(e)
+    run.spans += spans
+    run.inv = run.raw = None  # grupul nu ține payload-urile după export
+
+
+def process_jobs(jobs: Sequence[Job]) -> List[Dict[str, Any]]:
+    """
+    Pipeline-ul pentru un grup de fișiere: parsare, validare (`validate_batch`, o singură
+    evaluare pe coloanele întregului grup), apoi arhivare și exporturi pe fiecare.
+    Nu aruncă excepții: erorile ajung în manifest.
+    """
+    runs = [_Run(job) for job in jobs]
+    for run in runs:
+        _parse_job(run)
+
+    parsed = [run for run in runs if run.inv is not None]
+    if parsed:
+        t0 = time.perf_counter()
+        found = validate_batch([run.inv for run in parsed])
+        share = round((time.perf_counter() - t0) * 1000 / len(parsed), 2)
+        for run, validations in zip(parsed, found):
+            run.inv["validations"] = validations
+            run.entry["warnings"] = [v.get("msg") for v in validations]
+            run.entry["validation"] = _validation_status(validations)
+            run.entry["timings_ms"]["validate"] = share  # partea ce revine fișierului din validarea grupului
+
+    for run in parsed:
+        _export_job(run)
+    for run in runs:
+        timings = run.entry["timings_ms"]
+        timings["total"] = round(sum(timings.values()), 2)
+        if METRICS.enabled:
+            run.entry["spans"] = [sp.as_dict() for sp in run.spans]
+        run.entry["pid"] = os.getpid()
+    return [run.entry for run in runs]
+
+
+def process_job(job: Job) -> Dict[str, Any]:
+    """Tot pipeline-ul pentru un singur fișier (un grup de unul)."""
+    return process_jobs([job])[0]
+
+
+def _validation_status(validations: List[Dict[str, Any]]) -> str:
+    """Cel mai grav nivel din validările parserului: error > warning > ok."""
+    levels = {str(v.get("level") or "").lower() for v in validations}
+    return "error" if "error" in levels else "warning" if "warning" in levels else "ok"
+
+
+# ------------------------ orchestrare ------------------------
+def _init_worker(metrics_mode: str, preload_pdf: bool) -> None:
+    """Initializer: instrumentarea ca în procesul părinte (serverul forkserver are mediul de la pornirea lui)."""
+    os.environ["NIR_METRICS"] = metrics_mode
+    METRICS.configure_from_env()
+    if preload_pdf:  # fpdf/fontTools se importă la pornirea workerului, nu la primul PDF
+        core.preload_pdf()
+
+
+def run_batch(jobs: Sequence[Job], workers: Optional[int] = None, progress=None) -> List[Dict[str, Any]]:
+    """Procesează job-urile (în paralel dacă workers > 1) și întoarce intrările de manifest în ordinea job-urilor."""
+    workers = workers or available_workers()
+    workers = max(1, min(workers, len(jobs) or 1))
+    # grupuri mici: echilibru între overhead-ul IPC și fișierele de dimensiuni inegale;
+    # fiecare grup se validează dintr-o dată (process_jobs)
+    size = max(1, min(16, len(jobs) // (workers * 8)))
+    groups = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+    results: List[Dict[str, Any]] = []
+
+    def emit(entries: List[Dict[str, Any]]) -> None:
+        for entry in entries:
+            results.append(entry)
+            if progress:
+                progress(entry)
+
+    if workers == 1:
+        for group in groups:
+            emit(process_jobs(group))
+        return results
+
+    # forkserver: run_batch rulează și în serverul Streamlit (multi-thread), unde un fork
+    # direct ar moșteni lock-uri ținute de firele altor sesiuni
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(os.environ.get("NIR_METRICS", ""), any(job.pdf for job in jobs)),
+                             mp_context=multiprocessing.get_context("forkserver")) as pool:
+        for entries in pool.map(process_jobs, groups):
+            emit(entries)
+    return results
+
+
+def _manifest(entries: List[Dict[str, Any]], workers: int, wall_s: float) -> Dict[str, Any]:
+    ok = sum(1 for e in entries if e["status"] == "ok")
+    return {
+        "summary": {
+            "files": len(entries),
+            "ok": ok,
+            "errors": len(entries) - ok,
+            "workers": workers,
+            "wall_s": round(wall_s, 3),
+            "files_per_s": round(len(entries) / wall_s, 2) if wall_s > 0 else None,
+        },
+        "files": [{k: v for k, v in e.items() if k != "files"} for e in entries],
+    }
+
+
+def write_manifest(out_dir: str, entries: List[Dict[str, Any]], workers: int, wall_s: float) -> str:
+    manifest = _manifest(entries, workers, wall_s)
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def zip_outputs(entries: List[Dict[str, Any]], workers: int = 1, wall_s: float = 0.0) -> bytes:
+    """Exporturile din memorie ale tuturor intrărilor + manifest.json, într-o singură arhivă ZIP."""
+    buf = io.BytesIO()
+    used = set()
+    # PDF/XLSX sunt deja comprimate: ZIP_STORED evită o a doua compresie inutilă
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        for e in entries:
+            for name, data in (e.get("files") or {}).items():
+                stem, ext = os.path.splitext(name)
+                n = 1
+                while name in used:  # același nume de fișier în mai multe arhive încărcate
+                    n += 1
+                    name = f"{stem}_{n}{ext}"
+                used.add(name)
+                zf.writestr(name, data)
+        zf.writestr(MANIFEST_NAME, json.dumps(_manifest(entries, workers, wall_s), ensure_ascii=False, indent=2),
+                    compress_type=zipfile.ZIP_DEFLATED)
+    return buf.getvalue()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.batch", description="e-Factura XML (director/ZIP) -> NIR PDF/XLSX/DOCX")
+    ap.add_argument("input", help="director cu XML-uri, arhivă ZIP sau un singur XML")
+    ap.add_argument("-o", "--out", default="nir_out", help="director de ieșire (implicit: nir_out)")
+    ap.add_argument("-w", "--workers", type=int, default=None, help="număr de procese (implicit: nucleele disponibile)")
+    ap.add_argument("--no-pdf", action="store_true", help="nu genera PDF")
+    ap.add_argument("--no-xlsx", action="store_true", help="nu genera XLSX")
+    ap.add_argument("--docx", action="store_true", help="generează și NIR-ul DOCX (Word)")
+    ap.add_argument("--docx-template", metavar="SABLON", default=None,
+                    help="șablon .docx pentru --docx (implicit: NIR_DOCX_TEMPLATE sau cel inclus)")
+    ap.add_argument("--archive", metavar="DB", default=os.environ.get("NIR_ARCHIVE_DB") or None,
+                    help="arhivează facturile parsate în baza SQLite dată (implicit: NIR_ARCHIVE_DB)")
+    ap.add_argument("-q", "--quiet", action="store_true", help="fără progres pe stderr")
+    args = ap.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    jobs = list(iter_jobs(args.input, args.out, pdf=not args.no_pdf, xlsx=not args.no_xlsx, archive=args.archive,
+                          docx=args.docx, docx_template=args.docx_template))
+    workers = max(1, min(args.workers or available_workers(), len(jobs) or 1))
+
+    done = 0
+
+    def progress(entry: Dict[str, Any]) -> None:
+        nonlocal done
+        done += 1
+        if not args.quiet:
+            mark = "OK " if entry["status"] == "ok" else "ERR"
+            print(f"[{done}/{len(jobs)}] {mark} {entry['source']}", file=sys.stderr)
+
+    t0 = time.perf_counter()
+    entries = run_batch(jobs, workers=workers, progress=progress)
+    wall = time.perf_counter() - t0
+
+    path = write_manifest(args.out, entries, workers, wall)
+    errors = sum(1 for e in entries if e["status"] != "ok")
+    print(f"{len(entries)} fișiere, {errors} erori, {wall:.1f}s cu {workers} procese -> {path}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# app/book.py
+"""
+Registrul NIR: toate facturile dintr-un director / ZIP într-un singur PDF, cu o
+secțiune și un semn de carte (număr factură — furnizor) pentru fiecare.
+
+    python -m app.book descarcari_spv/ -o registru_octombrie.pdf
+    python -m app.book facturi/ -o registru.pdf --sort issue_date,supplier_cui --workers 8
+
+Fiecare proces parsează și randează o bucată contiguă de facturi într-un singur
+document (fonturile se subsetează o dată per bucată, nu per factură); bucățile se
+lipesc apoi în ordine (app/exporters/pdf_book.py). Cu `--sort`, ordinea se stabilește
+înainte, din scanarea rapidă a antetelor (app/scan.py).
+"""
+from __future__ import annotations
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from app import core
+from app.batch import Job, _job_source, available_workers, iter_jobs
+from app.exporters.pdf_book import chunk_bounds, merge_pdfs, page_count
+from app.exporters.pdf_nir import _DEFAULT_RENDERER
+from app.scan import FIELDS, scan_jobs, sort_records
+
+ChunkResult = Tuple[Optional[bytes], List[Tuple[str, str]]]
+
+
+def _book_chunk(jobs: Sequence[Job]) -> ChunkResult:
+    """PDF-ul unei bucăți de facturi + erorile (sursă, mesaj) celor care nu s-au putut citi."""
+    payloads, errors = [], []
+    for job in jobs:
+        try:
+            src = _job_source(job)
+            try:
+                inv = core.parse(src)
+            finally:
+                if hasattr(src, "close"):
+                    src.close()
+            payloads.append(core.nir_table(inv)[1])
+        except Exception as e:
+            errors.append((job.source, f"{type(e).__name__}: {e}"))
+    return (_DEFAULT_RENDERER.render_book(payloads) if payloads else None), errors
+
+
+def build_book(jobs: Sequence[Job], workers: int = 1) -> Tuple[bytes, List[Tuple[str, str]]]:
+    """Registrul pentru job-uri, în ordinea dată; întoarce (PDF, erori)."""
+    bounds = chunk_bounds(len(jobs), workers)
+    chunks = [jobs[a:b] for a, b in bounds]
+    if workers <= 1 or len(chunks) <= 1:
+        results = [_book_chunk(c) for c in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=core.preload_pdf) as pool:
+            results = list(pool.map(_book_chunk, chunks))
+    parts = [pdf for pdf, _ in results if pdf is not None]
+    errors = [e for _, errs in results for e in errs]
+    if not parts:
+        raise ValueError("Nicio factură validă pentru registru.")
+    return (parts[0] if len(parts) == 1 else merge_pdfs(parts)), errors
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.book", description="Registru NIR: un singur PDF pentru multe facturi")
+    ap.add_argument("input", help="director cu XML-uri/ZIP-uri, arhivă ZIP sau un singur XML")
+    ap.add_argument("-o", "--out", default="registru_nir.pdf", help="PDF-ul rezultat (implicit: registru_nir.pdf)")
+    ap.add_argument("-s", "--sort", default="", help="ordonare după câmpuri de antet, ex. issue_date,supplier_cui "
+                                                      "(implicit: ordinea fișierelor)")
+    ap.add_argument("-w", "--workers", type=int, default=None, help="număr de procese (implicit: nucleele disponibile)")
+    args = ap.parse_args(argv)
+
+    keys = [k.strip() for k in args.sort.split(",") if k.strip()]
+    unknown = [k for k in keys if k not in FIELDS]
+    if unknown:
+        ap.error(f"câmp de sortare necunoscut: {', '.join(unknown)}")
+
+    t0 = time.perf_counter()
+    jobs = list(iter_jobs(args.input, out_dir=None, pdf=True, xlsx=False))
+    workers = max(1, args.workers or available_workers())
+    if keys:
+        order = {r["source"]: i for i, r in enumerate(sort_records(scan_jobs(jobs, workers), keys))}
+        jobs.sort(key=lambda j: order[j.source])
+
+    pdf, errors = build_book(jobs, workers)
+    with open(args.out, "wb") as f:
+        f.write(pdf)
+    for source, msg in errors:
+        print(f"ERR {source}: {msg}", file=sys.stderr)
+    print(f"{len(jobs) - len(errors)} NIR-uri, {page_count(pdf)} pagini, {len(errors)} erori, "
+          f"{time.perf_counter() - t0:.1f}s cu {workers} procese -> {args.out}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
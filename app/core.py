@@ -0,0 +1,117 @@
+# app/core.py
+"""
+Punct de intrare minimal, fără UI: parse -> tabel NIR -> PDF / XLSX / DOCX.
+
+    from app import core
+    inv = core.parse("factura.xml")              # lxml + numpy; fără pandas/fpdf/xlsxwriter
+    df, nir_data = core.nir_table(inv)           # abia aici se încarcă pandas
+    pdf = core.pdf_bytes(nir_data)               # ... și fpdf
+    core.save_pdf("nir.pdf", nir_data)           # același PDF, scris direct pe disc
+    xlsx = core.xlsx_bytes(df, nir_data)         # ... și xlsxwriter
+    core.save_docx("nir.docx", nir_data)         # DOCX din șablonul Word (compilat o dată per proces)
+    inv["attachments"]                           # PDF-urile încorporate: doar nume, tip, dimensiune
+    core.save_attachment("factura.xml", 0, "factura_furnizor.pdf")   # decodat la cerere, în bucăți
+
+Importul modulului încarcă doar parserul. Exportul cerut își importă singur
+dependențele, la primul apel; procesele scurte (workeri, invocări unice) care doar
+parsează nu mai plătesc pornirea pandas/fpdf/xlsxwriter.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from app.parsers.ubl_stream import Source, parse_invoice_stream
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def parse(source: Source) -> Dict[str, Any]:
+    """Payload-ul parserului (cale, bytes sau obiect file-like)."""
+    return parse_invoice_stream(source)
+
+
+def save_attachment(source: Source, index: int, target: Any) -> int:
+    """Atașamentul `index` din factură (`inv["attachments"]`), decodat în `target`; întoarce octeții scriși."""
+    from app.parsers.attachments import extract_attachment
+
+    return extract_attachment(source, index, target)
+
+
+def nir_table(inv: Dict[str, Any]) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Tabelul NIR și payload-ul pentru exportere."""
+    from app.nir import build_nir_data, to_nir_df
+
+    df = to_nir_df(inv)
+    return df, build_nir_data(inv, df)
+
+
+def pdf_bytes(nir_data: Dict[str, Any]) -> bytes:
+    from app.exporters.pdf_nir import generate_pdf
+
+    return generate_pdf(nir_data)
+
+
+def save_pdf(target: Any, nir_data: Dict[str, Any]) -> None:
+    """PDF-ul scris direct în `target` (cale sau file-like binar), fără copia ca bytes."""
+    from app.exporters.pdf_nir import write_pdf
+
+    write_pdf(target, nir_data)
+
+
+def xlsx_bytes(df: pd.DataFrame, nir_data: Dict[str, Any]) -> bytes:
+    from app.exporters.xlsx_nir import generate_xlsx
+
+    return generate_xlsx(df, nir_data)
+
+
+def save_xlsx(target: Any, df: pd.DataFrame, nir_data: Dict[str, Any]) -> int:
+    """Excel-ul scris direct în `target` (cale sau file-like), fără copia în memorie; întoarce rândurile."""
+    from app.exporters.xlsx_nir import rows_from_df, write_xlsx
+
+    return write_xlsx(target, rows_from_df(df), nir_data, columns=list(df.columns))
+
+
+def docx_bytes(nir_data: Dict[str, Any], template: Optional[str] = None) -> bytes:
+    from app.exporters.docx_nir import generate_docx
+
+    return generate_docx(nir_data, template)
+
+
+def save_docx(target: Any, nir_data: Dict[str, Any], template: Optional[str] = None) -> None:
+    """DOCX-ul scris direct în `target`; `template` = cale .docx (implicit NIR_DOCX_TEMPLATE / șablonul inclus)."""
+    from app.exporters.docx_nir import write_docx
+
+    write_docx(target, nir_data, template)
+
+
+def preload_pdf() -> None:
+    """Initializer pentru pool-uri care vor genera PDF: importurile fpdf/fontTools, o dată per proces."""
+    from app.exporters.pdf_nir import preload_fonts
+
+    preload_fonts()
+
+
+def _check_kind(kind: str) -> None:
+    if kind not in ("pdf", "xlsx", "docx"):
+        raise ValueError(f"Export necunoscut: {kind!r} (pdf, xlsx sau docx)")
+
+
+def render(kind: str, inv: Dict[str, Any]) -> bytes:
+    """Exportul `kind` (pdf / xlsx / docx) pentru un payload deja parsat."""
+    _check_kind(kind)
+    df, nir_data = nir_table(inv)
+    if kind == "pdf":
+        return pdf_bytes(nir_data)
+    return docx_bytes(nir_data) if kind == "docx" else xlsx_bytes(df, nir_data)
+
+
+def render_to(target: Any, kind: str, inv: Dict[str, Any]) -> None:
+    """Ca `render`, dar exportul se scrie direct în `target` (cale sau file-like binar)."""
+    _check_kind(kind)
+    df, nir_data = nir_table(inv)
+    if kind == "pdf":
+        save_pdf(target, nir_data)
+    elif kind == "docx":
+        save_docx(target, nir_data)
+    else:
+        save_xlsx(target, df, nir_data)
@@ -1,3 +1,437 @@
-# Placeholder pentru export DOCX/PDF
-# Următorul pas: folosește docxtpl pentru a popula un șablon NIR și convertește în PDF.
-pass
\ No newline at end of file
+# app/exporters/docx_nir.py
+"""
+Export NIR 14-3-1A ca DOCX editabil, dintr-un șablon Word.
+
+Șablonul se compilează o singură dată per proces (`load_template`, memorat după cale
+și data modificării): fiecare parte XML cu câmpuri devine o listă de bucăți fixe și
+câmpuri `{{invoice_id}}`, iar rândul de tabel cu câmpuri `{{line.*}}` devine un
+format de rând. Randarea unei facturi e apoi doar concatenare de text: rândurile
+tabelului se generează în bloc, pe coloane (același format aplicat pe toate liniile),
+fără DOM și fără motor de șabloane per factură; celelalte părți ale arhivei se
+copiază ca atare.
+
+Consumă același payload ca `generate_pdf`. Câmpuri disponibile:
+
+    invoice_id, invoice_date, currency, line_count, subtotal, vat, grand_total,
+    supplier.name / .cui / .address, buyer.name / .cui / .address
+    în rândul de tabel: line.no, line.name, line.unit, line.qty, line.price,
+                        line.vat_pct, line.line_net, line.vat, line.total
+
+Fără `template`, se folosește șablonul implicit (`default_template()`); poate fi
+salvat ca punct de plecare pentru un șablon propriu:
+
+    python -m app.exporters.docx_nir sablon_nir.docx
+"""
+from __future__ import annotations
+import io
+import os
+import re
+import sys
+import threading
+import zipfile
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
+
+from lxml import etree
+
+from app.metrics import instrumented
+
+Target = Union[str, os.PathLike, BinaryIO]
+
+W_NS  = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_W    = "{%s}" % W_NS
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+FIELD      = re.compile(r"\{\{\s*([\w.]+)\s*\}\}")
+LINE_FIELD = "line."
+_HAS_LINE_FIELD = re.compile(r"\{\{\s*line\.")
+# părțile în care se caută câmpuri (corpul, antetele și subsolurile de pagină)
+_FIELD_PARTS = re.compile(r"word/(document|header\d*|footer\d*)\.xml$")
+# caractere interzise în XML 1.0 (coduri de control din denumiri copiate din alte programe)
+_XML_ILLEGAL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# markerii dintre care se decupează rândul de tabel la compilare
+_ROW_START, _ROW_END = "NIR-ROW-START", "NIR-ROW-END"
+
+
+# ========================== Valori ==========================
+def _xml(x: Any) -> str:
+    text = "" if x is None else str(x)
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return _XML_ILLEGAL.sub("", text)
+
+
+def _num(x: Any, nd: int = 2) -> str:
+    try:
+        return f"{float(x):.{nd}f}"
+    except (TypeError, ValueError):
+        return f"{0:.{nd}f}"
+
+
+def _columns(nir_data: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """Liniile pe coloane: `columns` din payload sau, pentru lista `items`, transpusă o dată."""
+    cols = nir_data.get("columns")
+    if cols is not None:
+        return cols
+    items = nir_data.get("items", []) or []
+    out = {k: [it.get(k) for it in items] for k in ("name", "unit", "qty", "price", "line_net", "total")}
+    # în `items`, "vat" e cota (ca la generate_pdf); valoarea TVA se calculează din net și cotă
+    out["vat_pct"] = [it.get("vat_pct", it.get("vat")) for it in items]
+    return out
+
+
+def _line_values(cols: Dict[str, List[Any]]) -> Dict[str, List[str]]:
+    """Fiecare câmp `line.*` ca listă de texte gata de pus în XML (calculate pe coloane)."""
+    n = len(cols["name"])
+    qty, price = cols.get("qty") or [0] * n, cols.get("price") or [0] * n
+    rate = cols.get("vat_pct") or [0] * n
+    net = [v if v not in (None, 0, 0.0) else _f(q) * _f(p)
+           for v, q, p in zip(cols.get("line_net") or [None] * n, qty, price)]
+    vat = [v if v is not None else _f(b) * _f(r) / 100.0 for v, b, r in zip(cols.get("vat") or [None] * n, net, rate)]
+    total = [v if v not in (None, 0, 0.0) else _f(b) + _f(t)
+             for v, b, t in zip(cols.get("total") or [None] * n, net, vat)]
+    return {
+        "no":       [str(i) for i in range(1, n + 1)],
+        "name":     list(map(_xml, cols["name"])),
+        "unit":     list(map(_xml, cols.get("unit") or [""] * n)),
+        "qty":      list(map(_num, qty)),
+        "price":    list(map(_num, price)),
+        "vat_pct":  [_num(v, 0) for v in rate],  # ca în PDF
+        "line_net": list(map(_num, net)),
+        "vat":      list(map(_num, vat)),
+        "total":    list(map(_num, total)),
+    }
+
+
+def _f(x: Any) -> float:
+    try:
+        return float(x or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _scalar_values(nir_data: Dict[str, Any], lines: Dict[str, List[str]]) -> Dict[str, str]:
+    totals = nir_data.get("totals", {}) or {}
+    n = len(lines["no"])
+
+    def total(key: str, col: str) -> str:
+        # fallback: suma valorilor afișate în tabel
+        return _num(_f(totals.get(key)) or sum(map(float, lines[col])))
+
+    out = {
+        "invoice_id":   _xml(nir_data.get("invoice_id") or "N/A"),
+        "invoice_date": _xml(nir_data.get("invoice_date") or ""),
+        "currency":     _xml(nir_data.get("currency") or "RON"),
+        "line_count":   str(n),
+        "subtotal":     total("subtotal", "line_net"),
+        "vat":          total("vat", "vat"),
+        "grand_total":  total("grand_total", "total"),
+    }
+    for party in ("supplier", "buyer"):
+        p = nir_data.get(party) or {}
+        for key in ("name", "cui", "address"):
+            out[f"{party}.{key}"] = _xml(p.get(key) or "-")
+    return out
+
+
+# ========================== Compilare ==========================
+@dataclass
+class _Part:
+    """O parte XML compilată: bucăți fixe alternate cu câmpuri, plus (opțional) rândul de linii."""
+    head: List[Union[str, Tuple[str]]]      # text fix sau (câmp,)
+    row: Optional[Tuple[str, List[str]]]    # (format str.format, câmpurile line.* în ordine)
+    tail: List[Union[str, Tuple[str]]]
+
+    def render(self, scalars: Dict[str, str], lines: Dict[str, List[str]]) -> bytes:
+        out = [_fill(self.head, scalars)]
+        if self.row is not None:
+            fmt, fields = self.row
+            # toate rândurile dintr-o dată: formatul rândului aplicat pe coloane
+            out.append("".join(map(fmt.format, *(lines[f] for f in fields))))
+            out.append(_fill(self.tail, scalars))
+        return "".join(out).encode("utf-8")
+
+
+def _fill(segments: List[Union[str, Tuple[str]]], scalars: Dict[str, str]) -> str:
+    return "".join(seg if isinstance(seg, str) else scalars.get(seg[0], "") for seg in segments)
+
+
+def _segments(xml: str) -> List[Union[str, Tuple[str]]]:
+    out: List[Union[str, Tuple[str]]] = []
+    pos = 0
+    for m in FIELD.finditer(xml):
+        out.append(xml[pos:m.start()])
+        out.append((m.group(1),))
+        pos = m.end()
+    out.append(xml[pos:])
+    return out
+
+
+def _row_format(xml: str) -> Tuple[str, List[str]]:
+    """Rândul-șablon ca format `str.format`: câmpurile line.* devin {0}, {1}, ... (restul acoladelor dublate)."""
+    fields: List[str] = []
+    parts, pos = [], 0
+    for m in FIELD.finditer(xml):
+        name = m.group(1)
+        parts.append(xml[pos:m.start()].replace("{", "{{").replace("}", "}}"))
+        key = name[len(LINE_FIELD):] if name.startswith(LINE_FIELD) else None
+        if key is None:
+            raise ValueError(f"Câmp {{{{{name}}}}} în rândul de linii: acolo sunt permise doar câmpuri line.*")
+        if key not in fields:
+            fields.append(key)
+        parts.append("{%d}" % fields.index(key))
+        pos = m.end()
+    parts.append(xml[pos:].replace("{", "{{").replace("}", "}}"))
+    return "".join(parts), fields
+
+
+def _join_split_fields(root: etree._Element) -> None:
+    """
+    Word împarte des un câmp `{{...}}` în mai multe fragmente de text (corectură,
+    formatare). Doar fragmentele pe care le acoperă un astfel de câmp se lipesc în
+    primul dintre ele; restul textului rămâne în run-ul lui, cu formatarea lui.
+    """
+    for p in root.iter(_W + "p"):
+        texts = list(p.iter(_W + "t"))
+        if len(texts) < 2:
+            continue
+        chunks = [t.text or "" for t in texts]
+        joined = "".join(chunks)
+        if "{{" not in joined:
+            continue
+        # owner[k] = fragmentul care ține caracterul k; un câmp rupt trece întreg la primul
+        owner = [i for i, c in enumerate(chunks) for _ in c]
+        split = False
+        for m in FIELD.finditer(joined):
+            first = owner[m.start()]
+            if owner[m.end() - 1] != first:
+                owner[m.start():m.end()] = [first] * (m.end() - m.start())
+                split = True
+        if not split:
+            continue
+        parts = [[] for _ in texts]
+        for k, c in enumerate(joined):
+            parts[owner[k]].append(c)
+        for t, chunk, part in zip(texts, chunks, parts):
+            text = "".join(part)
+            if text != chunk:
+                t.text = text
+                t.set(_XML_SPACE, "preserve")
+
+
+def _compile_part(data: bytes) -> Optional[_Part]:
+    if b"{{" not in data:
+        return None
+    root = etree.fromstring(data)
+    _join_split_fields(root)
+    rows = [tr for tr in root.iter(_W + "tr")
+            if any(_HAS_LINE_FIELD.search(t.text or "") for t in tr.iter(_W + "t"))]
+    if len(rows) > 1:
+        raise ValueError("Șablonul are mai multe rânduri cu câmpuri line.*; e permis unul singur.")
+    if rows:
+        tr = rows[0]
+        tr.addprevious(etree.Comment(_ROW_START))
+        tr.addnext(etree.Comment(_ROW_END))
+    xml = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True).decode("utf-8")
+    if not rows:
+        return _Part(_segments(xml), None, [])
+    head, rest = xml.split(f"<!--{_ROW_START}-->", 1)
+    row, tail = rest.split(f"<!--{_ROW_END}-->", 1)
+    return _Part(_segments(head), _row_format(row), _segments(tail))
+
+
+class DocxTemplate:
+    """Un șablon DOCX compilat: părțile fixe (copiate ca atare) și cele cu câmpuri."""
+
+    def __init__(self, data: bytes):
+        self.members: List[Tuple[zipfile.ZipInfo, Union[bytes, _Part]]] = []
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            for info in zf.infolist():
+                raw = zf.read(info)
+                part = _compile_part(raw) if _FIELD_PARTS.match(info.filename) else None
+                self.members.append((info, part if part is not None else raw))
+        if not any(isinstance(m, _Part) for _, m in self.members):
+            raise ValueError("Șablonul DOCX nu conține niciun câmp {{...}}.")
+
+    def write(self, target: Target, nir_data: Dict[str, Any]) -> None:
+        """Documentul pentru `nir_data`, scris direct în `target` (cale sau file-like binar)."""
+        lines   = _line_values(_columns(nir_data))
+        scalars = _scalar_values(nir_data, lines)
+        target = os.fspath(target) if isinstance(target, os.PathLike) else target
+        with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as zf:
+            for info, member in self.members:
+                data = member.render(scalars, lines) if isinstance(member, _Part) else member
+                zf.writestr(_fresh_info(info), data)
+
+    def render(self, nir_data: Dict[str, Any]) -> bytes:
+        buf = io.BytesIO()
+        self.write(buf, nir_data)
+        return buf.getvalue()
+
+
+def _fresh_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    # același nume, dată și compresie, fără dimensiunile/CRC-ul vechi
+    out = zipfile.ZipInfo(info.filename, info.date_time)
+    out.compress_type = info.compress_type
+    out.external_attr = info.external_attr
+    return out
+
+
+# ========================== Șablonul implicit ==========================
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+_DOC_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"/>'
+)
+
+# [Denumire, UM, Cant., Preț, TVA%, Valoare (cu TVA)] — aceleași proporții ca în PDF (twips)
+_COLUMNS = [
+    ("Nr.", 500, "line.no", "center"),
+    ("Denumire", 6400, "line.name", "left"),
+    ("UM", 800, "line.unit", "center"),
+    ("Cant.", 1100, "line.qty", "right"),
+    ("Preț unitar", 1400, "line.price", "right"),
+    ("Valoare netă", 1500, "line.line_net", "right"),
+    ("TVA%", 800, "line.vat_pct", "right"),
+    ("TVA", 1300, "line.vat", "right"),
+    ("Valoare (cu TVA)", 1700, "line.total", "right"),
+]
+
+
+def _run(text: str, bold: bool = False, size: int = 20) -> str:
+    props = ("<w:b/>" if bold else "") + f'<w:sz w:val="{size}"/>'
+    return f'<w:r><w:rPr>{props}</w:rPr><w:t xml:space="preserve">{text}</w:t></w:r>'
+
+
+def _para(*runs: str, align: str = "left", after: int = 60) -> str:
+    return f'<w:p><w:pPr><w:spacing w:after="{after}"/><w:jc w:val="{align}"/></w:pPr>{"".join(runs)}</w:p>'
+
+
+def _cell(width: int, content: str, shade: bool = False) -> str:
+    fill = '<w:shd w:val="clear" w:color="auto" w:fill="E6E6E6"/>' if shade else ""
+    return f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/>{fill}</w:tcPr>{content}</w:tc>'
+
+
+def _document_xml() -> str:
+    borders = "".join(f'<w:{side} w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
+                      for side in ("top", "left", "bottom", "right", "insideH", "insideV"))
+    header = "".join(_cell(w, _para(_run(title, bold=True, size=18), align="center", after=0), shade=True)
+                     for title, w, _, _ in _COLUMNS)
+    row = "".join(_cell(w, _para(_run("{{%s}}" % field, size=18), align=align, after=0))
+                  for _, w, field, align in _COLUMNS)
+    grid = "".join('<w:gridCol w:w="%d"/>' % w for _, w, _, _ in _COLUMNS)
+    table = (
+        '<w:tbl><w:tblPr><w:tblW w:w="0" w:type="auto"/>'
+        f'<w:tblBorders>{borders}</w:tblBorders><w:tblLayout w:type="fixed"/></w:tblPr>'
+        f'<w:tblGrid>{grid}</w:tblGrid>'
+        f'<w:tr><w:trPr><w:tblHeader/></w:trPr>{header}</w:tr>'
+        f'<w:tr><w:trPr><w:cantSplit/></w:trPr>{row}</w:tr>'
+        '</w:tbl>'
+    )
+    body = "".join([
+        _para(_run("NIR - Nota de intrare recepție", bold=True, size=28), align="center", after=120),
+        _para(_run("Nr. factură: ", bold=True), _run("{{invoice_id}}"),
+              _run("    Data: ", bold=True), _run("{{invoice_date}}"),
+              _run("    Monedă: ", bold=True), _run("{{currency}}")),
+        _para(_run("Furnizor: ", bold=True), _run("{{supplier.name}} (CUI {{supplier.cui}}), {{supplier.address}}")),
+        _para(_run("Cumpărător: ", bold=True), _run("{{buyer.name}} (CUI {{buyer.cui}}), {{buyer.address}}"),
+              after=160),
+        table,
+        _para(_run("Total fără TVA: ", bold=True), _run("{{subtotal}}"),
+              _run("    TVA: ", bold=True), _run("{{vat}}"),
+              _run("    Total cu TVA: ", bold=True), _run("{{grand_total}}"), align="right", after=480),
+        _para(_run("Comisia de recepție: ____________________"),
+              _run("          Gestionar: ____________________")),
+    ])
+    # A4 landscape, margini ~12 mm
+    section = ('<w:sectPr><w:pgSz w:w="16838" w:h="11906" w:orient="landscape"/>'
+               '<w:pgMar w:top="680" w:right="680" w:bottom="680" w:left="680" '
+               'w:header="340" w:footer="340" w:gutter="0"/></w:sectPr>')
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<w:document xmlns:w="{W_NS}"><w:body>{body}{section}</w:body></w:document>')
+
+
+def default_template() -> bytes:
+    """Șablonul NIR implicit, ca fișier .docx (punct de plecare pentru unul propriu)."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _RELS)
+        zf.writestr("word/_rels/document.xml.rels", _DOC_RELS)
+        zf.writestr("word/document.xml", _document_xml())
+    return buf.getvalue()
+
+
+# ========================== Cache per proces ==========================
+_TEMPLATES: Dict[Tuple[str, float], DocxTemplate] = {}
+_TEMPLATES_LOCK = threading.Lock()
+
+
+def load_template(path: Optional[str] = None) -> DocxTemplate:
+    """
+    Șablonul compilat, o singură dată per proces: `path` (sau NIR_DOCX_TEMPLATE), altfel
+    cel implicit. Un fișier modificat pe disc se recompilează la următorul apel.
+    """
+    path = path or os.environ.get("NIR_DOCX_TEMPLATE") or None
+    key = (os.path.abspath(path), os.path.getmtime(path)) if path else ("", 0.0)
+    tpl = _TEMPLATES.get(key)
+    if tpl is None:
+        with _TEMPLATES_LOCK:
+            tpl = _TEMPLATES.get(key)
+            if tpl is None:
+                if path:
+                    with open(path, "rb") as f:
+                        tpl = DocxTemplate(f.read())
+                else:
+                    tpl = DocxTemplate(default_template())
+                _TEMPLATES[key] = tpl
+    return tpl
+
+
+# ========================== API ==========================
+def _line_count(nir_data: Dict[str, Any]) -> int:
+    cols = nir_data.get("columns")
+    return len(cols["name"]) if cols is not None else len(nir_data.get("items", []) or [])
+
+
+@instrumented("export_docx", lines=lambda out, target, nir_data, *a, **k: _line_count(nir_data))
+def write_docx(target: Target, nir_data: Dict[str, Any], template: Optional[str] = None) -> None:
+    """NIR-ul DOCX scris direct în `target` (cale sau file-like binar)."""
+    load_template(template).write(target, nir_data)
+
+
+def generate_docx(nir_data: Dict[str, Any], template: Optional[str] = None) -> bytes:
+    buf = io.BytesIO()
+    write_docx(buf, nir_data, template)
+    return buf.getvalue()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    if len(args) != 1:
+        print("utilizare: python -m app.exporters.docx_nir sablon_nir.docx", file=sys.stderr)
+        return 2
+    with open(args[0], "wb") as f:
+        f.write(default_template())
+    print(f"Șablonul implicit -> {args[0]}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
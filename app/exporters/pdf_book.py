@@ -0,0 +1,99 @@
+# app/exporters/pdf_book.py
+"""
+Randare în masă a NIR-urilor: fișiere separate sau un singur „registru NIR” (un PDF
+cu o secțiune și un semn de carte per factură).
+
+Costul dominant al unui PDF mic este subsetarea fonturilor la `output()`, o dată per
+document. Registrul se randează deci pe bucăți contigue (`NirRenderer.render_book`:
+un document și o subsetare per bucată), bucățile rulează în paralel într-un pool de
+procese cu fpdf deja încărcat, iar la final se lipesc cu `merge_pdfs`.
+
+Lipirea folosește pypdf (citește orice PDF valid: fluxuri de obiecte, xref ca flux,
+generații nenule), deci nu depinde de felul exact în care fpdf2 își scrie ieșirea.
+"""
+from __future__ import annotations
+import io
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from pypdf import PdfReader, PdfWriter
+
+from app.exporters.pdf_nir import _DEFAULT_RENDERER, generate_pdf, preload_fonts
+
+MIN_CHUNK = 20  # sub atât, subsetarea fonturilor per bucată cântărește mai mult decât paralelismul
+
+
+# ------------------------ împărțire pe procese ------------------------
+def chunk_bounds(n: int, workers: int, min_chunk: int = MIN_CHUNK) -> List[Tuple[int, int]]:
+    """Intervale contigue [a, b): ~2 bucăți per worker (echilibrare), dar nu mai mici de `min_chunk`."""
+    if n <= 0:
+        return []
+    parts = max(1, min(workers * 2, n // max(1, min_chunk)))
+    step, extra = divmod(n, parts)
+    out, a = [], 0
+    for i in range(parts):
+        b = a + step + (1 if i < extra else 0)
+        out.append((a, b))
+        a = b
+    return out
+
+
+def _render_chunk(chunk: Sequence[Dict[str, Any]]) -> bytes:
+    return _DEFAULT_RENDERER.render_book(chunk)
+
+
+def _render_file(args: Tuple[Dict[str, Any], str]) -> str:
+    nir_data, path = args
+    with open(path, "wb") as f:
+        f.write(generate_pdf(nir_data))
+    return path
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    # fpdf/fontTools se importă la pornirea workerului
+    return ProcessPoolExecutor(max_workers=workers, initializer=preload_fonts)
+
+
+def render_book(payloads: Sequence[Dict[str, Any]], workers: int = 1) -> bytes:
+    """Registrul NIR: toate payload-urile (în ordinea dată) într-un singur PDF cu outline."""
+    if not payloads:
+        raise ValueError("Niciun NIR de pus în registru.")
+    bounds = chunk_bounds(len(payloads), workers)
+    if workers <= 1 or len(bounds) == 1:
+        return _render_chunk(payloads)
+    with _pool(min(workers, len(bounds))) as pool:
+        parts = list(pool.map(_render_chunk, [payloads[a:b] for a, b in bounds]))
+    return merge_pdfs(parts)
+
+
+def render_files(payloads: Sequence[Dict[str, Any]], paths: Sequence[str], workers: int = 1) -> List[str]:
+    """Câte un PDF per payload, scris direct de worker la calea corespunzătoare."""
+    if len(payloads) != len(paths):
+        raise ValueError("Câte o cale pentru fiecare NIR.")
+    jobs = list(zip(payloads, paths))
+    if workers <= 1:
+        return [_render_file(j) for j in jobs]
+    chunksize = max(1, min(16, len(jobs) // (workers * 4)))
+    with _pool(workers) as pool:
+        return list(pool.map(_render_file, jobs, chunksize=chunksize))
+
+
+# ------------------------ asamblare ------------------------
+def merge_pdfs(parts: Iterable[bytes]) -> bytes:
+    """
+    Lipește PDF-urile (în ordine) într-unul singur: paginile sub un singur arbore,
+    semnele de carte ale fiecărei părți în același outline.
+    """
+    writer = PdfWriter()
+    for pdf in parts:
+        writer.append(PdfReader(io.BytesIO(pdf)))
+    if not writer.pages:
+        raise ValueError("Nimic de lipit.")
+    writer.page_mode = "/UseOutlines"
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def page_count(pdf: bytes) -> int:
+    return len(PdfReader(io.BytesIO(pdf)).pages)
@@ -1,11 +1,18 @@
 # app/exporters/pdf_nir.py
 from __future__ import annotations
-from typing import Dict, Any, List
+from typing import BinaryIO, Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
 from fpdf import FPDF
+import numpy as np
+from dataclasses import dataclass
 from datetime import datetime
+from itertools import islice
 import os
 import math
-import re
+import tempfile
+import threading
+
+from app.exporters.text_wrap import measure_for, tokenize_for_wrap, wrap_text_to_width  # noqa: F401
+from app.metrics import instrumented
 
 # ========================== Config & Fonturi ==========================
 FONT_DIR    = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "assets", "fonts"))
@@ -13,6 +20,9 @@ REGULAR_TTF = os.path.join(FONT_DIR, "DejaVuSans.ttf")
 BOLD_TTF    = os.path.join(FONT_DIR, "DejaVuSans-Bold.ttf")
 FAMILY      = "DejaVu"
 
+# Destinația pentru `write_pdf`: cale sau obiect file-like binar
+Target = Union[str, os.PathLike, BinaryIO]
+
 # Margini (mm) pentru A4 landscape
 MARGIN_L = 12
 MARGIN_R = 12
@@ -33,6 +43,12 @@ LINE_H            = 5.6
 HEADER_LINE_H     = 5.6
 PAD_X             = 1.6
 
+# Înălțimi fixe folosite de planul de paginare (mm)
+TITLE_H           = 9     # titlul din header(), urmat de 1mm spațiu
+TABLE_BOTTOM_GAP  = 12    # zona tampon de deasupra footerului (vezi ensure_space)
+TOTALS_H          = 8
+SIGNATURE_OFFSET  = 8     # linia de semnături: la h - b_margin - 8
+
 # ========================== Utilitare ==========================
 def coalesce(*vals, default=0.0) -> float:
     for v in vals:
@@ -52,45 +68,28 @@ def fmt_float(x: Any, nd=2) -> str:
     except Exception:
         return f"{0:.{nd}f}"
 
-def tokenize_for_wrap(text: str) -> List[str]:
-    if not text:
-        return [""]
-    # Rupe după spații și delimitatori utili la wrap
-    return re.findall(r"[^\s/\-\(\),\.]+|[/\-\(\),\.]", str(text))
-
-def wrap_text_to_width(pdf: FPDF, text: str, width: float) -> List[str]:
-    """Împarte textul pe linii care încap în 'width'. Rupe și pe delimitatori; dacă
-    un token e prea lung, îl rupe la nivel de caractere."""
-    tokens: List[str] = tokenize_for_wrap(text)
-    lines: List[str] = []
-    cur = ""
-
-    def fits(s: str) -> bool:
-        return pdf.get_string_width(s) <= width
-
-    for tok in tokens:
-        candidate = tok if not cur else (cur + tok if tok in "/-(),." else cur + " " + tok)
-        if fits(candidate):
-            cur = candidate
-        else:
-            if cur:
-                lines.append(cur)
-                cur = ""
-            if not fits(tok.strip()):
-                piece = ""
-                for ch in tok:
-                    if fits(piece + ch):
-                        piece += ch
-                    else:
-                        if piece:
-                            lines.append(piece)
-                        piece = ch
-                cur = piece
-            else:
-                cur = tok
-    if cur or not lines:
-        lines.append(cur)
-    return [ln.strip() for ln in lines]
+# ========================== Layout header tabel ==========================
+# Capul tabelului e static și se redesenează pe fiecare pagină: wrap-ul lui se
+# calculează o dată per (font, mărime, coloane, texte) și se refolosește între pagini/documente.
+_HEADER_LAYOUTS: Dict[Tuple, Tuple[List[Tuple[float, List[str], float]], int]] = {}
+
+
+def _header_layout(pdf: FPDF) -> Tuple[List[Tuple[float, List[str], float]], int]:
+    m = measure_for(pdf)
+    key = (m.key, tuple(pdf.col_w), tuple(pdf.headers)) if m is not None else None
+    layout = _HEADER_LAYOUTS.get(key) if key is not None else None
+    if layout is None:
+        wrapped = []
+        max_lines = 1
+        for w, text in zip(pdf.col_w, pdf.headers):
+            box_w = max(0.0, w - 2 * PAD_X)
+            lines = wrap_text_to_width(pdf, text, box_w)
+            wrapped.append((w, lines, box_w))
+            max_lines = max(max_lines, len(lines))
+        layout = (wrapped, max_lines)
+        if key is not None:
+            _HEADER_LAYOUTS[key] = layout
+    return layout
 
 # ========================== Clasa PDF ==========================
 class NirPDF(FPDF):
@@ -99,11 +98,16 @@ class NirPDF(FPDF):
         self.in_table = False
         self.col_w: List[float] = COL_WIDTHS[:]
         self.headers: List[str] = HEADERS[:]
+        # numerotarea din plan (pagina fpdf -> pagina din documentul complet), pentru randări parțiale
+        self.page_labels: Dict[int, int] = {}
+        self.page_total: Optional[int] = None
+        # într-un document cu mai multe NIR-uri (registru), totalul de pagini al fiecăruia
+        self.page_totals: Dict[int, int] = {}
 
     # ---- Header pagină ----
     def header(self):
         self.set_font(FAMILY, "B", TITLE_FONT_SIZE)
-        self.cell(0, 9, "NIR - Nota de intrare recepție", ln=True, align="C")
+        self.cell(0, TITLE_H, "NIR - Nota de intrare recepție", ln=True, align="C")
         self.ln(1)
         if self.in_table:
             self._draw_table_header()
@@ -113,21 +117,16 @@ class NirPDF(FPDF):
         # păstrăm doar paginare și moment generare; footer-ul cu comisia îl desenăm din corp
         self.set_y(-10)
         self.set_font(FAMILY, "", 8)
-        self.cell(0, 8, f"Pagina {self.page_no()} • Generat la {datetime.now().strftime('%Y-%m-%d %H:%M')}", align="R")
+        page  = self.page_labels.get(self.page_no(), self.page_no())
+        total = self.page_totals.get(self.page_no()) or self.page_total or self.str_alias_nb_pages
+        self.cell(0, 8, f"Pagina {page} din {total} • Generat la {datetime.now().strftime('%Y-%m-%d %H:%M')}", align="R")
 
     # ---- Header tabel multi-linie (fără overflow) ----
     def _draw_table_header(self):
         self.set_font(FAMILY, "B", HEADER_FONT_SIZE)
         self.set_fill_color(238, 238, 238)
 
-        wrapped = []
-        max_lines = 1
-        for w, text in zip(self.col_w, self.headers):
-            box_w = max(0.0, w - 2 * PAD_X)
-            lines = wrap_text_to_width(self, text, box_w)
-            wrapped.append((w, lines, box_w))
-            max_lines = max(max_lines, len(lines))
-
+        wrapped, max_lines = _header_layout(self)
         header_h = max_lines * HEADER_LINE_H
         x_left = self.get_x()
         y_top  = self.get_y()
@@ -154,46 +153,60 @@ class NirPDF(FPDF):
     def ensure_space(self, row_h: float):
         """Dacă rândul nu încape, rupe pagina și redesenează headerul tabelului."""
         # păstrăm o „zonă tampon” de 12 mm ca să nu călcăm peste footerul de o linie
-        buffer_zone = 12
+        buffer_zone = TABLE_BOTTOM_GAP
         if self.get_y() + row_h > (self.page_break_trigger - buffer_zone):
             self.add_page()  # header() redesenează capul tabelului
 
 # ========================== Desen rând tabel ==========================
-def draw_row(pdf: NirPDF, row: Dict[str, Any], line_h: float = LINE_H):
-    pdf.set_font(FAMILY, "", TABLE_FONT_SIZE)
+@dataclass
+class RowPlan:
+    """Un rând de tabel măsurat: denumirea deja împărțită pe linii și celulele formatate."""
+    lines: List[str]
+    cells: Tuple[str, str, str, str, str]  # UM, cant., preț, TVA%, total
+    line_h: float = LINE_H
+
+    @property
+    def height(self) -> float:
+        return max(1, len(self.lines)) * self.line_h
+
+
+def plan_row(pdf: NirPDF, row: Dict[str, Any], line_h: float = LINE_H) -> RowPlan:
+    # Extrage câmpuri (dict liber, cu fallback-uri defensive)
+    return plan_values(
+        pdf,
+        str(row.get("name", "") or ""),
+        str(row.get("unit", "") or ""),
+        coalesce(row.get("qty")),
+        coalesce(row.get("price")),
+        coalesce(row.get("vat_pct"), row.get("vat")),
+        coalesce(row.get("line_net")),
+        coalesce(row.get("total")),
+        line_h,
+    )
 
-    # Extrage câmpuri + derive simple
-    name      = str(row.get("name", "") or "")
-    unit      = str(row.get("unit", "") or "")
-    qty       = coalesce(row.get("qty"))
-    price     = coalesce(row.get("price"))
-    vat_pct   = coalesce(row.get("vat_pct"), row.get("vat"))
-    line_net  = coalesce(row.get("line_net"))
-    total     = coalesce(row.get("total"))
 
+def plan_values(pdf: NirPDF, name: str, unit: str, qty: float, price: float, vat_pct: float,
+                line_net: float, total: float, line_h: float = LINE_H) -> RowPlan:
+    pdf.set_font(FAMILY, "", TABLE_FONT_SIZE)
+
+    # Derive simple
     if total == 0.0 and line_net > 0:
         total = round(line_net * (1.0 + vat_pct / 100.0), 2)
     if line_net == 0.0 and qty > 0 and price > 0:
         line_net = round(qty * price, 2)
 
-    unit_txt  = unit
-    qty_txt   = fmt_float(qty, 2)
-    price_txt = fmt_float(price, 2)
-    vat_txt   = fmt_float(vat_pct, 0)
-    total_txt = fmt_float(total, 2)
-
     # Wrap pentru „Denumire”
     name_w   = max(0.0, pdf.col_w[0] - 2 * PAD_X)
     name_ln  = wrap_text_to_width(pdf, name, name_w)
-    n_lines  = max(1, len(name_ln))
-    row_h    = n_lines * line_h
+    cells    = (unit, fmt_float(qty, 2), fmt_float(price, 2), fmt_float(vat_pct, 0), fmt_float(total, 2))
+    return RowPlan(name_ln, cells, line_h)
 
-    # Page-break dacă nu încape rândul (cu buffer pentru footer)
-    pdf.ensure_space(row_h)
 
-    # Coordonate
-    x0 = pdf.get_x()
-    y0 = pdf.get_y()
+def draw_planned_row(pdf: NirPDF, rp: RowPlan, x0: float, y0: float) -> None:
+    pdf.set_font(FAMILY, "", TABLE_FONT_SIZE)
+    line_h = rp.line_h
+    row_h  = rp.height
+    name_w = max(0.0, pdf.col_w[0] - 2 * PAD_X)
 
     # Borduri pentru rând
     x = x0
@@ -203,25 +216,27 @@ def draw_row(pdf: NirPDF, row: Dict[str, Any], line_h: float = LINE_H):
 
     # Text în celule
     # 1) Denumire multi-linie
-    for i, ln in enumerate(name_ln):
+    for i, ln in enumerate(rp.lines):
         pdf.set_xy(x0 + PAD_X, y0 + i * line_h)
         pdf.cell(name_w, line_h, ln, ln=0, align="L")
 
     # 2) Restul (o linie, centrat vertical)
-    def write_cell(x_left: float, w: float, text: str, align="R"):
-        y_text = y0 + (row_h - line_h) / 2.0
-        pdf.set_xy(x_left, y_text)
-        pdf.cell(w, line_h, text, ln=0, align=align)
-
+    y_text = y0 + (row_h - line_h) / 2.0
     x = x0 + pdf.col_w[0]
-    write_cell(x,                pdf.col_w[1], unit_txt,  align="C"); x += pdf.col_w[1]
-    write_cell(x,                pdf.col_w[2], qty_txt,   align="R"); x += pdf.col_w[2]
-    write_cell(x,                pdf.col_w[3], price_txt, align="R"); x += pdf.col_w[3]
-    write_cell(x,                pdf.col_w[4], vat_txt,   align="C"); x += pdf.col_w[4]
-    write_cell(x,                pdf.col_w[5], total_txt, align="R")
+    for w, text, align in zip(pdf.col_w[1:], rp.cells, ("C", "R", "R", "C", "R")):
+        pdf.set_xy(x, y_text)
+        pdf.cell(w, line_h, text, ln=0, align=align)
+        x += w
 
     pdf.set_xy(x0, y0 + row_h)
 
+
+def draw_row(pdf: NirPDF, row: Dict[str, Any], line_h: float = LINE_H):
+    """Desenează un rând la poziția curentă, cu page-break la nevoie (fără plan de paginare)."""
+    rp = plan_row(pdf, row, line_h)
+    pdf.ensure_space(rp.height)
+    draw_planned_row(pdf, rp, pdf.get_x(), pdf.get_y())
+
 # ========================== Footer pe o singură linie ==========================
 def draw_footer_single_line(pdf: NirPDF, inv_date: str):
     """
@@ -254,8 +269,214 @@ def draw_footer_single_line(pdf: NirPDF, inv_date: str):
         pdf.cell(w, 6, text, ln=0, align="L")
         x += w
 
+# ========================== Fonturi ==========================
+def preload_fonts() -> None:
+    """
+    Încălzește procesul (ex. initializer pentru pool-uri de procese): importurile fontTools
+    și fișierele de font (cache-ul OS). Fiecare document își parsează totuși fonturile prin
+    `FPDF.add_font`: fpdf subsetează tabelele fontului in-place la output, iar o copie a
+    obiectului TTFFont fără API-ul lui privat nu e posibilă.
+    """
+    if os.path.isfile(REGULAR_TTF) and os.path.isfile(BOLD_TTF):
+        scratch = FPDF()
+        scratch.add_font(FAMILY, "", REGULAR_TTF)
+        scratch.add_font(FAMILY, "B", BOLD_TTF)
+
+
+# ========================== Plan de paginare ==========================
+@dataclass
+class PagePlan:
+    number: int
+    repeat_header: bool = False              # capul tabelului desenat de header() (pagini de continuare)
+    table_header_y: Optional[float] = None   # doar pe prima pagină, sub blocul de informații
+    first_row: int = 0                       # primul rând al paginii, în fluxul `_row_pieces`
+    row_count: int = 0
+    rows_y: Optional[float] = None           # y-ul primului rând
+    totals_y: Optional[float] = None         # totaluri + semnături, pe ultima pagină
+
+
+@dataclass
+class NirLayout:
+    """
+    Planul ține doar intervalele de rânduri ale fiecărei pagini, nu rândurile măsurate:
+    la desen se re-generează din payload (măsurarea costă puțin față de randare), deci
+    memoria planului nu crește cu numărul de linii.
+    """
+    pages: List[PagePlan]
+    info_h: float
+    row_max_h: float  # un rând mai înalt de atât se continuă pe pagina următoare (_split_row)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+
+def _party_text(p: Dict[str, Any]) -> str:
+    return f"{p.get('name','-')}\nCUI: {p.get('cui','-')}\n{p.get('address','-')}"
+
+
+def _info_heights(pdf: NirPDF, nir_data: Dict[str, Any]) -> Tuple[float, float]:
+    """Înălțimea casetelor Furnizor / Cumpărător (multi_cell în dry-run, pe o pagină deja deschisă)."""
+    pdf.set_font(FAMILY, "", INFO_FONT_SIZE)
+    pdf.set_x(MARGIN_L)
+    h_s = pdf.multi_cell(140, 6, _party_text(nir_data.get("supplier", {}) or {}), border=1,
+                         dry_run=True, output="HEIGHT")
+    pdf.set_x(MARGIN_L + 140)
+    h_b = pdf.multi_cell(0, 6, _party_text(nir_data.get("buyer", {}) or {}), border=1,
+                         dry_run=True, output="HEIGHT")
+    return h_s, h_b
+
+
+def _split_row(rp: RowPlan, max_h: float) -> List[RowPlan]:
+    """Un rând mai înalt decât o pagină întreagă se continuă pe paginile următoare."""
+    if rp.height <= max_h:
+        return [rp]
+    per_page = max(1, int(max_h // rp.line_h))
+    chunks = [rp.lines[i:i + per_page] for i in range(0, len(rp.lines), per_page)]
+    return [RowPlan(chunk, rp.cells if i == 0 else ("",) * 5, rp.line_h) for i, chunk in enumerate(chunks)]
+
+
+def item_count(nir_data: Dict[str, Any]) -> int:
+    cols = nir_data.get("columns")
+    return len(cols["name"]) if cols is not None else len(nir_data.get("items", []) or [])
+
+
+def _item_plans(pdf: NirPDF, nir_data: Dict[str, Any]) -> Iterator[RowPlan]:
+    """Rândurile din `columns` (tabelul NIR, citit pe coloane) sau din lista `items`."""
+    cols = nir_data.get("columns")
+    if cols is None:
+        for it in nir_data.get("items", []) or []:
+            yield plan_row(pdf, it)
+        return
+    for vals in zip(cols["name"], cols["unit"], cols["qty"], cols["price"],
+                    cols["vat_pct"], cols["line_net"], cols["total"]):
+        yield plan_values(pdf, *vals)
+
+
+def _row_pieces(pdf: NirPDF, nir_data: Dict[str, Any], max_h: float) -> Iterator[RowPlan]:
+    """Rândurile tabelului, în ordine, cu cele prea înalte deja împărțite pe pagini."""
+    for row in _item_plans(pdf, nir_data):
+        yield from _split_row(row, max_h)
+
+
+def plan_layout(pdf: NirPDF, nir_data: Dict[str, Any]) -> NirLayout:
+    """
+    Prima trecere: măsoară fiecare rând și stabilește paginile, fără să deseneze nimic.
+    Regulile sunt cele de la desen: un rând trece pe pagina următoare dacă nu mai încape
+    deasupra zonei tampon, capul tabelului se repetă pe fiecare pagină de continuare,
+    iar totalurile + linia de semnături rămân împreună pe ultima pagină.
+    `pdf` trebuie să aibă o pagină deschisă (multi_cell în dry-run o cere).
+    """
+    page_top = pdf.t_margin + TITLE_H + 1
+    bottom   = pdf.page_break_trigger - TABLE_BOTTOM_GAP
+    pdf.set_font(FAMILY, "B", HEADER_FONT_SIZE)
+    header_h = _header_layout(pdf)[1] * HEADER_LINE_H
+
+    # bloc informații: Factura (7) + 1 + Furnizor/Cumpărător (7) + casete + 2 + Nr. poziții (6) + 1
+    info_h = 7 + 1 + 7 + max(_info_heights(pdf, nir_data)) + 2 + 6 + 1
+
+    page  = PagePlan(1, table_header_y=page_top + info_h)
+    pages = [page]
+    y = page.table_header_y + header_h
+    max_h = bottom - (page_top + header_h)
+    for i, rp in enumerate(_row_pieces(pdf, nir_data, max_h)):
+        if y + rp.height > bottom:
+            page = PagePlan(len(pages) + 1, repeat_header=True)
+            pages.append(page)
+            y = page_top + header_h
+        if not page.row_count:
+            page.first_row, page.rows_y = i, y
+        page.row_count += 1
+        y += rp.height
+
+    # totalurile nu au voie să intre peste linia de semnături
+    totals_y = y + 2
+    if totals_y + TOTALS_H > pdf.h - pdf.b_margin - SIGNATURE_OFFSET:
+        page = PagePlan(len(pages) + 1)
+        pages.append(page)
+        totals_y = page_top
+    page.totals_y = totals_y
+    return NirLayout(pages, info_h, max_h)
+
+
+# ========================== Renderer reutilizabil ==========================
+class NirRenderer:
+    """
+    Generează PDF-uri NIR; capul de tabel și lățimile glifelor se cachează per proces.
+    O instanță poate fi folosită concurent din mai multe thread-uri.
+    """
+
+    def __init__(self, regular_ttf: str = REGULAR_TTF, bold_ttf: str = BOLD_TTF):
+        self.regular_ttf = regular_ttf
+        self.bold_ttf    = bold_ttf
+
+    def _add_fonts(self, pdf: NirPDF) -> None:
+        if not (os.path.isfile(self.regular_ttf) and os.path.isfile(self.bold_ttf)):
+            raise RuntimeError("Lipsesc fonturile DejaVuSans.ttf / DejaVuSans-Bold.ttf în app/assets/fonts/.")
+        pdf.add_font(FAMILY, "", self.regular_ttf)
+        pdf.add_font(FAMILY, "B", self.bold_ttf)
+
+    def new_pdf(self) -> NirPDF:
+        """PDF gol în LANDSCAPE A4, cu margini și fonturile Unicode deja înregistrate."""
+        pdf = NirPDF(orientation="L", unit="mm", format="A4")
+        pdf.set_margins(MARGIN_L, MARGIN_T, MARGIN_R)
+        pdf.set_auto_page_break(auto=True, margin=MARGIN_B)
+        self._add_fonts(pdf)
+        return pdf
+
+    def plan(self, nir_data: Dict[str, Any]) -> NirLayout:
+        """Planul de paginare, calculat pe un document de lucru (nimic nu se randează)."""
+        scratch = self.new_pdf()
+        scratch.add_page()
+        return plan_layout(scratch, nir_data)
+
+    def page_count(self, nir_data: Dict[str, Any]) -> int:
+        return self.plan(nir_data).page_count
+
+    def render(self, nir_data: Dict[str, Any], pages: Optional[Iterable[int]] = None,
+               layout: Optional[NirLayout] = None) -> bytes:
+        """`pages` (numerotare de la 1) limitează randarea la acele pagini, ex. `range(1, 2)` pentru preview."""
+        return self._finish(nir_data, pages, layout, None)
+
+    def write(self, target: Target, nir_data: Dict[str, Any], pages: Optional[Iterable[int]] = None,
+              layout: Optional[NirLayout] = None) -> None:
+        """Ca `render`, dar documentul se scrie direct în `target`, fără copia ca bytes."""
+        self._finish(nir_data, pages, layout, target)
+
+    def _finish(self, nir_data: Dict[str, Any], pages: Optional[Iterable[int]],
+                layout: Optional[NirLayout], target: Optional[Target]) -> Optional[bytes]:
+        pdf = self.new_pdf()
+        _draw(pdf, nir_data, layout or self.plan(nir_data), pages)
+        return _output(pdf, target)
+
+    def render_book(self, payloads: Iterable[Dict[str, Any]]) -> bytes:
+        """
+        Mai multe NIR-uri într-un singur PDF: fiecare începe pe pagină nouă, își păstrează
+        numerotarea („Pagina 1 din N”) și are un semn de carte cu numărul facturii.
+        Fonturile se subsetează o singură dată pentru tot documentul.
+        """
+        pdf, scratch = self.new_pdf(), self.new_pdf()
+        scratch.add_page()
+        for nir_data in payloads:
+            _draw(pdf, nir_data, plan_layout(scratch, nir_data), section=book_title(nir_data))
+        if pdf.page == 0:
+            raise ValueError("Niciun NIR de pus în registru.")
+        return _output(pdf)
+
+
+_DEFAULT_RENDERER = NirRenderer()
+
+
+def book_title(nir_data: Dict[str, Any]) -> str:
+    """Eticheta din outline: numărul facturii și furnizorul."""
+    supplier = str((nir_data.get("supplier") or {}).get("name") or "").strip()
+    inv_id = str(nir_data.get("invoice_id") or "N/A")
+    return f"{inv_id} — {supplier}" if supplier else inv_id
+
+
 # ========================== Generator principal ==========================
-def generate_pdf(nir_data: Dict[str, Any]) -> bytes:
+@instrumented("generate_pdf", lines=lambda out, nir_data, *a, **k: item_count(nir_data))
+def generate_pdf(nir_data: Dict[str, Any], pages: Optional[Iterable[int]] = None) -> bytes:
     """
     Așteaptă dict:
     {
@@ -263,71 +484,60 @@ def generate_pdf(nir_data: Dict[str, Any]) -> bytes:
       "invoice_date": str,
       "supplier": { "name":..., "cui":..., "address":... },
       "buyer":    { "name":..., "cui":..., "address":... },
+      "columns": { "name": [...], "unit": [...], "qty": [...], "price": [...],
+                   "vat_pct": [...], "line_net": [...], "total": [...] },
+      # sau, rând cu rând:
       "items": [
          { "name":..., "unit":..., "qty":..., "price":..., "vat_pct"/"vat":..., "line_net":..., "total":... },
       ],
       "totals": { "subtotal":..., "vat":..., "grand_total":... }
     }
+    `pages` (opțional, de la 1): doar paginile cerute, numerotate ca în documentul complet.
     """
-    # 1) Inițializare PDF în LANDSCAPE A4
-    pdf = NirPDF(orientation="L", unit="mm", format="A4")
-    pdf.set_margins(MARGIN_L, MARGIN_T, MARGIN_R)
-    pdf.set_auto_page_break(auto=True, margin=MARGIN_B)
+    # 1-2) PDF LANDSCAPE A4 + fonturi Unicode (parsate o dată per proces)
+    return _DEFAULT_RENDERER.render(nir_data, pages)
 
-    # 2) Fonturi Unicode
-    if os.path.isfile(REGULAR_TTF) and os.path.isfile(BOLD_TTF):
-        pdf.add_font(FAMILY, "", REGULAR_TTF, uni=True)
-        pdf.add_font(FAMILY, "B", BOLD_TTF,    uni=True)
-    else:
-        raise RuntimeError("Lipsesc fonturile DejaVuSans.ttf / DejaVuSans-Bold.ttf în app/assets/fonts/.")
 
-    pdf.add_page()
+@instrumented("write_pdf", lines=lambda out, target, nir_data, *a, **k: item_count(nir_data))
+def write_pdf(target: Target, nir_data: Dict[str, Any], pages: Optional[Iterable[int]] = None) -> None:
+    """`generate_pdf` scris într-o cale sau un file-like binar (ex. fișier temporar), fără copia ca bytes."""
+    _DEFAULT_RENDERER.write(target, nir_data, pages)
 
-    # 3) Header informații factură
-    inv_id   = str(nir_data.get("invoice_id", "N/A"))
-    inv_date = str(nir_data.get("invoice_date", "N/A"))
-    supplier = nir_data.get("supplier", {}) or {}
-    buyer    = nir_data.get("buyer", {}) or {}
-    items    = nir_data.get("items", []) or []
 
-    pdf.set_font(FAMILY, "", INFO_FONT_SIZE)
-    pdf.cell(0, 7, f"Factura: {inv_id}   |   Data: {inv_date}", ln=True)
-
-    pdf.ln(1)
-    pdf.set_font(FAMILY, "B", INFO_FONT_SIZE + 1)
-    pdf.cell(140, 7, "Furnizor", ln=0)
-    pdf.cell(140, 7, "Cumpărător", ln=1)
-
-    pdf.set_font(FAMILY, "", INFO_FONT_SIZE)
-    s_text = f"{supplier.get('name','-')}\nCUI: {supplier.get('cui','-')}\n{supplier.get('address','-')}"
-    b_text = f"{buyer.get('name','-')}\nCUI: {buyer.get('cui','-')}\n{buyer.get('address','-')}"
-    y_before = pdf.get_y()
-    pdf.multi_cell(140, 6, s_text, border=1)
-    pdf.set_xy(MARGIN_L + 140, y_before)
-    pdf.multi_cell(0, 6, b_text, border=1)
-
-    pdf.ln(2)
-    pdf.set_font(FAMILY, "", INFO_FONT_SIZE)
-    pdf.cell(0, 6, f"Nr. poziții: {len(items)}", ln=True)
-    pdf.ln(1)
-
-    # 4) Tabel produse
-    pdf.in_table = True
-    pdf._draw_table_header()
-
-    pdf.set_font(FAMILY, "", TABLE_FONT_SIZE)
-    for it in items:
-        draw_row(pdf, it, line_h=LINE_H)
+def spooled_pdf(nir_data: Dict[str, Any], max_memory: int = 4 * 1024 * 1024) -> BinaryIO:
+    """
+    PDF-ul într-un `SpooledTemporaryFile`, derulat la început: rămâne în memorie până la
+    `max_memory` octeți, apoi trece pe disc. Apelantul închide fișierul.
+    """
+    f = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    try:
+        write_pdf(f, nir_data)
+        f.seek(0)
+    except BaseException:
+        f.close()
+        raise
+    return f
 
-    pdf.in_table = False
 
-    # 5) Totaluri (fallback defensiv dacă lipsesc)
+def _totals(nir_data: Dict[str, Any]) -> Tuple[float, float, float]:
+    # Totaluri (fallback defensiv dacă lipsesc)
+    items    = nir_data.get("items", []) or []
     totals   = nir_data.get("totals", {}) or {}
     subtotal = coalesce(totals.get("subtotal"))
     vat_sum  = coalesce(totals.get("vat"))
     grand    = coalesce(totals.get("grand_total"))
 
-    if subtotal == 0.0 or vat_sum == 0.0 or grand == 0.0:
+    cols = nir_data.get("columns")
+    if (subtotal == 0.0 or vat_sum == 0.0 or grand == 0.0) and cols is not None:
+        net   = np.asarray(cols["line_net"], dtype=float)
+        rate  = np.asarray(cols["vat_pct"], dtype=float)
+        gross = np.asarray(cols["total"], dtype=float)
+        gross = np.where(gross == 0.0, np.where(net > 0, net * (1.0 + rate / 100.0), 0.0), gross)
+        s_net, s_vat, s_gross = float(net.sum()), float((net * (rate / 100.0)).sum()), float(gross.sum())
+        if subtotal == 0.0: subtotal = round(s_net, 2)
+        if vat_sum  == 0.0: vat_sum  = round(s_vat, 2)
+        if grand    == 0.0: grand    = round(s_gross, 2)
+    elif subtotal == 0.0 or vat_sum == 0.0 or grand == 0.0:
         s_net = s_vat = s_gross = 0.0
         for it in items:
             ln_net = coalesce(it.get("line_net"), it.get("qty", 0) * it.get("price", 0))
@@ -341,18 +551,102 @@ def generate_pdf(nir_data: Dict[str, Any]) -> bytes:
         if subtotal == 0.0: subtotal = round(s_net, 2)
         if vat_sum  == 0.0: vat_sum  = round(s_vat, 2)
         if grand    == 0.0: grand    = round(s_gross, 2)
+    return subtotal, vat_sum, grand
 
-    pdf.ln(2)
+
+def _draw_info(pdf: NirPDF, nir_data: Dict[str, Any], layout: NirLayout) -> None:
+    inv_id   = str(nir_data.get("invoice_id", "N/A"))
+    inv_date = str(nir_data.get("invoice_date", "N/A"))
+
+    pdf.set_font(FAMILY, "", INFO_FONT_SIZE)
+    pdf.cell(0, 7, f"Factura: {inv_id}   |   Data: {inv_date}", ln=True)
+
+    pdf.ln(1)
     pdf.set_font(FAMILY, "B", INFO_FONT_SIZE + 1)
-    pdf.cell(
-        0, 8,
-        f"Subtotal: {fmt_float(subtotal)}    |    TVA: {fmt_float(vat_sum)}    |    Total: {fmt_float(grand)}",
-        ln=True, align="R"
-    )
+    pdf.cell(140, 7, "Furnizor", ln=0)
+    pdf.cell(140, 7, "Cumpărător", ln=1)
+
+    pdf.set_font(FAMILY, "", INFO_FONT_SIZE)
+    y_before = pdf.get_y()
+    pdf.multi_cell(140, 6, _party_text(nir_data.get("supplier", {}) or {}), border=1)
+    pdf.set_xy(MARGIN_L + 140, y_before)
+    pdf.multi_cell(0, 6, _party_text(nir_data.get("buyer", {}) or {}), border=1)
+    # continuăm sub caseta mai înaltă (din plan), nu sub ultima desenată
+    pdf.set_y(layout.pages[0].table_header_y - (2 + 6 + 1))
+
+    pdf.ln(2)
+    pdf.set_font(FAMILY, "", INFO_FONT_SIZE)
+    pdf.cell(0, 6, f"Nr. poziții: {item_count(nir_data)}", ln=True)
+    pdf.ln(1)
 
-    # 6) Footer pe o singură linie (fără borduri/linie orizontală)
-    draw_footer_single_line(pdf, inv_date)
 
-    # 7) Return bytes
-    out = pdf.output(dest="S")
-    return bytes(out) if isinstance(out, (bytes, bytearray)) else out.encode("latin1")
+def _draw(pdf: NirPDF, nir_data: Dict[str, Any], layout: NirLayout,
+          pages: Optional[Iterable[int]] = None, section: Optional[str] = None) -> None:
+    """
+    A doua trecere: desenează paginile din plan (toate sau doar cele cerute) în `pdf`,
+    după paginile deja existente. `section` adaugă o intrare în outline (semn de carte)
+    la prima pagină desenată. Rândurile se re-generează din payload, în ordine, odată
+    cu paginile; cele ale paginilor nerandate doar se sar.
+    """
+    wanted = None if pages is None else set(pages)
+    selected = [pg for pg in layout.pages if wanted is None or pg.number in wanted]
+    if not selected:
+        raise ValueError(f"Nicio pagină de randat: documentul are {layout.page_count} pagini.")
+    pdf.page_total = layout.page_count
+    pieces = _row_pieces(pdf, nir_data, layout.row_max_h)
+    consumed = 0
+
+    for pg in selected:
+        pdf.page_labels[pdf.page + 1] = pg.number
+        pdf.page_totals[pdf.page + 1] = layout.page_count
+        pdf.in_table = pg.repeat_header  # header() redesenează capul tabelului
+        pdf.add_page()
+        pdf.in_table = False
+        if section is not None:
+            pdf.start_section(section)
+            section = None
+
+        # 3) Header informații factură + capul tabelului (prima pagină)
+        if pg.table_header_y is not None:
+            _draw_info(pdf, nir_data, layout)
+            pdf.set_xy(pdf.l_margin, pg.table_header_y)
+            pdf._draw_table_header()
+
+        # 4) Tabel produse, la pozițiile din plan
+        pdf.set_font(FAMILY, "", TABLE_FONT_SIZE)
+        if pg.row_count:
+            for _ in islice(pieces, pg.first_row - consumed):
+                pass
+            y = pg.rows_y
+            for rp in islice(pieces, pg.row_count):
+                draw_planned_row(pdf, rp, pdf.l_margin, y)
+                y += rp.height
+            consumed = pg.first_row + pg.row_count
+
+        # 5) Totaluri
+        if pg.totals_y is not None:
+            subtotal, vat_sum, grand = _totals(nir_data)
+            pdf.set_xy(pdf.l_margin, pg.totals_y)
+            pdf.set_font(FAMILY, "B", INFO_FONT_SIZE + 1)
+            pdf.cell(
+                0, 8,
+                f"Subtotal: {fmt_float(subtotal)}    |    TVA: {fmt_float(vat_sum)}    |    Total: {fmt_float(grand)}",
+                ln=True, align="R"
+            )
+
+            # 6) Footer pe o singură linie (fără borduri/linie orizontală)
+            draw_footer_single_line(pdf, str(nir_data.get("invoice_date", "N/A")))
+
+
+def _output(pdf: NirPDF, target: Optional[Target] = None) -> Optional[bytes]:
+    """
+    Documentul final ca bytes sau, cu `target` (cale / file-like binar), scris acolo.
+    fpdf ține conținutul tuturor paginilor până la `output()` și construiește tot
+    documentul în `pdf.buffer` înainte de scriere: `target` evită doar copia ca bytes,
+    nu vârful de memorie al documentului.
+    """
+    if target is not None:
+        pdf.output(target)
+        return None
+    return bytes(pdf.output())
+
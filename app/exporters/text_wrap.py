@@ -0,0 +1,187 @@
+# app/exporters/text_wrap.py
+"""
+Wrap de text pentru celulele NIR, cu lățimi de glife ținute în tabele per font/mărime.
+
+`FPDF.get_string_width` trece la fiecare apel prin normalizare, fragmentare bidi și
+construcția unui `Fragment`; wrap-ul vechi îl chema pe un candidat care crește cu
+fiecare token (și caracter cu caracter pentru token-urile lungi -> pătratic).
+Aici lățimile se adună incremental în unități de font (1/1000 em, întregi, exact
+ca `font.cw`), iar comparația se face cu o limită precalculată pentru lățimea
+cutiei -> rezultat identic cu măsurarea prin fpdf, în timp liniar.
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+import re
+
+from fpdf import FPDF
+from fpdf.fonts import TTFFont
+
+_TOKEN_RE = re.compile(r"[^\s/\-\(\),\.]+|[/\-\(\),\.]")
+_DELIMS   = "/-(),."
+
+
+def tokenize_for_wrap(text: str) -> List[str]:
+    if not text:
+        return [""]
+    # Rupe după spații și delimitatori utili la wrap
+    return _TOKEN_RE.findall(str(text))
+
+
+# ========================== Tabele de lățimi ==========================
+class GlyphTable:
+    """Lățimea fiecărui caracter dintr-un font TTF, în unități de font; completată la cerere."""
+    __slots__ = ("cw", "units")
+
+    def __init__(self, cw):
+        self.cw = cw
+        self.units: Dict[str, int] = {}
+
+    def char(self, ch: str) -> int:
+        u = self.units.get(ch)
+        if u is None:
+            u = self.units[ch] = self.cw[ord(ch)]  # defaultdict: glifele lipsă primesc lățimea .notdef
+        return u
+
+    def measure(self, s: str) -> int:
+        get = self.units.get
+        total = 0
+        for ch in s:
+            u = get(ch)
+            total += u if u is not None else self.char(ch)
+        return total
+
+
+class TextMeasure:
+    """Tabelul fontului curent legat de o mărime (pt) și de unitatea documentului."""
+    __slots__ = ("table", "size_pt", "k", "key", "_limits")
+
+    def __init__(self, table: GlyphTable, size_pt: float, k: float, key: Tuple):
+        self.table   = table
+        self.size_pt = size_pt
+        self.k       = k
+        self.key     = key
+        self._limits: Dict[float, int] = {}
+
+    def width(self, units: int) -> float:
+        # aceeași formulă (și aceeași ordine a operațiilor) ca TTFFont.get_text_width + Fragment.get_width
+        return units * self.size_pt * 0.001 / self.k
+
+    def limit(self, width: float) -> int:
+        """Cel mai mare număr de unități care încape în `width` (-1 dacă nici textul gol nu încape)."""
+        lim = self._limits.get(width)
+        if lim is None:
+            lim = int(width * self.k / (self.size_pt * 0.001)) if width > 0 else 0
+            while self.width(lim + 1) <= width:
+                lim += 1
+            while lim >= 0 and self.width(lim) > width:
+                lim -= 1
+            self._limits[width] = lim
+        return lim
+
+
+_TABLES: Dict[str, GlyphTable] = {}
+_MEASURES: Dict[Tuple, TextMeasure] = {}
+
+
+def measure_for(pdf: FPDF) -> Optional[TextMeasure]:
+    """
+    Măsurătorul pentru fontul și mărimea curente ale documentului, sau None când
+    lățimea nu e o simplă sumă de glife (fonturi core/simbol, text shaping,
+    spațiere sau stretching, fonturi fallback) -> se folosește `get_string_width`.
+    """
+    font = pdf.current_font
+    if (type(font) is not TTFFont or getattr(font, "is_symbol", False) or getattr(pdf, "text_shaping", None)
+            or pdf.char_spacing or pdf.font_stretching != 100 or getattr(pdf, "_fallback_font_ids", None)):
+        return None
+    key = (str(font.ttffile), pdf.font_size_pt, pdf.k)
+    m = _MEASURES.get(key)
+    if m is None:
+        table = _TABLES.get(key[0])
+        if table is None:
+            # același fișier -> aceleași lățimi; tabelul se partajează între documente
+            table = _TABLES.setdefault(key[0], GlyphTable(font.cw))
+        m = _MEASURES.setdefault(key, TextMeasure(table, pdf.font_size_pt, pdf.k, key))
+    return m
+
+
+# ========================== Wrap ==========================
+def wrap_text_to_width(pdf: FPDF, text: str, width: float) -> List[str]:
+    """Împarte textul pe linii care încap în 'width'. Rupe și pe delimitatori; dacă
+    un token e prea lung, îl rupe la nivel de caractere."""
+    m = measure_for(pdf)
+    if m is None:
+        return _wrap_measured(pdf, text, width)
+
+    table = m.table
+    limit = m.limit(width)
+    space = table.char(" ")
+    lines: List[str] = []
+    cur, cur_u = "", 0
+
+    for tok in tokenize_for_wrap(text):
+        tok_u = table.measure(tok)
+        if not cur:
+            cand_u = tok_u
+        elif tok in _DELIMS:
+            cand_u = cur_u + tok_u
+        else:
+            cand_u = cur_u + space + tok_u
+        if cand_u <= limit:
+            cur = tok if not cur else (cur + tok if tok in _DELIMS else cur + " " + tok)
+            cur_u = cand_u
+            continue
+
+        if cur:
+            lines.append(cur)
+        if tok_u > limit:
+            # token prea lung: tăiem la nivel de caractere, o singură trecere
+            start, piece_u = 0, 0
+            for i, ch in enumerate(tok):
+                u = table.char(ch)
+                if piece_u + u <= limit:
+                    piece_u += u
+                else:
+                    if i > start:
+                        lines.append(tok[start:i])
+                    start, piece_u = i, u
+            cur, cur_u = tok[start:], piece_u
+        else:
+            cur, cur_u = tok, tok_u
+
+    if cur or not lines:
+        lines.append(cur)
+    return [ln.strip() for ln in lines]
+
+
+def _wrap_measured(pdf: FPDF, text: str, width: float) -> List[str]:
+    """Varianta generică, cu `get_string_width` pe fiecare candidat."""
+    tokens: List[str] = tokenize_for_wrap(text)
+    lines: List[str] = []
+    cur = ""
+
+    def fits(s: str) -> bool:
+        return pdf.get_string_width(s) <= width
+
+    for tok in tokens:
+        candidate = tok if not cur else (cur + tok if tok in _DELIMS else cur + " " + tok)
+        if fits(candidate):
+            cur = candidate
+        else:
+            if cur:
+                lines.append(cur)
+                cur = ""
+            if not fits(tok.strip()):
+                piece = ""
+                for ch in tok:
+                    if fits(piece + ch):
+                        piece += ch
+                    else:
+                        if piece:
+                            lines.append(piece)
+                        piece = ch
+                cur = piece
+            else:
+                cur = tok
+    if cur or not lines:
+        lines.append(cur)
+    return [ln.strip() for ln in lines]
@@ -0,0 +1,82 @@
+# app/exporters/xlsx_nir.py
+from __future__ import annotations
+import io
+import os
+from typing import Any, BinaryIO, Dict, Iterable, Sequence, Union
+
+import pandas as pd
+import xlsxwriter
+
+from app.metrics import instrumented
+from app.nir import NIR_COLUMNS
+
+Target = Union[str, os.PathLike, BinaryIO]
+
+WS_NAME   = "NIR"
+START_ROW = 6  # rândul cu capul de tabel; deasupra sunt metadatele facturii
+
+
+def _s(x: Any) -> str:
+    return str(x or "").strip()
+
+
+def rows_from_df(df: pd.DataFrame) -> Iterable[Sequence[Any]]:
+    """Rândurile tabelului citite direct din coloane (fără indexare pozițională celulă cu celulă)."""
+    return zip(*(df[c].tolist() for c in df.columns))
+
+
+@instrumented("export_xlsx", lines=lambda n, *a, **k: n)
+def write_xlsx(target: Target, rows: Iterable[Sequence[Any]], nir_data: Dict[str, Any],
+               columns: Sequence[str] = NIR_COLUMNS, constant_memory: bool = True) -> int:
+    """
+    Scrie Excel-ul NIR direct în `target` (cale sau obiect file-like), fiecare celulă o
+    singură dată. Formatele sunt atribuite pe coloană, iar rândurile se scriu întregi
+    (`write_row`), în ordine; cu `constant_memory` xlsxwriter golește fiecare rând pe
+    disc imediat, deci memoria nu crește cu numărul de linii. Întoarce numărul de rânduri scrise.
+    """
+    target = os.fspath(target) if isinstance(target, os.PathLike) else target
+    wb = xlsxwriter.Workbook(target, {"constant_memory": constant_memory})
+    try:
+        ws = wb.add_worksheet(WS_NAME)
+
+        # formate
+        fmt_title = wb.add_format({"bold": True, "font_size": 14})
+        fmt_lbl   = wb.add_format({"bold": True})
+        fmt_head  = wb.add_format({"bold": True, "bg_color": "#EEEEEE", "border": 1})
+        fmt_cell  = wb.add_format({"border": 1})
+        fmt_num   = wb.add_format({"num_format": "#,##0.00", "border": 1})
+        fmt_pct   = wb.add_format({"num_format": "0.00", "border": 1})
+
+        # lățimi + formatul fiecărei coloane (celulele fără format propriu îl moștenesc)
+        ws.set_column(0, 0, 60, fmt_cell)  # Denumire
+        ws.set_column(1, 1, 8,  fmt_cell)  # UM
+        ws.set_column(2, 2, 12, fmt_num)   # Cant.
+        ws.set_column(3, 3, 14, fmt_num)   # Preț unitar
+        ws.set_column(4, 4, 14, fmt_num)   # Valoare netă
+        ws.set_column(5, 5, 8,  fmt_pct)   # TVA %
+        ws.set_column(6, 7, 14, fmt_num)   # TVA (lei), Valoare (cu TVA)
+
+        # meta sus (în constant_memory rândurile trebuie scrise strict în ordine)
+        ws.write(0, 0, "NIR generat din e-Factura", fmt_title)
+        ws.write(2, 0, "Număr factură:", fmt_lbl); ws.write(2, 1, _s(nir_data.get("invoice_id")))
+        ws.write(3, 0, "Dată factură:",  fmt_lbl); ws.write(3, 1, _s(nir_data.get("invoice_date")))
+        ws.write(4, 0, "Monedă:",        fmt_lbl); ws.write(4, 1, _s(nir_data.get("currency")))
+
+        ws.write_row(START_ROW, 0, list(columns), fmt_head)
+        r = START_ROW + 1
+        for row in rows:
+            ws.write_row(r, 0, row)
+            r += 1
+
+        ws.freeze_panes(START_ROW + 1, 0)
+    finally:
+        wb.close()
+    return r - START_ROW - 1
+
+
+def generate_xlsx(df: pd.DataFrame, nir_data: Dict[str, Any], constant_memory: bool = True) -> bytes:
+    """Excel-ul (XLSX) NIR pentru tabelul `df` și metadatele din `nir_data`."""
+    excel_buffer = io.BytesIO()
+    write_xlsx(excel_buffer, rows_from_df(df), nir_data, columns=list(df.columns),
+               constant_memory=constant_memory)
+    return excel_buffer.getvalue()
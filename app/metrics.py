@@ -0,0 +1,244 @@
+# app/metrics.py
+"""
+Instrumentare pe etape: timp, număr de linii și vârf de memorie pentru fiecare pas
+al pipeline-ului (parsare, tabel NIR, PDF, XLSX).
+
+    NIR_METRICS=1     -> span-uri cu timp + vârf de memorie (tracemalloc)
+    NIR_METRICS=time  -> doar timp și linii (fără costul tracemalloc)
+    nesetat / 0       -> dezactivat: decoratorul face un singur test de flag
+
+Fiecare span terminat:
+  - se adaugă în agregatele procesului (`prometheus_text()` le expune ca text Prometheus);
+  - se scrie ca o linie JSON pe logger-ul `nir.metrics` (nivel INFO);
+  - ajunge în colectoarele deschise pe firul curent (`collect()`), ex. panoul de
+    diagnostic din UI.
+
+Vârful de memorie e cel al alocărilor Python urmărite de tracemalloc, relativ la
+începutul span-ului; span-urile imbricate nu strică vârful celui exterior. tracemalloc
+e global pe proces: cu mai multe fire care lucrează simultan, vârfurile se amestecă.
+"""
+from __future__ import annotations
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger("nir.metrics")
+
+RECENT_MAX = 256  # span-uri recente păstrate în memorie (pentru inspecție/depanare)
+
+
+@dataclass
+class Span:
+    stage: str
+    seconds: float = 0.0
+    lines: Optional[int] = None
+    peak_bytes: Optional[int] = None
+    error: Optional[str] = None
+    # stare internă pentru memorie (absolută, în octeți tracemalloc)
+    _mem_start: int = field(default=0, repr=False)
+    _mem_peak: int = field(default=0, repr=False)
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = {k: v for k, v in asdict(self).items() if not k.startswith("_")}
+        d["ms"] = round(d.pop("seconds") * 1000, 3)
+        return d
+
+
+@dataclass
+class _Agg:
+    count: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    lines: int = 0
+    peak_bytes: int = 0
+
+
+class Metrics:
+    """Registrul procesului: configurare, agregate pe etapă și span-urile recente."""
+
+    def __init__(self):
+        self.enabled = False
+        self.memory  = False
+        self._own_tracemalloc = False
+        self._lock   = threading.Lock()
+        self._local  = threading.local()
+        self._aggs: Dict[str, _Agg] = {}
+        self.recent: Deque[Span] = deque(maxlen=RECENT_MAX)
+
+    # ---- configurare ----
+    def enable(self, memory: bool = True) -> None:
+        self.enabled = True
+        self.memory  = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracemalloc = True
+
+    def disable(self) -> None:
+        self.enabled = False
+        self.memory  = False
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+            self._own_tracemalloc = False
+
+    def configure_from_env(self) -> None:
+        mode = os.environ.get("NIR_METRICS", "").strip().lower()
+        if mode in ("", "0", "off", "false", "no"):
+            self.disable()
+        else:
+            self.enable(memory=(mode != "time"))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._aggs.clear()
+            self.recent.clear()
+
+    # ---- stare per fir ----
+    def _stack(self) -> List[Span]:
+        st = getattr(self._local, "stack", None)
+        if st is None:
+            st = self._local.stack = []
+        return st
+
+    def _collectors(self) -> List[List[Span]]:
+        cs = getattr(self._local, "collectors", None)
+        if cs is None:
+            cs = self._local.collectors = []
+        return cs
+
+    # ---- span-uri ----
+    def _enter(self, sp: Span) -> None:
+        stack = self._stack()
+        if self.memory and tracemalloc.is_tracing():
+            cur, peak = tracemalloc.get_traced_memory()
+            if stack:  # vârful de până acum aparține și span-ului exterior
+                stack[-1]._mem_peak = max(stack[-1]._mem_peak, peak)
+            tracemalloc.reset_peak()
+            sp._mem_start = sp._mem_peak = cur
+        stack.append(sp)
+        sp.seconds = time.perf_counter()
+
+    def _exit(self, sp: Span) -> None:
+        sp.seconds = time.perf_counter() - sp.seconds
+        stack = self._stack()
+        if stack and stack[-1] is sp:
+            stack.pop()
+        if self.memory and tracemalloc.is_tracing():
+            peak = max(sp._mem_peak, tracemalloc.get_traced_memory()[1])
+            sp.peak_bytes = max(0, peak - sp._mem_start)
+            if stack:
+                stack[-1]._mem_peak = max(stack[-1]._mem_peak, peak)
+        self._record(sp)
+
+    def _add(self, sp: Span) -> None:
+        agg = self._aggs.setdefault(sp.stage, _Agg())
+        agg.count   += 1
+        agg.errors  += 1 if sp.error else 0
+        agg.seconds += sp.seconds
+        agg.lines   += sp.lines or 0
+        agg.peak_bytes = max(agg.peak_bytes, sp.peak_bytes or 0)
+        self.recent.append(sp)
+
+    def _record(self, sp: Span) -> None:
+        with self._lock:
+            self._add(sp)
+        for c in self._collectors():
+            c.append(sp)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({"event": "nir.span", **sp.as_dict()}, ensure_ascii=False))
+
+    @contextmanager
+    def span(self, stage: str, lines: Optional[int] = None) -> Iterator[Optional[Span]]:
+        """Măsoară blocul; cu instrumentarea oprită dă None și nu face nimic altceva."""
+        if not self.enabled:
+            yield None
+            return
+        sp = Span(stage, lines=lines)
+        self._enter(sp)
+        try:
+            yield sp
+        except BaseException as e:
+            sp.error = type(e).__name__
+            raise
+        finally:
+            self._exit(sp)
+
+    def absorb(self, spans: Iterable[Span]) -> None:
+        """Span-uri terminate în alt proces (ex. workerii pool-ului API): intră doar în agregate și `recent`."""
+        with self._lock:
+            for sp in spans:
+                self._add(sp)
+
+    @contextmanager
+    def collect(self) -> Iterator[List[Span]]:
+        """Strânge span-urile terminate pe firul curent cât timp blocul e activ."""
+        bucket: List[Span] = []
+        cs = self._collectors()
+        cs.append(bucket)
+        try:
+            yield bucket
+        finally:
+            cs.remove(bucket)
+
+    # ---- export ----
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {k: asdict(v) for k, v in self._aggs.items()}
+
+    def prometheus_text(self, prefix: str = "nir") -> str:
+        """Agregatele în formatul text Prometheus (expozitie 0.0.4)."""
+        snap = self.snapshot()
+        series = (
+            ("stage_calls_total",  "counter", "Apeluri ale etapei",                     "count"),
+            ("stage_errors_total", "counter", "Apeluri terminate cu excepție",           "errors"),
+            ("stage_seconds_total", "counter", "Timp total petrecut în etapă (s)",      "seconds"),
+            ("stage_lines_total",  "counter", "Linii de factură procesate de etapă",    "lines"),
+            ("stage_peak_bytes",   "gauge",   "Cel mai mare vârf de alocare al etapei", "peak_bytes"),
+        )
+        out: List[str] = []
+        for name, kind, help_, key in series:
+            metric = f"{prefix}_{name}"
+            out.append(f"# HELP {metric} {help_}")
+            out.append(f"# TYPE {metric} {kind}")
+            for stage in sorted(snap):
+                val = snap[stage][key]
+                out.append(f'{metric}{{stage="{stage}"}} {val:.6f}' if isinstance(val, float)
+                           else f'{metric}{{stage="{stage}"}} {val}')
+        return "\n".join(out) + "\n"
+
+
+METRICS = Metrics()
+METRICS.configure_from_env()
+
+span    = METRICS.span
+collect = METRICS.collect
+
+
+def instrumented(stage: str, lines: Optional[Callable[..., Optional[int]]] = None):
+    """
+    Decorator: rulează funcția într-un span `stage`. `lines(result, *args, **kwargs)`
+    dă numărul de linii procesate. Cu instrumentarea oprită: apel direct.
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return fn(*args, **kwargs)
+            with METRICS.span(stage) as sp:
+                result = fn(*args, **kwargs)
+                if lines is not None:
+                    try:
+                        sp.lines = lines(result, *args, **kwargs)
+                    except Exception:
+                        pass
+                return result
+        wrapper.__wrapped__ = fn
+        return wrapper
+    return deco
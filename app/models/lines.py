@@ -0,0 +1,106 @@
+# app/models/lines.py
+"""
+`LineBlock` fără dependențe în afara bibliotecii standard: parserul, regulile și
+arhiva îl folosesc fără să încarce pydantic. Modelele (app/models/schemas.py) se
+importă doar la `to_models()`. Valorile nefinite (NaN/inf) le raportează regula NIR-01
+(app/rules.py), evaluată pe coloane la fiecare parsare.
+
+Payload-ul parserului ține liniile ca `LineBlock`; la graniță (JSON, hash de conținut)
+se folosește `plain_payload`, aceeași copie cu liniile ca listă de dict-uri.
+"""
+from __future__ import annotations
+from array import array
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List
+
+if TYPE_CHECKING:
+    from app.models.schemas import InvoiceLine
+
+
+class LineBlock(Sequence):
+    """
+    Liniile facturii ca struct-of-arrays: textele în liste, sumele în `array('d')`
+    (8 octeți pe valoare, fără obiecte float și fără un dict per linie).
+    Se comportă ca lista de dict-uri de dinainte: `len`, index, iterare -> dict
+    {name, qty, unit, price, line_net, vat_pct} construit la cerere; pentru calcule
+    vectorizate se citesc direct coloanele (`column`).
+    """
+    __slots__ = ("name", "qty", "unit", "price", "line_net", "vat_pct")
+
+    FIELDS  = ("name", "qty", "unit", "price", "line_net", "vat_pct")
+    NUMERIC = ("qty", "price", "line_net", "vat_pct")
+
+    def __init__(self):
+        self.name: List[str] = []
+        self.unit: List[str] = []
+        self.qty      = array("d")
+        self.price    = array("d")
+        self.line_net = array("d")
+        self.vat_pct  = array("d")
+
+    @classmethod
+    def from_rows(cls, rows) -> "LineBlock":
+        block = cls()
+        for r in rows:
+            block.append(str(r.get("name") or ""), float(r.get("qty") or 0), str(r.get("unit") or ""),
+                         float(r.get("price") or 0), float(r.get("line_net") or 0), float(r.get("vat_pct") or 0))
+        return block
+
+    def append(self, name: str, qty: float, unit: str, price: float, line_net: float, vat_pct: float) -> None:
+        self.name.append(name)
+        self.qty.append(qty)
+        self.unit.append(unit)
+        self.price.append(price)
+        self.line_net.append(line_net)
+        self.vat_pct.append(vat_pct)
+
+    def column(self, key: str):
+        return getattr(self, key)
+
+    # ---- interfața de listă de dict-uri ----
+    def __len__(self) -> int:
+        return len(self.name)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            out = LineBlock()
+            for f in self.FIELDS:
+                setattr(out, f, getattr(self, f)[i])
+            return out
+        return dict(zip(self.FIELDS, (getattr(self, f)[i] for f in self.FIELDS)))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        fields = self.FIELDS
+        for vals in zip(self.name, self.qty, self.unit, self.price, self.line_net, self.vat_pct):
+            yield dict(zip(fields, vals))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LineBlock):
+            return all(getattr(self, f) == getattr(other, f) for f in self.FIELDS)
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"LineBlock({len(self)} linii)"
+
+    # ---- vederi ----
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Liniile ca listă de dict-uri (forma serializabilă)."""
+        return list(self)
+
+    def to_models(self) -> List[InvoiceLine]:
+        """Modele `InvoiceLine` per linie (pentru consumatorii care le cer explicit)."""
+        from app.models.schemas import InvoiceLine
+
+        return [InvoiceLine.model_construct(**row) for row in self]
+
+
+def plain_payload(inv: Dict[str, Any]) -> Dict[str, Any]:
+    """Copie superficială a payload-ului cu `lines` ca listă de dict-uri (ex. pentru `json.dumps`)."""
+    lines = inv.get("lines")
+    if isinstance(lines, LineBlock):
+        inv = {**inv, "lines": lines.to_list()}
+    return inv
@@ -1,14 +1,19 @@
-from pydantic import BaseModel
 from typing import List, Optional
 
+from pydantic import BaseModel
+
+from app.models.lines import LineBlock  # noqa: F401  (reexport: importurile vechi rămân valide)
+
 class InvoiceLine(BaseModel):
     name: Optional[str] = None
     qty: Optional[float] = None
     unit: Optional[str] = None
     price: Optional[float] = None
+    line_net: Optional[float] = None
+    vat_pct: Optional[float] = None
 
 class InvoiceHeader(BaseModel):
     id: Optional[str] = None
     issue_date: Optional[str] = None
     currency: Optional[str] = None
-    lines: List[InvoiceLine] = []
\ No newline at end of file
+    lines: List[InvoiceLine] = []
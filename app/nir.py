@@ -0,0 +1,258 @@
+# app/nir.py
+from __future__ import annotations
+import re
+import unicodedata
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.metrics import instrumented
+from app.models.lines import LineBlock
+
+if TYPE_CHECKING:
+    import pandas as pd  # încărcat la primul tabel NIR, nu la importul modulului
+
+# Coloanele tabelului NIR (ordinea din UI / Excel)
+NIR_COLUMNS = [
+    "Denumire", "UM", "Cant.", "Preț unitar", "Valoare netă",
+    "TVA %", "TVA (lei)", "Valoare (cu TVA)",
+]
+
+
+def s(x: Any) -> str:
+    """safe string for UI"""
+    return str(x or "").strip()
+
+
+def filename_safe_id(raw_id: str) -> str:
+    """ID sigur pentru nume de fișier (nu afectează afișarea)."""
+    cleaned = re.sub(r"[^\w\-.]+", "_", s(raw_id))
+    cleaned = cleaned.strip("_")
+    return cleaned or "invoice"
+
+
+# ------------------------ calcul pe coloane ------------------------
+# cheia din payload-ul pentru exportere -> titlul coloanei din tabel
+NIR_FIELDS = {
+    "name": "Denumire", "unit": "UM", "qty": "Cant.", "price": "Preț unitar",
+    "line_net": "Valoare netă", "vat_pct": "TVA %", "vat": "TVA (lei)", "total": "Valoare (cu TVA)",
+}
+
+
+def round_half_even(a: np.ndarray, nd: int = 2) -> np.ndarray:
+    """
+    Vectorizat, identic cu `round(x, nd)` din Python (rotunjire corectă a valorii binare
+    exacte, jumătăți la par). `np.round` înmulțește cu 10**nd și pierde bitul care decide
+    cazurile de la limită (~1% din sume ar diferi cu un ban).
+    """
+    a = np.asarray(a, dtype=float)
+    scale = float(10 ** nd)
+    x = np.abs(a)
+    p = x * scale
+    # produsul exact e p + err (split Dekker; scale are sub 27 de biți)
+    c = 134217729.0 * x
+    hi = c - (c - x)
+    err = (hi * scale - p) + (x - hi) * scale
+    n = np.floor(p)
+    d = p - n  # exact; err e sub o jumătate de ulp din p, deci contează doar la d == 0.5
+    up = (d > 0.5) | ((d == 0.5) & ((err > 0) | ((err == 0) & (np.fmod(n, 2) == 1))))
+    out = np.copysign((n + up) / scale, a)
+    return np.where(np.isfinite(a), out, a)
+
+
+def _num(lines: Sequence[Dict[str, Any]], key: str) -> np.ndarray:
+    if isinstance(lines, LineBlock):
+        return np.array(lines.column(key), dtype=float)  # coloana e deja array('d')
+    # ca `float(ln.get(key) or 0)`
+    return np.fromiter((ln.get(key) or 0 for ln in lines), dtype=float, count=len(lines))
+
+
+def _texts(lines: Sequence[Dict[str, Any]], key: str) -> List[str]:
+    col = lines.column(key) if isinstance(lines, LineBlock) else (ln.get(key) for ln in lines)
+    return [s(v) for v in col]
+
+
+def nir_columns(inv: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Coloanele NIR calculate o singură dată, vectorizat: text ca liste, sumele ca array-uri
+    NumPy (aceleași valori ca vechiul calcul linie cu linie).
+    """
+    lines = inv.get("lines", []) or []
+    qty      = _num(lines, "qty")
+    price    = _num(lines, "price")
+    net_raw  = _num(lines, "line_net")
+    vat_pct  = _num(lines, "vat_pct")
+    line_net = np.where(net_raw != 0, net_raw, qty * price)
+
+    vat_lei   = round_half_even(line_net * vat_pct / 100.0)
+    total_lei = round_half_even(line_net + vat_lei)
+    return {
+        "name":     _texts(lines, "name"),
+        "unit":     _texts(lines, "unit"),
+        "qty":      round_half_even(qty),
+        "price":    round_half_even(price),
+        "line_net": round_half_even(line_net),
+        "vat_pct":  round_half_even(vat_pct),
+        "vat":      vat_lei,
+        "total":    total_lei,
+    }
+
+
+@instrumented("to_nir_df", lines=lambda df, *a, **k: len(df))
+def to_nir_df(inv: Dict[str, Any]) -> pd.DataFrame:
+    """Construiește DataFrame-ul NIR din payload-ul parserului (fără invenții)."""
+    import pandas as pd
+
+    cols = nir_columns(inv)
+    return pd.DataFrame({NIR_FIELDS[k]: v for k, v in cols.items()}, columns=NIR_COLUMNS)
+
+
+def df_columns(df_nir: pd.DataFrame) -> Dict[str, List[Any]]:
+    """Coloanele tabelului ca liste Python, cu cheile din payload (pentru exportere)."""
+    return {k: df_nir[title].tolist() for k, title in NIR_FIELDS.items()}
+
+
+@instrumented("build_nir_data", lines=lambda data, *a, **k: len(data["columns"]["name"]))
+def build_nir_data(inv: Dict[str, Any], df_nir: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Payload-ul pentru exportere (nomenclatorul cheilor este cel așteptat de generate_pdf).
+    Liniile sunt date pe coloane (`columns`), direct din tabel, fără obiecte per rând.
+    """
+    totals = inv.get("totals", {}) or {}
+    totals_for_pdf = {
+        "subtotal": float(totals.get("net") or df_nir["Valoare netă"].sum()),
+        "vat": float(totals.get("vat") or df_nir["TVA (lei)"].sum()),
+        "grand_total": float(totals.get("gross") or df_nir["Valoare (cu TVA)"].sum()),
+    }
+
+    return {
+        "invoice_id": s(inv.get("id")) or "N/A",   # Afișare exact cum e în XML
+        "invoice_date": s(inv.get("issue_date")),
+        "currency": s(inv.get("currency")),
+        "supplier": inv.get("supplier") or {},
+        "buyer":    inv.get("buyer") or {},
+        "columns":  df_columns(df_nir),
+        "totals":   totals_for_pdf,
+    }
+
+
+# ------------------------ vedere leneșă (UI) ------------------------
+def fold_text(x: Any) -> str:
+    """Text pentru căutare: fără diacritice, litere mici („Ștefan” ~ „stefan”)."""
+    return unicodedata.normalize("NFKD", s(x)).encode("ascii", "ignore").decode("ascii").casefold()
+
+
+class _ViewBase:
+    """Starea comună a vederilor peste același tabel: coloanele și tot ce se calculează o singură dată."""
+    __slots__ = ("cols", "n", "folded", "orders", "searches", "totals")
+
+    def __init__(self, cols: Dict[str, Any]):
+        self.cols     = cols
+        self.n        = len(cols["name"])
+        self.folded: Any = None                  # denumirile pregătite pentru căutare
+        self.orders:   Dict[tuple, np.ndarray] = {}  # (cheie, desc) -> permutarea tuturor liniilor
+        self.searches: Dict[str, np.ndarray] = {}    # text căutat -> indicii potriviți (ultimele câteva)
+        self.totals:   Dict[str, float] = {}
+
+
+class LineView:
+    """
+    Vedere asupra liniilor NIR fără copii ale datelor: un vector de indici peste coloane.
+    Acces aleator, felii, sortare și căutare pe denumire dau tot vederi; DataFrame-ul se
+    construiește doar pentru pagina afișată (`page`). Permutările de sortare, denumirile
+    normalizate și totalurile tabelului complet se calculează o singură dată.
+    """
+    __slots__ = ("_base", "index", "_totals")
+
+    SEARCHES_MAX = 8
+
+    def __init__(self, base: _ViewBase, index: Optional[np.ndarray] = None):
+        self._base  = base
+        self.index  = np.arange(base.n) if index is None else index
+        self._totals: Optional[Dict[str, float]] = None
+
+    @classmethod
+    def from_df(cls, df_nir: pd.DataFrame) -> "LineView":
+        return cls(_ViewBase({k: df_nir[title].to_numpy() for k, title in NIR_FIELDS.items()}))
+
+    @property
+    def total_lines(self) -> int:
+        """Liniile tabelului complet (înainte de filtrare)."""
+        return self._base.n
+
+    # ---- acces ----
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return LineView(self._base, self.index[i])
+        j = self.index[i]
+        return {NIR_FIELDS[k]: col[j].item() if isinstance(col[j], np.generic) else col[j]
+                for k, col in self._base.cols.items()}
+
+    def page(self, number: int, size: int = 500) -> pd.DataFrame:
+        """Pagina `number` (de la 0) ca DataFrame cu coloanele NIR; doar rândurile ei se copiază."""
+        import pandas as pd
+
+        idx = self.index[number * size:(number + 1) * size]
+        return pd.DataFrame({NIR_FIELDS[k]: col[idx] for k, col in self._base.cols.items()}, columns=NIR_COLUMNS)
+
+    def pages(self, size: int = 500) -> int:
+        return max(1, -(-len(self) // size))
+
+    # ---- sortare / căutare ----
+    def sort(self, key: str, descending: bool = False) -> "LineView":
+        """Ordonare stabilă după cheia din payload (`name`, `qty`, `line_net` ...)."""
+        base = self._base
+        order = base.orders.get((key, descending))
+        if order is None:
+            col = base.cols[key]
+            if col.dtype == object:
+                keys = [fold_text(v) for v in col]
+                order = np.array(sorted(range(base.n), key=keys.__getitem__, reverse=descending), dtype=np.intp)
+            else:
+                order = np.argsort(-col if descending else col, kind="stable")
+            base.orders[(key, descending)] = order
+        if len(self) == base.n:
+            return LineView(base, order)
+        keep = np.zeros(base.n, dtype=bool)
+        keep[self.index] = True
+        return LineView(base, order[keep[order]])
+
+    def search(self, text: str) -> "LineView":
+        """Liniile (din vederea curentă, în ordinea ei) a căror denumire conține `text`."""
+        q = fold_text(text)
+        if not q:
+            return self
+        base = self._base
+        hits = base.searches.get(q)
+        if hits is None:
+            if base.folded is None:
+                base.folded = [fold_text(v) for v in base.cols["name"]]
+            hits = np.fromiter((q in f for f in base.folded), dtype=bool, count=base.n)
+            if len(base.searches) >= self.SEARCHES_MAX:
+                base.searches.pop(next(iter(base.searches)))
+            base.searches[q] = hits
+        return LineView(base, self.index[hits[self.index]])
+
+    # ---- agregate ----
+    def totals(self) -> Dict[str, float]:
+        """Sume pe vedere (net, TVA, total); pentru tabelul complet, calculate o dată și memorate."""
+        if self._totals is None:
+            base = self._base
+            full = len(self) == base.n
+            if full and base.totals:
+                self._totals = base.totals
+            else:
+                c, idx = base.cols, self.index
+                self._totals = {
+                    "lines":    len(idx),
+                    "line_net": round(float(c["line_net"][idx].sum()), 2),
+                    "vat":      round(float(c["vat"][idx].sum()), 2),
+                    "total":    round(float(c["total"][idx].sum()), 2),
+                }
+                if full:
+                    base.totals = self._totals
+        return self._totals
+
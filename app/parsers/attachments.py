@@ -0,0 +1,272 @@
+# app/parsers/attachments.py
+"""
+Atașamentele încorporate în factură (`cbc:EmbeddedDocumentBinaryObject`, de obicei
+PDF-ul furnizorului în base64 sub `cac:AdditionalDocumentReference`).
+
+Conținutul lor e de 10-50x mai mare decât datele facturii, dar parserul nu-l
+folosește. `AttachmentFilter` e un flux de citire peste XML din care lipsește
+textul base64: lxml vede doar elementul gol (cu atributele `filename`/`mimeCode`),
+iar filtrul numără pe parcurs caracterele, deci dimensiunea decodată se știe fără
+să se decodeze nimic. Memoria rămâne cât o bucată de citire, oricât de mare e
+atașamentul.
+
+La cerere, un atașament se decodează direct într-un fișier, în bucăți:
+
+    extract_attachment("factura.xml", 0, "factura_furnizor.pdf")
+"""
+from __future__ import annotations
+import binascii
+import io
+import os
+import re
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Callable, Iterator, List, Optional, Union
+
+Source = Union[str, os.PathLike, bytes, bytearray, BinaryIO]
+Target = Union[str, os.PathLike, BinaryIO]
+
+CHUNK = 64 * 1024
+
+# în afara atașamentelor: comentarii / CDATA / PI (copiate ca atare, pot conține orice text)
+# și tag-ul de deschidere (atributele pot conține '>', deci se potrivesc întregi)
+_OUTSIDE = re.compile(rb"<!--|<!\[CDATA\[|<\?|<(?:[\w.-]+:)?EmbeddedDocumentBinaryObject"
+                      rb"(?:\s+[^\s=/>]+\s*=\s*(?:\"[^\"]*\"|'[^']*'))*\s*/?>")
+_OPEN_START = re.compile(rb"<(?:[\w.-]+:)?EmbeddedDocumentBinaryObject\b")
+_END_OF     = {b"<!--": b"-->", b"<![CDATA[": b"]]>", b"<?": b"?>"}
+_CHAR_REF   = re.compile(rb"&(#[0-9]+|#x[0-9a-fA-F]+|lt|gt|amp|quot|apos);")
+_NAMED_REF  = {b"lt": b"<", b"gt": b">", b"amp": b"&", b"quot": b'"', b"apos": b"'"}
+_WS         = b" \t\r\n"
+
+# stările filtrului
+_OUT, _VERBATIM, _IN, _IN_CDATA, _IN_SKIP = range(5)
+
+
+def _resolve_ref(m: "re.Match[bytes]") -> bytes:
+    ref = m.group(1)
+    if ref[:1] != b"#":
+        return _NAMED_REF[ref]
+    code = int(ref[2:], 16) if ref[1:2] in (b"x", b"X") else int(ref[1:])
+    return chr(code).encode("utf-8")
+
+
+def decoded_size(n_chars: int, padding: int) -> int:
+    """Octeții rezultați din `n_chars` caractere base64 (fără spații), din care `padding` sunt '='."""
+    return max(0, n_chars * 3 // 4 - padding)
+
+
+def text_decoded_size(text: Optional[str]) -> int:
+    """Ca `decoded_size`, pentru textul base64 deja citit (parserul pe dict xmltodict)."""
+    clean = "".join((text or "").split())
+    return decoded_size(len(clean), len(clean) - len(clean.rstrip("=")))
+
+
+@contextmanager
+def open_source(source: Source) -> Iterator[BinaryIO]:
+    """Fluxul binar al sursei: căile se deschid (și se închid) aici, obiectele file-like se derulează la început."""
+    if isinstance(source, (bytes, bytearray)):
+        yield io.BytesIO(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield f
+    else:
+        if hasattr(source, "seek"):
+            try:
+                source.seek(0)
+            except Exception:
+                pass
+        yield source
+
+
+# ------------------------ filtru ------------------------
+class AttachmentFilter:
+    """
+    Obiect file-like (`read`) peste `raw`, fără textul elementelor EmbeddedDocumentBinaryObject.
+
+    `sizes` primește dimensiunea decodată a fiecărui atașament, în ordinea din document,
+    pe măsură ce se citește. Textul se tratează ca în XML: referințele de caractere se
+    rezolvă, secțiunile CDATA contează, comentariile și PI-urile se ignoră; în afara
+    atașamentelor, comentariile/CDATA/PI trec neatinse (un tag scris într-un comentariu
+    nu declanșează filtrarea). Cu `capture=i`, textul base64 (fără spații) al atașamentului
+    `i` se trimite bucată cu bucată la `sink`; `done` devine True când s-a încheiat.
+    """
+
+    def __init__(self, raw: BinaryIO, chunk_size: int = CHUNK,
+                 capture: Optional[int] = None, sink: Optional[Callable[[bytes], Any]] = None):
+        self.raw        = raw
+        self.chunk_size = chunk_size
+        self.capture    = capture
+        self.sink       = sink
+        self.sizes: List[int] = []
+        self.done  = False
+        self._out  = b""
+        self._gen  = self._chunks()
+        self._begin()
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            data = self._out + b"".join(self._gen)
+            self._out = b""
+            return data
+        while len(self._out) < n:
+            chunk = next(self._gen, None)
+            if chunk is None:
+                break
+            self._out += chunk
+        data, self._out = self._out[:n], self._out[n:]
+        return data
+
+    # ---- textul atașamentului curent ----
+    def _begin(self) -> None:
+        self._n, self._tail, self._carry = 0, b"", b""
+
+    def _text(self, seg: bytes) -> None:
+        """Text de element: referințele de caractere (`&#13;` între rânduri) se rezolvă înainte de numărare."""
+        if self._carry:
+            seg, self._carry = self._carry + seg, b""
+        if b"&" in seg:
+            amp = seg.rfind(b"&")
+            if seg.find(b";", amp) == -1:  # referință tăiată la capătul bucății
+                seg, self._carry = seg[:amp], seg[amp:]
+            seg = _CHAR_REF.sub(_resolve_ref, seg)
+        self._base64(seg)
+
+    def _base64(self, seg: bytes) -> None:
+        clean = seg.translate(None, _WS)
+        if not clean:
+            return
+        self._n += len(clean)
+        self._tail = (self._tail + clean)[-2:]
+        if self.sink is not None and len(self.sizes) == self.capture:
+            self.sink(clean)
+
+    def _end(self) -> None:
+        if len(self.sizes) == self.capture:
+            self.done = True
+        self.sizes.append(decoded_size(self._n, self._tail.count(b"=")))
+
+    def _chunks(self) -> Iterator[bytes]:
+        buf = b""
+        state, until = _OUT, b""
+        eof = False
+        while not eof:
+            data = self.raw.read(self.chunk_size)
+            eof = not data
+            buf += data
+            pos = 0
+            out: List[bytes] = []
+            while True:
+                if state == _OUT:
+                    m = _OUTSIDE.search(buf, pos)
+                    if m is None:
+                        break
+                    tok = m.group()
+                    out.append(buf[pos:m.end()])
+                    pos = m.end()
+                    if tok in _END_OF:
+                        state, until = _VERBATIM, _END_OF[tok]
+                    elif tok.endswith(b"/>"):
+                        self.sizes.append(0)
+                    else:
+                        state = _IN
+                        self._begin()
+                elif state == _VERBATIM or state == _IN_SKIP:
+                    # comentariu / CDATA / PI: afară se copiază, în atașament se sare
+                    end = buf.find(until, pos)
+                    stop = end + len(until) if end != -1 else (
+                        len(buf) if eof else max(pos, len(buf) - len(until) + 1))
+                    if state == _VERBATIM:
+                        out.append(buf[pos:stop])
+                    pos = stop
+                    if end == -1:
+                        break
+                    state = _OUT if state == _VERBATIM else _IN
+                elif state == _IN:
+                    # base64 nu conține '<': textul ține până la primul marcaj
+                    end = buf.find(b"<", pos)
+                    self._text(buf[pos:] if end == -1 else buf[pos:end])
+                    if end == -1:
+                        pos = len(buf)
+                        break
+                    pos = end
+                    if len(buf) - end < 9 and not eof:
+                        break  # prea puțin ca să știm ce marcaj e; așteptăm bucata următoare
+                    if buf.startswith(b"<![CDATA[", end):
+                        state, pos = _IN_CDATA, end + 9
+                    elif buf.startswith(b"<!--", end):
+                        state, until, pos = _IN_SKIP, b"-->", end + 4
+                    elif buf.startswith(b"<?", end):
+                        state, until, pos = _IN_SKIP, b"?>", end + 2
+                    else:
+                        self._end()
+                        state = _OUT
+                else:  # _IN_CDATA: textul e literal, fără referințe
+                    end = buf.find(b"]]>", pos)
+                    stop = end if end != -1 else (len(buf) if eof else max(pos, len(buf) - 2))
+                    self._base64(buf[pos:stop])
+                    if end == -1:
+                        pos = stop
+                        break
+                    state, pos = _IN, end + 3
+
+            if state == _OUT:
+                # un tag de deschidere (sau `<!--`, `<![CDATA[`) tăiat la capătul bucății se păstrează
+                keep = buf.rfind(b"<", pos)
+                if not eof and keep != -1 and (buf.find(b">", keep) == -1 or _OPEN_START.match(buf, keep)):
+                    out.append(buf[pos:keep])
+                    pos = keep
+                else:
+                    out.append(buf[pos:])
+                    pos = len(buf)
+            buf = buf[pos:]
+            chunk = b"".join(out)
+            if chunk:
+                yield chunk
+
+
+# ------------------------ extragere la cerere ------------------------
+class _Base64Writer:
+    """Decodează base64 primit în bucăți oarecare și scrie octeții în `out`."""
+
+    def __init__(self, out: BinaryIO):
+        self.out     = out
+        self.pending = b""
+        self.written = 0
+
+    def __call__(self, clean: bytes) -> None:
+        data = self.pending + clean
+        cut = len(data) - len(data) % 4
+        self.pending = data[cut:]
+        if cut:
+            self.written += self.out.write(binascii.a2b_base64(data[:cut]))
+
+    def close(self) -> None:
+        if self.pending:
+            self.written += self.out.write(binascii.a2b_base64(self.pending))
+            self.pending = b""
+
+
+def _extract(raw: BinaryIO, index: int, out: BinaryIO, chunk_size: int) -> int:
+    writer = _Base64Writer(out)
+    filt = AttachmentFilter(raw, chunk_size, capture=index, sink=writer)
+    while not filt.done and filt.read(chunk_size):
+        pass  # restul documentului după atașament nu se mai citește
+    if not filt.done:
+        raise IndexError(f"Factura nu are atașamentul {index} (găsite: {len(filt.sizes)}).")
+    writer.close()
+    return writer.written
+
+
+def extract_attachment(source: Source, index: int, target: Target, chunk_size: int = CHUNK) -> int:
+    """
+    Decodează atașamentul `index` (poziția din payload-ul parserului, `attachments[i]["index"]`)
+    în `target` (cale sau file-like binar), în bucăți de `chunk_size`. Întoarce octeții scriși.
+    """
+    with open_source(source) as raw:
+        if not isinstance(target, (str, os.PathLike)):
+            return _extract(raw, index, target, chunk_size)
+        try:
+            with open(target, "wb") as out:
+                return _extract(raw, index, out, chunk_size)
+        except BaseException:
+            os.unlink(target)  # fără fișiere pe jumătate scrise
+            raise
@@ -0,0 +1,207 @@
+# app/parsers/cache.py
+"""
+Cache adresat după conținut pentru payload-ul parserului.
+
+Cheia = SHA-256(PARSER_VERSION + bytes XML). Două niveluri:
+  - memorie: LRU mărginit (OrderedDict), per proces;
+  - disc (opțional): un fișier JSON per cheie, scris atomic (tmp + os.replace),
+    deci supraviețuiește restart-urilor și e sigur între procese/workeri concurenți.
+    JSON, nu pickle: directorul e partajat, iar un fișier scris de altcineva trebuie
+    să rămână doar date (pickle.load ar executa cod). Liniile (LineBlock) se scriu pe
+    coloane, ca liste.
+
+Payload-urile întoarse sunt partajate între apelanți: se tratează ca read-only.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import tempfile
+from array import array
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from app.models.lines import LineBlock
+from app.parsers.ubl_parser import PARSER_VERSION
+
+Payload = Dict[str, Any]
+
+
+def _default_parser(xml_bytes: bytes) -> Payload:
+    from app.parsers.ubl_stream import parse_invoice_stream
+    return parse_invoice_stream(xml_bytes)
+
+
+_LINES_TAG = "__lineblock__"
+
+
+def _to_json(val: Payload) -> bytes:
+    lines = val.get("lines")
+    if isinstance(lines, LineBlock):
+        val = dict(val)
+        val["lines"] = {_LINES_TAG: {f: list(getattr(lines, f)) for f in LineBlock.FIELDS}}
+    return json.dumps(val, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _from_json(data: bytes) -> Payload:
+    val = json.loads(data)
+    cols = val.get("lines")
+    if isinstance(cols, dict) and _LINES_TAG in cols:
+        cols = cols[_LINES_TAG]
+        lines = LineBlock()
+        lines.name, lines.unit = list(cols["name"]), list(cols["unit"])
+        for f in LineBlock.NUMERIC:
+            setattr(lines, f, array("d", cols[f]))
+        val["lines"] = lines
+    return val
+
+
+class ParseCache:
+    def __init__(self, max_items: int = 64, disk_dir: Optional[str] = None,
+                 parser: Optional[Callable[[bytes], Payload]] = None):
+        self.max_items = max(0, int(max_items))
+        self.disk_dir  = disk_dir
+        self.parser    = parser or _default_parser
+        self._mem: "OrderedDict[str, Payload]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0,
+                       "disk_writes": 0, "disk_errors": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # ---- chei ----
+    @staticmethod
+    def key(xml_bytes: bytes) -> str:
+        h = hashlib.sha256(PARSER_VERSION.encode("ascii"))
+        h.update(b"\0")
+        h.update(xml_bytes)
+        return h.hexdigest()
+
+    # ---- nivel memorie ----
+    def _mem_get(self, key: str) -> Optional[Payload]:
+        with self._lock:
+            val = self._mem.get(key)
+            if val is not None:
+                self._mem.move_to_end(key)
+            return val
+
+    def _mem_put(self, key: str, val: Payload) -> None:
+        if self.max_items == 0:
+            return
+        with self._lock:
+            self._mem[key] = val
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_items:
+                self._mem.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    # ---- nivel disc ----
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+    def _disk_get(self, key: str) -> Optional[Payload]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                return _from_json(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # fișier corupt/trunchiat: îl ignorăm și îl rescriem la următorul parse
+            self._count("disk_errors")
+            return None
+
+    def _disk_put(self, key: str, val: Payload) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(_to_json(val))
+                os.replace(tmp, path)  # atomic: cititorii văd fie nimic, fie fișierul complet
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+            self._count("disk_writes")
+        except Exception:
+            self._count("disk_errors")
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += n
+
+    # ---- API ----
+    def get(self, key: str) -> Optional[Payload]:
+        val = self._mem_get(key)
+        if val is not None:
+            self._count("hits")
+            return val
+        val = self._disk_get(key)
+        if val is not None:
+            self._count("disk_hits")
+            self._mem_put(key, val)
+        return val
+
+    def put(self, key: str, val: Payload) -> None:
+        self._mem_put(key, val)
+        self._disk_put(key, val)
+
+    def get_or_parse(self, xml_bytes: bytes) -> Payload:
+        """Payload-ul pentru `xml_bytes`: din cache dacă există, altfel parsează și memorează."""
+        key = self.key(xml_bytes)
+        val = self.get(key)
+        if val is not None:
+            return val
+        self._count("misses")
+        val = self.parser(xml_bytes)
+        self.put(key, val)
+        return val
+
+    def clear(self, disk: bool = False) -> None:
+        with self._lock:
+            self._mem.clear()
+        if disk and self.disk_dir:
+            for root, _, files in os.walk(self.disk_dir):
+                for name in files:
+                    if name.endswith((".json", ".pickle")):  # .pickle: formatul vechi
+                        try:
+                            os.unlink(os.path.join(root, name))
+                        except OSError:
+                            pass
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._stats)
+            out["size"] = len(self._mem)
+            out["max_items"] = self.max_items
+            return out
+
+    def __len__(self) -> int:
+        return len(self._mem)
+
+
+# ------------------------ instanță implicită per proces ------------------------
+_DEFAULT: Optional[ParseCache] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_cache() -> ParseCache:
+    """Cache-ul procesului, configurat din NIR_CACHE_SIZE / NIR_CACHE_DIR (disc opțional)."""
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            _DEFAULT = ParseCache(
+                max_items=int(os.environ.get("NIR_CACHE_SIZE", "64")),
+                disk_dir=os.environ.get("NIR_CACHE_DIR") or None,
+            )
+        return _DEFAULT
@@ -0,0 +1,165 @@
+# app/parsers/field_plan.py
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# ------------------------ stiluri de prefix ------------------------
+# xmltodict păstrează prefixul literal din XML („cbc:ID” vs „ID”). Un document
+# folosește practic un singur stil, deci îl detectăm o dată și rulăm doar căile
+# potrivite; documentele amestecate primesc lanțul complet (ca înainte).
+STYLE_PREFIXED = "prefixed"
+STYLE_BARE     = "bare"
+STYLE_MIXED    = "mixed"
+
+def _is_element_key(k: str) -> bool:
+    return not k.startswith(("@", "#"))
+
+
+def detect_style(node: Any) -> str:
+    """Stilul de prefix al unui nod xmltodict, după cheile de element de pe primul nivel."""
+    if isinstance(node, list):
+        node = node[0] if node else None
+    if not isinstance(node, dict):
+        return STYLE_MIXED
+    return detect_style_from_keys(node.keys())
+
+
+def detect_style_from_keys(keys: Iterable[str]) -> str:
+    has_prefixed = has_bare = False
+    for k in keys:
+        if not _is_element_key(k):
+            continue
+        if ":" in k:
+            has_prefixed = True
+        else:
+            has_bare = True
+    if has_prefixed and not has_bare:
+        return STYLE_PREFIXED
+    if has_bare and not has_prefixed:
+        return STYLE_BARE
+    return STYLE_MIXED
+
+
+def _path_style(keys: Tuple[str, ...]) -> str:
+    elems = [k for k in keys if _is_element_key(k)]
+    return detect_style_from_keys(elems) if elems else STYLE_MIXED
+
+
+# ------------------------ compilare plan ------------------------
+Path = Tuple[str, ...]
+
+
+def split_path(path: str) -> Path:
+    return tuple(path.split("."))
+
+
+class Field:
+    """
+    Un câmp cu lanțul lui de căi alternative. Implicit se ia prima valoare brută
+    „truthy” (ca `_get(a) or _get(b)`); cu `each=` se convertește fiecare candidat
+    și se ia primul rezultat nevid (ca `_text(_get(a)) or _text(_get(b))`).
+    """
+    __slots__ = ("name", "paths", "each", "_chains")
+
+    def __init__(self, name: str, *paths: str, each: Optional[Callable[[Any], Any]] = None):
+        if not paths:
+            raise ValueError(f"Câmpul {name!r} nu are nicio cale.")
+        self.name  = name
+        self.paths = paths
+        self.each  = each
+        split = [(_path_style(split_path(p)), split_path(p)) for p in paths]
+        full = tuple(keys for _, keys in split)
+        self._chains: Dict[str, Tuple[Path, ...]] = {
+            STYLE_MIXED:    full,
+            STYLE_PREFIXED: tuple(keys for st, keys in split if st == STYLE_PREFIXED) or full,
+            STYLE_BARE:     tuple(keys for st, keys in split if st == STYLE_BARE) or full,
+        }
+
+    def chain(self, style: str) -> Tuple[Path, ...]:
+        return self._chains.get(style, self._chains[STYLE_MIXED])
+
+
+def _step(cur: Any, key: str) -> Any:
+    """Un pas din semantica `_get` (ubl_parser): listă -> primul element, non-dict -> None."""
+    if isinstance(cur, list):
+        cur = cur[0] if cur else None
+    return cur.get(key) if isinstance(cur, dict) else None
+
+
+def _walk_from(keys: Path, known: Dict[Path, int]) -> Tuple[int, Path]:
+    """Cel mai lung prefix deja calculat al căii (indice în `nodes`) și pașii rămași."""
+    depth = max(i for i in range(len(keys) + 1) if keys[:i] in known)
+    return known[keys[:depth]], keys[depth:]
+
+
+def _compile_values(chains: Sequence[Tuple[Path, ...]],
+                    eaches: Sequence[Optional[Callable[[Any], Any]]]) -> Callable[[Any], List[Any]]:
+    """
+    Construiește `values(obj)` pentru un plan legat. Nodurile căilor principale se
+    calculează o singură dată per apel, cu prefixe comune partajate (ex. cac:Price
+    pentru preț și cantitatea de bază); fallback-urile pornesc de la cel mai lung
+    prefix deja calculat și rulează doar dacă valoarea de până atunci e „falsy”.
+    """
+    # 1) pașii căilor principale: (indice nod părinte, cheie); nodul i+1 = pasul i
+    known: Dict[Path, int] = {(): 0}
+    steps: List[Tuple[int, str]] = []
+    for chain in chains:
+        keys = chain[0]
+        for i in range(len(keys)):
+            if keys[:i + 1] not in known:
+                steps.append((known[keys[:i]], keys[i]))
+                known[keys[:i + 1]] = len(steps)
+
+    # 2) per câmp: nodul principal, convertorul și fallback-urile (start, pași rămași)
+    plan = tuple((known[chain[0]], each, tuple(_walk_from(keys, known) for keys in chain[1:]))
+                 for chain, each in zip(chains, eaches))
+    steps_t = tuple(steps)
+
+    def values(obj: Any) -> List[Any]:
+        nodes = [obj]
+        for src, key in steps_t:
+            cur = nodes[src]
+            nodes.append(cur.get(key) if cur.__class__ is dict else _step(cur, key))
+        out = []
+        for slot, each, fallbacks in plan:
+            v = nodes[slot]
+            if each:
+                v = each(v)
+            for start, rest in fallbacks:
+                if v:
+                    break
+                node = nodes[start]
+                for key in rest:
+                    node = node.get(key) if node.__class__ is dict else _step(node, key)
+                v = each(node) if each else node
+            out.append(v)
+        return out
+
+    return values
+
+
+class BoundPlan:
+    """Planul legat de un stil de prefix, pregătit într-o singură funcție."""
+    __slots__ = ("style", "names", "values")
+
+    def __init__(self, style: str, fields: Sequence[Field]):
+        self.style  = style
+        self.names  = tuple(f.name for f in fields)
+        # values(obj) -> [valoare per câmp, în ordinea câmpurilor]
+        self.values = _compile_values([f.chain(style) for f in fields], [f.each for f in fields])
+
+    def extract(self, obj: Any) -> Dict[str, Any]:
+        return dict(zip(self.names, self.values(obj)))
+
+
+class ExtractionPlan:
+    """Colecție de câmpuri compilată o singură dată; `bind(style)` e memoizat."""
+
+    def __init__(self, fields: Sequence[Field]):
+        self.fields = tuple(fields)
+        self._bound: Dict[str, BoundPlan] = {}
+
+    def bind(self, style: str) -> BoundPlan:
+        bp = self._bound.get(style)
+        if bp is None:
+            bp = self._bound[style] = BoundPlan(style, self.fields)
+        return bp
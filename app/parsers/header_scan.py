@@ -0,0 +1,122 @@
+# app/parsers/header_scan.py
+"""
+Scanare rapidă doar a antetului: ID, dată, monedă, părți și totaluri (LegalMonetaryTotal,
+TaxTotal), fără linii.
+
+În UBL liniile vin după totaluri, deci citirea se oprește la primul `InvoiceLine`:
+restul fișierului nici nu se mai citește de pe disc. Valorile sunt cele ale parserului
+complet (aceleași planuri de extracție). Documentele atipice, cu totalurile după
+linii, se citesc până la capăt, dar liniile se sar fără să fie convertite. Atașamentele
+încorporate (înaintea totalurilor în UBL) se citesc, dar nu se parsează (`AttachmentFilter`).
+"""
+from __future__ import annotations
+import io
+import mmap
+import os
+from typing import Any, Dict, Iterator, Tuple
+
+from lxml import etree
+
+from app.parsers.attachments import AttachmentFilter
+from app.parsers.field_plan import STYLE_MIXED, detect_style_from_keys
+from app.parsers.ubl_parser import _parse_head, _parse_totals
+from app.parsers.ubl_stream import Source, _add_child, _element_key, _element_to_dict
+
+_TOTALS_TAGS = ("LegalMonetaryTotal",)
+
+
+CHUNK = 8 * 1024  # antetul unei facturi SPV încape de obicei în 1–2 bucăți
+
+
+def _events(stream: Any) -> Iterator[Tuple[str, Any]]:
+    """
+    Evenimentele iterparse, dar cu alimentare în bucăți mici: lxml.iterparse citește
+    și parsează blocuri mari, deci ar procesa liniile chiar dacă ne oprim la antet.
+    """
+    parser = etree.XMLPullParser(
+        events=("start", "end"),
+        remove_comments=True,
+        remove_pis=True,
+        resolve_entities=False,
+        huge_tree=True,
+    )
+    stream = AttachmentFilter(stream, CHUNK)
+    while True:
+        chunk = stream.read(CHUNK)
+        if not chunk:
+            break
+        parser.feed(chunk)
+        yield from parser.read_events()
+    parser.close()  # document trunchiat/gol -> XMLSyntaxError, ca la parserul complet
+    yield from parser.read_events()
+
+
+def _scan(stream: Any) -> Dict[str, Any]:
+    head: Dict[str, Any] = {}
+    root = None
+    depth = 0
+    have_totals = False
+    skipping = 0  # adâncimea unei linii sărite (totaluri încă nevăzute)
+
+    for event, el in _events(stream):
+        if event == "start":
+            if root is None:
+                root = el
+            depth += 1
+            if depth == 2 and el.tag.rpartition("}")[2] == "InvoiceLine":
+                if have_totals:
+                    break  # antetul e complet; restul fișierului nu se mai citește
+                skipping = depth
+            continue
+
+        depth -= 1
+        if skipping:
+            if depth == skipping - 1:
+                skipping = 0
+                el.clear()
+                while el.getprevious() is not None:
+                    del root[0]
+            continue
+        if depth != 1:
+            continue
+
+        _add_child(head, _element_key(el), _element_to_dict(el))
+        if el.tag.rpartition("}")[2] in _TOTALS_TAGS:
+            have_totals = True
+        el.clear()
+        while el.getprevious() is not None:
+            del root[0]
+
+    style = detect_style_from_keys(head) if head else STYLE_MIXED
+    h, _, tax_total, legal_tot = _parse_head(head, style)
+    t = _parse_totals(tax_total, legal_tot, style)
+    return {
+        "id":            h["id"],
+        "issue_date":    h["issue_date"],
+        "currency":      h["currency"],
+        "supplier_name": h["supplier"]["name"],
+        "supplier_cui":  h["supplier"]["cui"],
+        "buyer_name":    h["buyer"]["name"],
+        "buyer_cui":     h["buyer"]["cui"],
+        "net":           t["net"],
+        "vat":           t["vat"],
+        "gross":         t["gross"],
+        "payable":       t["payable"],
+    }
+
+
+def scan_header(source: Source, use_mmap: bool = False) -> Dict[str, Any]:
+    """
+    Înregistrarea de antet a unei facturi (cale, bytes sau obiect file-like).
+    Căile se deschid aici, ca fișierul să se închidă și când citirea se oprește
+    devreme; cu `use_mmap` se citesc prin mmap (paginile de după antet nu se ating).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return _scan(io.BytesIO(source))
+    if not isinstance(source, (str, os.PathLike)):
+        return _scan(source)
+    with open(source, "rb") as f:
+        if use_mmap and os.fstat(f.fileno()).st_size:  # mmap nu acceptă fișiere goale
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _scan(mm)
+        return _scan(f)
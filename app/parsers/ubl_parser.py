@@ -1,6 +1,16 @@
 # app/parsers/ubl_parser.py
 from __future__ import annotations
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple, Union
+
+from app.metrics import instrumented
+from app.models.lines import LineBlock
+from app.rules import validate_invoice
+from app.parsers.attachments import text_decoded_size
+from app.parsers.field_plan import STYLE_MIXED, ExtractionPlan, Field, detect_style
+
+# Se incrementează la orice schimbare a formei/valorilor payload-ului
+# (invalidează cache-ul de parsare, vezi app/parsers/cache.py).
+PARSER_VERSION = "4"
 
 # ------------------------ utilitare generale ------------------------
 def _get(d: Any, path: str, default=None):
@@ -29,6 +39,8 @@ def _text(v) -> str:
       - None -> ''
       - altfel str(v)
     """
+    if v.__class__ is str:
+        return v
     if v is None:
         return ""
     if isinstance(v, list):
@@ -45,25 +57,262 @@ def _text(v) -> str:
 
 def _as_float_safe(v) -> float:
     """Convertește orice (dict/list/#text) la float în siguranță; locale ',' acceptat."""
+    if v.__class__ is float:  # valori deja convertite (ex. recalculul din linii)
+        return v
+    if v.__class__ is str:  # cazul uzual din xmltodict: text simplu
+        try:
+            return float(v.replace(",", "."))
+        except ValueError:
+            return 0.0
     try:
         s = _text(v)
         return float(s.replace(",", "."))
     except Exception:
         return 0.0
 
-def _compose_address(party: dict) -> str:
-    addr = _get(party, "cac:PostalAddress") or _get(party, "PostalAddress") or {}
-    parts = [
-        _text(_get(addr, "cbc:StreetName") or _get(addr, "StreetName")),
-        _text(_get(addr, "cbc:CityName") or _get(addr, "CityName")),
-        _text(_get(addr, "cbc:PostalZone") or _get(addr, "PostalZone")),
-        _text(_get(addr, "cac:Country.cbc:IdentificationCode") or _get(addr, "Country.IdentificationCode")),
-    ]
+# ------------------------ planuri de extracție ------------------------
+# Fiecare lanț de fallback se compilează o singură dată (vezi field_plan.py);
+# per document se leagă doar căile care corespund stilului de prefix detectat.
+_INVOICE_PLAN = ExtractionPlan([
+    Field("id",          "cbc:ID", "ID"),
+    Field("issue_date",  "cbc:IssueDate", "IssueDate"),
+    Field("currency",    "cbc:DocumentCurrencyCode", "DocumentCurrencyCode"),
+    Field("supplier",    "cac:AccountingSupplierParty", "AccountingSupplierParty"),
+    Field("buyer",       "cac:AccountingCustomerParty", "AccountingCustomerParty"),
+    Field("lines",       "cac:InvoiceLine", "InvoiceLine"),
+    Field("tax_total",   "cac:TaxTotal", "TaxTotal"),
+    Field("legal_total", "cac:LegalMonetaryTotal", "LegalMonetaryTotal"),
+    Field("doc_refs",    "cac:AdditionalDocumentReference", "AdditionalDocumentReference"),
+])
+
+_PARTY_WRAPPER_PLAN = ExtractionPlan([
+    Field("party", "cac:Party", "Party"),
+])
+
+_PARTY_PLAN = ExtractionPlan([
+    Field("name",
+          "cac:PartyLegalEntity.cbc:RegistrationName",
+          "PartyLegalEntity.cbc:RegistrationName",
+          "PartyLegalEntity.RegistrationName",
+          "cac:PartyName.cbc:Name",
+          "PartyName.cbc:Name",
+          "PartyName.Name",
+          each=_text),
+    Field("cui",
+          "cac:PartyTaxScheme.cbc:CompanyID",
+          "PartyTaxScheme.cbc:CompanyID",
+          "PartyTaxScheme.CompanyID",
+          each=_text),
+    Field("address", "cac:PostalAddress", "PostalAddress"),
+])
+
+_ADDRESS_PLAN = ExtractionPlan([
+    Field("street",  "cbc:StreetName", "StreetName"),
+    Field("city",    "cbc:CityName", "CityName"),
+    Field("zone",    "cbc:PostalZone", "PostalZone"),
+    Field("country", "cac:Country.cbc:IdentificationCode", "Country.IdentificationCode"),
+])
+
+_LINE_PLAN = ExtractionPlan([
+    Field("name", "cac:Item.cbc:Name", "Item.cbc:Name", "Item.Name", each=_text),
+    Field("qty",
+          "cbc:InvoicedQuantity.#text",
+          "cbc:InvoicedQuantity",
+          "InvoicedQuantity.#text",
+          "InvoicedQuantity"),
+    Field("unit", "cbc:InvoicedQuantity.@unitCode", "InvoicedQuantity.@unitCode"),
+    Field("price",
+          "cac:Price.cbc:PriceAmount.#text",
+          "cac:Price.cbc:PriceAmount",
+          "Price.cbc:PriceAmount",
+          "Price.PriceAmount"),
+    Field("base_qty",
+          "cac:Price.cbc:BaseQuantity.#text",
+          "cac:Price.cbc:BaseQuantity",
+          "Price.cbc:BaseQuantity",
+          "Price.BaseQuantity"),
+    Field("line_net",
+          "cbc:LineExtensionAmount.#text",
+          "cbc:LineExtensionAmount",
+          "LineExtensionAmount"),
+    # TVA% STRICT din XML
+    Field("vat_pct",
+          "cac:Item.cac:ClassifiedTaxCategory.cbc:Percent",
+          "Item.cac:ClassifiedTaxCategory.cbc:Percent",
+          "Item.ClassifiedTaxCategory.Percent",
+          "cac:TaxTotal.cac:TaxSubtotal.cbc:Percent",
+          "TaxTotal.TaxSubtotal.Percent"),
+])
+
+_DOC_REF_PLAN = ExtractionPlan([
+    Field("id",          "cbc:ID", "ID", each=_text),
+    Field("description", "cbc:DocumentDescription", "DocumentDescription", each=_text),
+    Field("attachment",  "cac:Attachment", "Attachment"),
+])
+
+_TAX_TOTAL_PLAN = ExtractionPlan([
+    Field("vat",       "cbc:TaxAmount", "TaxAmount"),
+    Field("subtotals", "cac:TaxSubtotal", "TaxSubtotal"),
+])
+
+_LEGAL_TOTAL_PLAN = ExtractionPlan([
+    Field("net",     "cbc:TaxExclusiveAmount", "TaxExclusiveAmount"),
+    Field("gross",   "cbc:TaxInclusiveAmount", "TaxInclusiveAmount"),
+    Field("payable", "cbc:PayableAmount", "PayableAmount"),
+])
+
+_TAX_SUBTOTAL_PLAN = ExtractionPlan([
+    Field("rate",    "cac:TaxCategory.cbc:Percent", "cbc:Percent", "TaxCategory.Percent", "Percent"),
+    Field("taxable", "cbc:TaxableAmount", "TaxableAmount"),
+    Field("tax",     "cbc:TaxAmount", "TaxAmount"),
+])
+
+
+def _compose_address(party: dict, style: str = STYLE_MIXED) -> str:
+    addr = _PARTY_PLAN.bind(style).extract(party)["address"] or {}
+    parts = [_text(v) for v in _ADDRESS_PLAN.bind(style).values(addr)]
     return ", ".join([p for p in parts if p])
 
 
+def _parse_party(wrapper: Any, style: str) -> Dict[str, str]:
+    party = _PARTY_WRAPPER_PLAN.bind(style).values(wrapper or {})[0] or {}
+    name, cui, _ = _PARTY_PLAN.bind(style).values(party)
+    return {"name": name or "-", "cui": cui or "-", "address": _compose_address(party, style)}
+
+
+def _line_from_values(vals: List[Any]) -> Tuple[str, float, str, float, float, float]:
+    """Post-procesarea unei linii din valorile brute extrase de `_LINE_PLAN` (ordinea din LineBlock.FIELDS)."""
+    name, qty_raw, unit_raw, price_raw, base_raw, net_raw, vat_raw = vals
+
+    qty       = _as_float_safe(qty_raw)
+    price_amt = _as_float_safe(price_raw)
+    base_qty  = _as_float_safe(base_raw) or 1.0
+    price = round(price_amt / base_qty, 6) if base_qty not in (0, 1) else price_amt
+
+    line_net = _as_float_safe(net_raw)
+    if not line_net and qty and price:
+        line_net = round(qty * price, 2)
+
+    return (name or "-", qty, _text(unit_raw), price, line_net, _as_float_safe(vat_raw))
+
+
+def _parse_totals(tax_total: Any, legal_tot: Any, style: str) -> Dict[str, Any]:
+    """Totaluri din XML + defalcarea sub-totalurilor TVA la nivel de antet."""
+    vat_raw, ts = _TAX_TOTAL_PLAN.bind(style).values(tax_total or {})
+    net_raw, gross_raw, payable_raw = _LEGAL_TOTAL_PLAN.bind(style).values(legal_tot or {})
+
+    ts = ts or []
+    if isinstance(ts, dict):
+        ts = [ts]
+    sub_plan = _TAX_SUBTOTAL_PLAN.bind(style)
+    tax_subtotals: List[Dict[str, Any]] = []
+    for t in ts:
+        rate, taxable, tax = sub_plan.values(t)
+        tax_subtotals.append({
+            "rate":    _as_float_safe(rate),
+            "taxable": _as_float_safe(taxable),
+            "tax":     _as_float_safe(tax),
+        })
+
+    return {
+        "net":     _as_float_safe(net_raw),
+        "vat":     _as_float_safe(vat_raw),
+        "gross":   _as_float_safe(gross_raw),
+        "payable": _as_float_safe(payable_raw),
+        "tax_subtotals": tax_subtotals,
+    }
+
+
+def _parse_attachments(refs: Any, style: str) -> List[Dict[str, Any]]:
+    """
+    Metadatele atașamentelor încorporate (AdditionalDocumentReference cu
+    EmbeddedDocumentBinaryObject): nume, tip MIME, dimensiune decodată. `index` e
+    poziția atașamentului în document (vezi attachments.extract_attachment).
+    Parserul streaming nu primește textul base64; dimensiunile le completează filtrul.
+    """
+    if isinstance(refs, dict):
+        refs = [refs]
+    plan = _DOC_REF_PLAN.bind(style)
+    out: List[Dict[str, Any]] = []
+    for ref in refs or []:
+        doc_id, description, att = plan.values(ref)
+        if isinstance(att, list):
+            att = att[0] if att else None
+        if not isinstance(att, dict):
+            continue
+        # prezența cheii contează: fără base64 și fără atribute, valoarea e None
+        key = next((k for k in att if k.rpartition(":")[2] == "EmbeddedDocumentBinaryObject"), None)
+        if key is None:
+            continue
+        obj = att[key]
+        attrs = obj if isinstance(obj, dict) else {}
+        text = obj if isinstance(obj, str) else attrs.get("#text")
+        out.append({
+            "index":       len(out),
+            "id":          doc_id,
+            "description": description,
+            "filename":    attrs.get("@filename") or "",
+            "mime":        attrs.get("@mimeCode") or "",
+            "size":        text_decoded_size(text),
+        })
+    return out
+
+
+def _parse_head(inv: Any, style: str):
+    """Antet + părți + atașamente; întoarce și nodurile brute pentru linii și totaluri."""
+    (inv_id, issue_date, currency, sp, bp,
+     raw_lines, tax_total, legal_tot, doc_refs) = _INVOICE_PLAN.bind(style).values(inv)
+
+    head = {
+        "id": _text(inv_id),
+        "issue_date": _text(issue_date),
+        "currency": _text(currency or "RON"),
+        "supplier": _parse_party(sp, style),
+        "buyer":    _parse_party(bp, style),
+        "attachments": _parse_attachments(doc_refs, style),
+    }
+    return head, raw_lines, tax_total, legal_tot
+
+
+def _assemble(head: Dict[str, Any], lines: LineBlock, totals: Dict[str, Any], validate: bool = True) -> Dict[str, Any]:
+    """
+    Recalcul din linii + forma finală a payload-ului + validări (app/rules.py). Cu
+    `validate=False` lista rămâne goală: apelantul validează singur un lot întreg.
+    """
+    net, vat = totals["net"], totals["vat"]
+
+    # --- recalcul din linii (fără presupuneri de cote), direct pe coloane ---
+    calc_net = round(sum(lines.line_net), 2)
+    calc_vat = round(sum(n * (v / 100.0) for n, v in zip(lines.line_net, lines.vat_pct)), 2)
+
+    payload = {
+        "id": head["id"],
+        "issue_date": head["issue_date"],
+        "currency": head["currency"],
+        "supplier": head["supplier"],
+        "buyer":    head["buyer"],
+        "totals":   {
+            "net": net,
+            "vat": vat,
+            "gross": totals["gross"],
+            "payable": totals["payable"],
+            "calc_net_from_lines": calc_net,
+            "calc_vat_from_lines": calc_vat,
+            "tax_subtotals": totals["tax_subtotals"],
+        },
+        "lines": lines,
+        "attachments": head["attachments"],
+        "validations": [],
+    }
+    # --- validări: regulile EN 16931 / RO_CIUS, evaluate pe coloane ---
+    if validate:
+        payload["validations"] = validate_invoice(payload)
+    return payload
+
+
 # ------------------------ parser principal ------------------------
-def parse_invoice_minimal(doc: dict) -> Dict[str, Any]:
+@instrumented("parse_invoice_minimal", lines=lambda inv, *a, **k: len(inv["lines"]))
+def parse_invoice_minimal(doc: dict, validate: bool = True) -> Dict[str, Any]:
     """
     Primește dict din xmltodict.parse pentru UBL 2.1 / RO_CIUS.
     Fără presupuneri/fallback-uri de cote TVA. Doar ce e în XML.
@@ -73,177 +322,34 @@ def parse_invoice_minimal(doc: dict) -> Dict[str, Any]:
         supplier: {name, cui, address},
         buyer:    {name, cui, address},
         totals:   {net, vat, gross, payable, calc_net_from_lines, calc_vat_from_lines, tax_subtotals:[...]},
-        lines:    [{name, qty, unit, price, line_net, vat_pct}],
+        lines:    LineBlock — secvență de {name, qty, unit, price, line_net, vat_pct}, stocată pe coloane,
+        attachments: [ {index, id, description, filename, mime, size}, ... ] — fără conținut,
         validations: [ {level, msg}, ... ]
       }
     """
     inv = doc.get("Invoice") or doc
-
-    # --- header ---
-    inv_id     = _text(_get(inv, "cbc:ID") or _get(inv, "ID"))
-    issue_date = _text(_get(inv, "cbc:IssueDate") or _get(inv, "IssueDate"))
-    currency   = _text(_get(inv, "cbc:DocumentCurrencyCode") or _get(inv, "DocumentCurrencyCode") or "RON")
-
-    # --- supplier ---
-    sp = _get(inv, "cac:AccountingSupplierParty") or _get(inv, "AccountingSupplierParty") or {}
-    sp_party = _get(sp, "cac:Party") or _get(sp, "Party") or {}
-    sp_name = (
-        _text(_get(sp_party, "cac:PartyLegalEntity.cbc:RegistrationName")) or
-        _text(_get(sp_party, "PartyLegalEntity.cbc:RegistrationName")) or
-        _text(_get(sp_party, "PartyLegalEntity.RegistrationName")) or
-        _text(_get(sp_party, "cac:PartyName.cbc:Name")) or
-        _text(_get(sp_party, "PartyName.cbc:Name")) or
-        _text(_get(sp_party, "PartyName.Name")) or
-        "-"
-    )
-    sp_cui  = (
-        _text(_get(sp_party, "cac:PartyTaxScheme.cbc:CompanyID")) or
-        _text(_get(sp_party, "PartyTaxScheme.cbc:CompanyID")) or
-        _text(_get(sp_party, "PartyTaxScheme.CompanyID")) or
-        "-"
-    )
-    sp_addr = _compose_address(sp_party)
-
-    # --- buyer ---
-    bp = _get(inv, "cac:AccountingCustomerParty") or _get(inv, "AccountingCustomerParty") or {}
-    bp_party = _get(bp, "cac:Party") or _get(bp, "Party") or {}
-    bp_name = (
-        _text(_get(bp_party, "cac:PartyLegalEntity.cbc:RegistrationName")) or
-        _text(_get(bp_party, "PartyLegalEntity.cbc:RegistrationName")) or
-        _text(_get(bp_party, "PartyLegalEntity.RegistrationName")) or
-        _text(_get(bp_party, "cac:PartyName.cbc:Name")) or
-        _text(_get(bp_party, "PartyName.cbc:Name")) or
-        _text(_get(bp_party, "PartyName.Name")) or
-        "-"
-    )
-    bp_cui  = (
-        _text(_get(bp_party, "cac:PartyTaxScheme.cbc:CompanyID")) or
-        _text(_get(bp_party, "PartyTaxScheme.cbc:CompanyID")) or
-        _text(_get(bp_party, "PartyTaxScheme.CompanyID")) or
-        "-"
-    )
-    bp_addr = _compose_address(bp_party)
+    style = detect_style(inv)
+    head, raw_lines, tax_total, legal_tot = _parse_head(inv, style)
 
     # --- linii ---
-    raw_lines = _get(inv, "cac:InvoiceLine") or _get(inv, "InvoiceLine") or []
+    raw_lines = raw_lines or []
     if isinstance(raw_lines, dict):
         raw_lines = [raw_lines]
 
-    lines: List[Dict[str, Any]] = []
+    line_values = _LINE_PLAN.bind(style).values
+    lines = LineBlock()
+    add = lines.append
     for ln in raw_lines:
-        name = (
-            _text(_get(ln, "cac:Item.cbc:Name")) or
-            _text(_get(ln, "Item.cbc:Name")) or
-            _text(_get(ln, "Item.Name")) or
-            "-"
-        )
-
-        qty = _as_float_safe(
-            _get(ln, "cbc:InvoicedQuantity.#text") or
-            _get(ln, "cbc:InvoicedQuantity") or
-            _get(ln, "InvoicedQuantity.#text") or
-            _get(ln, "InvoicedQuantity")
-        )
-        unit = _text(
-            _get(ln, "cbc:InvoicedQuantity.@unitCode") or
-            _get(ln, "InvoicedQuantity.@unitCode")
-        )
-
-        price_amt = _as_float_safe(
-            _get(ln, "cac:Price.cbc:PriceAmount.#text") or
-            _get(ln, "cac:Price.cbc:PriceAmount") or
-            _get(ln, "Price.cbc:PriceAmount") or
-            _get(ln, "Price.PriceAmount")
-        )
-        base_qty = _as_float_safe(
-            _get(ln, "cac:Price.cbc:BaseQuantity.#text") or
-            _get(ln, "cac:Price.cbc:BaseQuantity") or
-            _get(ln, "Price.cbc:BaseQuantity") or
-            _get(ln, "Price.BaseQuantity")
-        ) or 1.0
-        price = round(price_amt / base_qty, 6) if base_qty not in (0, 1) else price_amt
-
-        line_net = _as_float_safe(
-            _get(ln, "cbc:LineExtensionAmount.#text") or
-            _get(ln, "cbc:LineExtensionAmount") or
-            _get(ln, "LineExtensionAmount")
-        )
-        if not line_net and qty and price:
-            line_net = round(qty * price, 2)
-
-        # TVA% STRICT din XML
-        vat_pct = _as_float_safe(
-            _get(ln, "cac:Item.cac:ClassifiedTaxCategory.cbc:Percent") or
-            _get(ln, "Item.cac:ClassifiedTaxCategory.cbc:Percent") or
-            _get(ln, "Item.ClassifiedTaxCategory.Percent") or
-            _get(ln, "cac:TaxTotal.cac:TaxSubtotal.cbc:Percent") or
-            _get(ln, "TaxTotal.TaxSubtotal.Percent")
-        )
-
-        lines.append({
-            "name": name,
-            "qty": qty,
-            "unit": unit,
-            "price": price,
-            "line_net": line_net,
-            "vat_pct": vat_pct,
-        })
+        add(*_line_from_values(line_values(ln)))
 
-    # --- totaluri din XML ---
-    tax_total = _get(inv, "cac:TaxTotal") or _get(inv, "TaxTotal") or {}
-    legal_tot = _get(inv, "cac:LegalMonetaryTotal") or _get(inv, "LegalMonetaryTotal") or {}
+    return _assemble(head, lines, _parse_totals(tax_total, legal_tot, style), validate)
 
-    net     = _as_float_safe(_get(legal_tot, "cbc:TaxExclusiveAmount") or _get(legal_tot, "TaxExclusiveAmount"))
-    gross   = _as_float_safe(_get(legal_tot, "cbc:TaxInclusiveAmount") or _get(legal_tot, "TaxInclusiveAmount"))
-    payable = _as_float_safe(_get(legal_tot, "cbc:PayableAmount")      or _get(legal_tot, "PayableAmount"))
-    vat     = _as_float_safe(_get(tax_total,  "cbc:TaxAmount")         or _get(tax_total,  "TaxAmount"))
 
-    # defalcare sub-totale TVA la nivel de antet (pentru raportare/validări)
-    ts = _get(tax_total, "cac:TaxSubtotal") or _get(tax_total, "TaxSubtotal") or []
-    if isinstance(ts, dict):
-        ts = [ts]
-    tax_subtotals: List[Dict[str, Any]] = []
-    for t in ts:
-        tax_subtotals.append({
-            "rate":    _as_float_safe(
-                _get(t, "cac:TaxCategory.cbc:Percent") or
-                _get(t, "cbc:Percent") or
-                _get(t, "Percent")
-            ),
-            "taxable": _as_float_safe(_get(t, "cbc:TaxableAmount") or _get(t, "TaxableAmount")),
-            "tax":     _as_float_safe(_get(t, "cbc:TaxAmount")     or _get(t, "TaxAmount")),
-        })
-
-    # --- recalcul din linii (fără presupuneri de cote) ---
-    calc_net = round(sum(_as_float_safe(l["line_net"]) for l in lines), 2)
-    calc_vat = round(sum(_as_float_safe(l["line_net"]) * (_as_float_safe(l["vat_pct"]) / 100.0) for l in lines), 2)
-
-    # --- validări simple ---
-    validations: List[Dict[str, str]] = []
-    if not inv_id:
-        validations.append({"level": "warning", "msg": "Lipsește ID factură."})
-    if net and abs(calc_net - net) > 0.05:
-        validations.append({"level": "warning",
-                            "msg": f"Net din linii ({calc_net}) diferă de Net din XML ({net})."})
-    if vat and abs(calc_vat - vat) > 0.05:
-        validations.append({"level": "warning",
-                            "msg": f"TVA din linii ({calc_vat}) diferă de TVA din XML ({vat})."})
-
-    return {
-        "id": inv_id,
-        "issue_date": issue_date,
-        "currency": currency,
-        "supplier": {"name": sp_name, "cui": sp_cui, "address": sp_addr},
-        "buyer":    {"name": bp_name, "cui": bp_cui, "address": bp_addr},
-        "totals":   {
-            "net": net,
-            "vat": vat,
-            "gross": gross,
-            "payable": payable,
-            "calc_net_from_lines": calc_net,
-            "calc_vat_from_lines": calc_vat,
-            "tax_subtotals": tax_subtotals,
-        },
-        "lines": lines,
-        "validations": validations,
-    }
+@instrumented("parse_invoice_xml", lines=lambda inv, *a, **k: len(inv["lines"]))
+def parse_invoice_xml(raw: Union[bytes, str], validate: bool = True) -> Dict[str, Any]:
+    """
+    `parse_invoice_minimal` pornind de la XML-ul brut: span-ul include și
+    xmltodict.parse, partea scumpă a acestei căi (comparabil cu `parse_invoice_stream`).
+    """
+    import xmltodict
+    return parse_invoice_minimal(xmltodict.parse(raw), validate=validate)
@@ -0,0 +1,139 @@
+# app/parsers/ubl_stream.py
+from __future__ import annotations
+from typing import Any, Dict, List
+
+from lxml import etree
+
+from app.metrics import instrumented
+from app.models.lines import LineBlock
+from app.parsers.attachments import AttachmentFilter, Source, open_source
+from app.parsers.field_plan import STYLE_MIXED, detect_style_from_keys
+from app.parsers.ubl_parser import (
+    _LINE_PLAN, _assemble, _line_from_values, _parse_head, _parse_totals,
+)
+
+# ------------------------ element lxml -> dict (ca xmltodict) ------------------------
+def _qname(el, name: str) -> str:
+    """'{ns}Local' -> 'prefix:Local' folosind prefixul din document (ca xmltodict fără namespaces)."""
+    if name[:1] != "{":
+        return name
+    uri, local = name[1:].split("}", 1)
+    for prefix, u in el.nsmap.items():
+        if u == uri:
+            return f"{prefix}:{local}" if prefix else local
+    return local
+
+
+def _element_key(el) -> str:
+    local = el.tag.rpartition("}")[2]
+    prefix = el.prefix
+    return f"{prefix}:{local}" if prefix else local
+
+
+def _add_child(parent: Dict[str, Any], key: str, val: Any) -> None:
+    if key in parent:
+        prev = parent[key]
+        if isinstance(prev, list):
+            prev.append(val)
+        else:
+            parent[key] = [prev, val]
+    else:
+        parent[key] = val
+
+
+def _element_to_dict(el) -> Any:
+    """
+    Convertește un element în aceeași formă pe care o produce xmltodict.parse:
+    atribute '@x', text '#text' (doar dacă există și atribute/copii), copii repetați -> listă,
+    element gol -> None. Textul se concatenează (inclusiv tail-urile copiilor) și se face strip.
+    """
+    item: Dict[str, Any] = {}
+    for k, v in el.attrib.items():
+        item["@" + _qname(el, k)] = v
+
+    texts: List[str] = [el.text] if el.text else []
+    for child in el:
+        if child.tail:
+            texts.append(child.tail)
+        if not isinstance(child.tag, str):  # comentarii / PI
+            continue
+        _add_child(item, _element_key(child), _element_to_dict(child))
+
+    text = "".join(texts).strip() if texts else ""
+    if not item:
+        return text or None
+    if text:
+        item["#text"] = text
+    return item
+
+
+# ------------------------ parser streaming ------------------------
+@instrumented("parse_invoice_stream", lines=lambda inv, *a, **k: len(inv["lines"]))
+def parse_invoice_stream(source: Source, validate: bool = True) -> Dict[str, Any]:
+    """
+    Variantă streaming a `parse_invoice_minimal`, construită pe lxml.etree.iterparse.
+    Acceptă cale, bytes sau obiect file-like și întoarce exact același payload.
+
+    Elementele de antet (părți, totaluri, TaxTotal etc.) se convertesc în dict ca în
+    xmltodict; fiecare `cac:InvoiceLine` e extrasă imediat ce se închide și apoi
+    eliberată, deci memoria nu crește cu numărul de linii. Atașamentele încorporate
+    (PDF-ul furnizorului în base64) nu ajung la lxml: `AttachmentFilter` le sare
+    conținutul și le păstrează doar dimensiunea (vezi app/parsers/attachments.py).
+    `validate=False`: fără validări (loturile le evaluează deodată, `rules.validate_batch`).
+    """
+    with open_source(source) as raw:
+        filt = AttachmentFilter(raw)
+        inv = _parse(filt, validate)
+    for att in inv["attachments"]:
+        att["size"] = filt.sizes[att["index"]] if att["index"] < len(filt.sizes) else 0
+    return inv
+
+
+def _parse(stream: AttachmentFilter, validate: bool = True) -> Dict[str, Any]:
+    ctx = etree.iterparse(
+        stream,
+        events=("start", "end"),
+        remove_comments=True,
+        remove_pis=True,
+        resolve_entities=False,
+        huge_tree=True,
+    )
+
+    head: Dict[str, Any] = {}
+    lines = LineBlock()
+    root = None
+    depth = 0
+    line_values = None
+    style = STYLE_MIXED
+
+    for event, el in ctx:
+        if event == "start":
+            if root is None:
+                root = el
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth != 1:
+            continue  # ne interesează doar copiii direcți ai rădăcinii
+
+        key = _element_key(el)
+        if el.tag.rpartition("}")[2] == "InvoiceLine":
+            if line_values is None:
+                # stilul de prefix se fixează la prima linie, din cheile văzute până acum
+                style = detect_style_from_keys(list(head) + [key])
+                line_values = _LINE_PLAN.bind(style).values
+            lines.append(*_line_from_values(line_values(_element_to_dict(el))))
+        else:
+            _add_child(head, key, _element_to_dict(el))
+
+        # eliberăm elementul procesat (și frații deja procesați) din arbore
+        el.clear()
+        while el.getprevious() is not None:
+            del root[0]
+
+    if line_values is None:
+        style = detect_style_from_keys(head)
+
+    head_vals, _, tax_total, legal_tot = _parse_head(head, style)
+    return _assemble(head_vals, lines, _parse_totals(tax_total, legal_tot, style), validate)
@@ -0,0 +1,321 @@
+# app/rules.py
+"""
+Motor de reguli pentru validarea facturilor (EN 16931 / RO_CIUS), evaluat pe coloane.
+
+Regulile sunt declarative (`Rule`): un ID, un nivel, un mesaj-șablon, un domeniu și
+o condiție care întoarce masca încălcărilor pe coloanele întregului lot:
+  - "line"    — o valoare per linie, pentru toate liniile tuturor facturilor concatenate;
+  - "invoice" — o valoare per factură;
+  - "rate"    — o valoare per pereche (factură, cotă TVA): liniile grupate pe cotă
+                alături de defalcarea TaxSubtotal din XML.
+Coloanele se construiesc o singură dată per lot și doar cele cerute de reguli, deci
+evaluarea e O(reguli) operații numpy, nu O(linii × reguli) condiții Python.
+
+Rezultatul, per factură: [{level, rule, msg, [lines], [rate]}, ...] în ordinea regulilor
+(regulile se evaluează pe rând, fiecare pe tot lotul).
+`lines` = indicii (de la 0) liniilor care încalcă regula; în mesaj apar numerotate de la 1.
+ID-urile BR-* urmează EN 16931; NIR-* sunt verificări proprii (ex. cele pentru care
+parserul nu extrage toate câmpurile, precum reducerile/majorările).
+"""
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.models.lines import LineBlock
+
+TOL = 0.05          # toleranța de rotunjire pentru comparațiile de sume (lei)
+MAX_LISTED = 10     # câte numere de linie apar în mesaj
+
+Payload = Dict[str, Any]
+
+
+# ------------------------ coloanele lotului ------------------------
+def _block(lines: Any) -> LineBlock:
+    return lines if isinstance(lines, LineBlock) else LineBlock.from_rows(lines or [])
+
+
+def _missing(values: Sequence[Any]) -> np.ndarray:
+    # părțile/denumirile lipsă ajung din parser ca "" sau "-"
+    return np.fromiter((not v or str(v).strip() in ("", "-") for v in values), dtype=bool, count=len(values))
+
+
+class Columns:
+    """Coloanele unui lot de facturi, calculate leneș (doar cele folosite de reguli)."""
+
+    def __init__(self, invoices: Sequence[Payload]):
+        self.invoices = invoices
+        self.blocks = [_block(inv.get("lines")) for inv in invoices]
+        self.n = len(invoices)
+        counts = np.fromiter((len(b) for b in self.blocks), dtype=np.int64, count=self.n)
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self._cache: Dict[str, Any] = {"line_count": counts}
+
+    def __getitem__(self, key: str) -> Any:
+        val = self._cache.get(key)
+        if val is None:
+            val = self._cache[key] = _BUILDERS[key](self)
+        return val
+
+
+def _line_num(key: str) -> Callable[[Columns], np.ndarray]:
+    def build(c: Columns) -> np.ndarray:
+        if not c.blocks:
+            return np.zeros(0)
+        # array('d') -> numpy fără copie per bloc; o singură concatenare pentru lot
+        return np.concatenate([np.frombuffer(b.column(key), dtype=float) if len(b) else np.zeros(0)
+                               for b in c.blocks])
+    return build
+
+
+def _name_missing(c: Columns) -> np.ndarray:
+    out = np.zeros(int(c.offsets[-1]), dtype=bool)
+    for start, b in zip(c.offsets, c.blocks):
+        names = b.name
+        # numărarea e în C; indicii se caută doar în blocurile care chiar au denumiri lipsă
+        if names.count("-") or names.count(""):
+            idx = [i for i, v in enumerate(names) if v in ("", "-")]
+            out[start + np.asarray(idx, dtype=np.int64)] = True
+    return out
+
+
+def _inv_num(*path: str) -> Callable[[Columns], np.ndarray]:
+    def build(c: Columns) -> np.ndarray:
+        def get(inv):
+            cur = inv
+            for p in path:
+                cur = (cur or {}).get(p)
+            try:
+                return float(cur or 0.0)
+            except (TypeError, ValueError):
+                return 0.0
+        return np.fromiter((get(inv) for inv in c.invoices), dtype=float, count=c.n)
+    return build
+
+
+def _inv_text(*path: str) -> Callable[[Columns], List[str]]:
+    def build(c: Columns) -> List[str]:
+        out = []
+        for inv in c.invoices:
+            cur = inv
+            for p in path:
+                cur = (cur or {}).get(p)
+            out.append("" if cur is None else str(cur))
+        return out
+    return build
+
+
+def _subtotals(c: Columns) -> Dict[str, np.ndarray]:
+    inv_idx, rate, taxable, tax = [], [], [], []
+    for i, inv in enumerate(c.invoices):
+        for st in (inv.get("totals") or {}).get("tax_subtotals") or []:
+            inv_idx.append(i)
+            rate.append(float(st.get("rate") or 0.0))
+            taxable.append(float(st.get("taxable") or 0.0))
+            tax.append(float(st.get("tax") or 0.0))
+    return {"inv": np.asarray(inv_idx, dtype=np.int64), "rate": np.asarray(rate, dtype=float),
+            "taxable": np.asarray(taxable, dtype=float), "tax": np.asarray(tax, dtype=float)}
+
+
+def _rate_groups(c: Columns) -> Dict[str, np.ndarray]:
+    """Perechile (factură, cotă) din linii ∪ defalcare, cu sumele fiecărei părți."""
+    st = c["subtotals"]
+    line_inv = np.repeat(np.arange(c.n, dtype=np.int64), c["line_count"])
+    rates = np.round(np.concatenate([c["vat_pct"], st["rate"]]), 2)
+    uniq, codes = np.unique(rates, return_inverse=True)
+    nr = max(1, len(uniq))
+    nl = len(line_inv)
+    pairs = np.concatenate([line_inv, st["inv"]]) * nr + codes
+    gpairs, ginv = np.unique(pairs, return_inverse=True)
+    g = len(gpairs)
+    gl, gs = ginv[:nl], ginv[nl:]
+    inv_has_st = np.bincount(st["inv"], minlength=c.n) > 0
+    return {
+        "inv":         gpairs // nr,
+        "rate":        uniq[gpairs % nr] if len(uniq) else np.zeros(0),
+        "lines_net":   np.bincount(gl, weights=c["line_net"], minlength=g),
+        "lines_count": np.bincount(gl, minlength=g),
+        "st_count":    np.bincount(gs, minlength=g),
+        "st_taxable":  np.bincount(gs, weights=st["taxable"], minlength=g),
+        "st_tax":      np.bincount(gs, weights=st["tax"], minlength=g),
+        "inv_has_st":  inv_has_st[gpairs // nr] if g else np.zeros(0, dtype=bool),
+    }
+
+
+_BUILDERS: Dict[str, Callable[[Columns], Any]] = {
+    # linii
+    "qty":          _line_num("qty"),
+    "price":        _line_num("price"),
+    "line_net":     _line_num("line_net"),
+    "vat_pct":      _line_num("vat_pct"),
+    "name_missing": _name_missing,
+    # facturi
+    "net":          _inv_num("totals", "net"),
+    "vat":          _inv_num("totals", "vat"),
+    "gross":        _inv_num("totals", "gross"),
+    "calc_net":     _inv_num("totals", "calc_net_from_lines"),
+    "calc_vat":     _inv_num("totals", "calc_vat_from_lines"),
+    "id":           _inv_text("id"),
+    "issue_date":   _inv_text("issue_date"),
+    "currency":     _inv_text("currency"),
+    "supplier_name": _inv_text("supplier", "name"),
+    "supplier_cui": _inv_text("supplier", "cui"),
+    "buyer_name":   _inv_text("buyer", "name"),
+    "buyer_cui":    _inv_text("buyer", "cui"),
+    "has_subtotals": lambda c: np.bincount(c["subtotals"]["inv"], minlength=c.n) > 0,
+    # defalcare TVA
+    "subtotals":    _subtotals,
+    "groups":       _rate_groups,
+}
+
+
+# ------------------------ reguli ------------------------
+@dataclass(frozen=True)
+class Rule:
+    id: str
+    level: str                                  # "error" | "warning" | "info"
+    scope: str                                  # "line" | "invoice" | "rate"
+    message: str                                # șablon; câmpurile = coloane (invoice) / chei de grup (rate)
+    check: Callable[[Columns], np.ndarray]      # masca încălcărilor (True = încălcare)
+
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def _close(a: np.ndarray, b: np.ndarray, tol: float = TOL) -> np.ndarray:
+    return np.abs(a - b) <= tol
+
+
+DEFAULT_RULES: Sequence[Rule] = (
+    # --- linii ---
+    Rule("NIR-01", "warning", "line", "Valori numerice nevalide (NaN/inf)",
+         lambda c: ~(np.isfinite(c["qty"]) & np.isfinite(c["price"])
+                     & np.isfinite(c["line_net"]) & np.isfinite(c["vat_pct"]))),
+    # --- antet (ordinea validărilor de dinainte: ID, net, TVA) ---
+    Rule("BR-02", "warning", "invoice", "Lipsește ID factură.", lambda c: _missing(c["id"])),
+    Rule("NIR-02", "warning", "invoice", "Net din linii ({calc_net}) diferă de Net din XML ({net}).",
+         lambda c: (c["net"] != 0) & ~_close(c["calc_net"], c["net"])),
+    Rule("NIR-03", "warning", "invoice", "TVA din linii ({calc_vat}) diferă de TVA din XML ({vat}).",
+         lambda c: (c["vat"] != 0) & ~_close(c["calc_vat"], c["vat"])),
+    Rule("BR-03", "warning", "invoice", "Lipsește data emiterii.", lambda c: _missing(c["issue_date"])),
+    Rule("NIR-04", "warning", "invoice", "Data emiterii „{issue_date}” nu e în formatul AAAA-LL-ZZ.",
+         lambda c: np.fromiter((bool(d) and not _DATE_RE.match(d) for d in c["issue_date"]), dtype=bool, count=c.n)),
+    Rule("BR-05", "warning", "invoice", "Lipsește codul monedei.", lambda c: _missing(c["currency"])),
+    Rule("BR-16", "warning", "invoice", "Factura nu are nicio linie.", lambda c: c["line_count"] == 0),
+    Rule("BR-CO-15", "warning", "invoice", "Total cu TVA ({gross}) ≠ Net ({net}) + TVA ({vat}).",
+         lambda c: (c["gross"] != 0) & ~_close(c["gross"], c["net"] + c["vat"])),
+    Rule("NIR-06", "warning", "invoice", "Semne diferite: Net {net}, Total cu TVA {gross}.",
+         lambda c: c["net"] * c["gross"] < 0),
+    Rule("BR-CO-14", "warning", "invoice", "TVA din XML ({vat}) ≠ suma defalcării pe cote.",
+         lambda c: c["has_subtotals"] & ~_close(
+             np.bincount(c["subtotals"]["inv"], weights=c["subtotals"]["tax"], minlength=c.n), c["vat"])),
+    # --- linii ---
+    Rule("BR-25", "warning", "line", "Linii fără denumire", lambda c: c["name_missing"]),
+    Rule("BR-27", "warning", "line", "Preț unitar negativ", lambda c: c["price"] < 0),
+    Rule("NIR-07", "warning", "line", "Cotă TVA în afara intervalului 0–100%",
+         lambda c: (c["vat_pct"] < 0) | (c["vat_pct"] >= 100)),
+    Rule("NIR-08", "warning", "line", "Semnul valorii nete diferă de cel al cantității × preț",
+         lambda c: c["line_net"] * (c["qty"] * c["price"]) < 0),
+    Rule("NIR-09", "info", "line", "Valoare netă diferită de cantitate × preț (reduceri/majorări pe linie?)",
+         lambda c: ~_close(c["line_net"], c["qty"] * c["price"], np.maximum(TOL, 0.005 * np.abs(c["line_net"])))),
+    # --- defalcare pe cote ---
+    Rule("BR-CO-17", "warning", "rate", "TVA pe cota {rate:g}% ({st_tax:.2f}) ≠ baza {st_taxable:.2f} × cotă.",
+         lambda c: (c["groups"]["st_count"] > 0) & ~_close(
+             c["groups"]["st_tax"], np.round(c["groups"]["st_taxable"] * c["groups"]["rate"] / 100.0, 2))),
+    Rule("BR-S-08", "warning", "rate", "Baza pe cota {rate:g}%: linii {lines_net:.2f} ≠ defalcare {st_taxable:.2f}.",
+         lambda c: (c["groups"]["st_count"] > 0) & ~_close(c["groups"]["lines_net"], c["groups"]["st_taxable"])),
+    Rule("NIR-10", "warning", "rate", "Cota {rate:g}% apare pe linii, dar lipsește din defalcarea TVA.",
+         lambda c: (c["groups"]["lines_count"] > 0) & (c["groups"]["st_count"] == 0) & c["groups"]["inv_has_st"]),
+)
+
+
+# Completitudinea EN 16931 (părți, defalcare TVA). NIR-ul nu are nevoie de ele și parserul
+# acceptă facturi fără ele, deci nu intră în validarea implicită; `STRICT_RULESET` le adaugă.
+COMPLETENESS_RULES: Sequence[Rule] = (
+    Rule("BR-06", "warning", "invoice", "Lipsește denumirea furnizorului.", lambda c: _missing(c["supplier_name"])),
+    Rule("BR-CO-26", "warning", "invoice", "Lipsește identificatorul (CUI/CIF) furnizorului.",
+         lambda c: _missing(c["supplier_cui"])),
+    Rule("BR-07", "warning", "invoice", "Lipsește denumirea cumpărătorului.", lambda c: _missing(c["buyer_name"])),
+    Rule("NIR-05", "warning", "invoice", "Lipsește identificatorul (CUI/CIF) cumpărătorului.",
+         lambda c: _missing(c["buyer_cui"])),
+    Rule("BR-CO-18", "warning", "invoice", "Lipsește defalcarea TVA pe cote (TaxSubtotal).",
+         lambda c: (c["line_count"] > 0) & ~c["has_subtotals"]),
+)
+
+# ------------------------ evaluare ------------------------
+class _Fields(dict):
+    """Câmpurile unui mesaj-șablon: valoarea coloanei pentru rândul `i`."""
+
+    def __init__(self, source: Dict[str, Any], i: int):
+        super().__init__()
+        self.source, self.i = source, i
+
+    def __missing__(self, key: str) -> Any:
+        val = self.source[key][self.i]
+        return val.item() if isinstance(val, np.generic) else val
+
+
+def _line_label(idx: np.ndarray) -> str:
+    shown = ", ".join(str(int(i) + 1) for i in idx[:MAX_LISTED])
+    more = "…" if len(idx) > MAX_LISTED else ""
+    return f"linia {shown}" if len(idx) == 1 else f"{len(idx)} linii: {shown}{more}"
+
+
+class RuleSet:
+    """Reguli „compilate”: listă fixă, evaluată pe coloanele unui lot întreg."""
+
+    def __init__(self, rules: Sequence[Rule] = DEFAULT_RULES):
+        for r in rules:
+            if r.scope not in ("line", "invoice", "rate"):
+                raise ValueError(f"{r.id}: domeniu necunoscut {r.scope!r}")
+        self.rules = tuple(rules)
+
+    def validate_batch(self, invoices: Sequence[Payload]) -> List[List[Dict[str, Any]]]:
+        cols = Columns(invoices)
+        out: List[List[Dict[str, Any]]] = [[] for _ in range(cols.n)]
+        if not cols.n:
+            return out
+        for rule in self.rules:
+            mask = np.asarray(rule.check(cols), dtype=bool)
+            if not mask.any():
+                continue
+            hits = np.flatnonzero(mask)
+            if rule.scope == "invoice":
+                for i in hits:
+                    out[i].append({"level": rule.level, "rule": rule.id,
+                                   "msg": rule.message.format_map(_Fields(cols, int(i)))})
+            elif rule.scope == "rate":
+                groups = cols["groups"]
+                for g in hits:
+                    out[int(groups["inv"][g])].append({
+                        "level": rule.level, "rule": rule.id, "rate": float(groups["rate"][g]),
+                        "msg": rule.message.format_map(_Fields(groups, int(g))),
+                    })
+            else:
+                # indicii globali -> (factură, linie): o intrare per factură, cu toate liniile ei
+                inv_of = np.searchsorted(cols.offsets, hits, side="right") - 1
+                bounds = np.flatnonzero(np.diff(inv_of)) + 1
+                for chunk, invs in zip(np.split(hits, bounds), np.split(inv_of, bounds)):
+                    i = int(invs[0])
+                    local = chunk - cols.offsets[i]
+                    out[i].append({"level": rule.level, "rule": rule.id, "lines": local.tolist(),
+                                   "msg": f"{rule.message} ({_line_label(local)})."})
+        return out
+
+    def validate(self, invoice: Payload) -> List[Dict[str, Any]]:
+        return self.validate_batch([invoice])[0]
+
+
+DEFAULT_RULESET = RuleSet()
+STRICT_RULESET  = RuleSet(tuple(DEFAULT_RULES) + tuple(COMPLETENESS_RULES))
+
+
+def validate_invoice(invoice: Payload, ruleset: Optional[RuleSet] = None) -> List[Dict[str, Any]]:
+    return (ruleset or DEFAULT_RULESET).validate(invoice)
+
+
+def validate_batch(invoices: Sequence[Payload], ruleset: Optional[RuleSet] = None) -> List[List[Dict[str, Any]]]:
+    """Validările pentru mai multe facturi deodată (aceleași rezultate ca `validate_invoice` pe fiecare)."""
+    return (ruleset or DEFAULT_RULESET).validate_batch(invoices)
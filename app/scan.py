@@ -0,0 +1,140 @@
+# app/scan.py
+"""
+Triaj rapid: indexul antetelor pentru mii de facturi, fără linii și fără exporturi.
+
+    python -m app.scan facturi/                         # CSV pe stdout, sortat după dată
+    python -m app.scan descarcari_spv/ --sort supplier_cui,issue_date -o index.csv
+    python -m app.scan facturi/ --format json --mmap -o index.json
+
+Intrările sunt aceleași ca la `app.batch` (director cu XML-uri și/sau ZIP-uri SPV,
+o arhivă ZIP sau un XML). Fiecare fișier se citește doar până la totaluri
+(app/parsers/header_scan.py), în pool-ul de procese. Perechile furnizor (CUI
+normalizat) + număr de factură repetate sunt marcate în `duplicate_of`.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.archive import normalize_cui
+from app.batch import Job, _job_source, available_workers, iter_jobs
+from app.parsers.header_scan import scan_header
+
+FIELDS = ("source", "id", "issue_date", "currency", "supplier_name", "supplier_cui",
+          "buyer_name", "buyer_cui", "net", "vat", "gross", "payable", "error", "duplicate_of")
+DEFAULT_SORT = ("issue_date", "supplier_cui", "id")
+
+
+def scan_job(job: Job, use_mmap: bool = False) -> Dict[str, Any]:
+    """Înregistrarea de antet a unui job; erorile rămân în câmpul `error`, ca în manifestul din batch."""
+    rec: Dict[str, Any] = {"source": job.source}
+    try:
+        src = _job_source(job)
+        if isinstance(src, str):
+            rec.update(scan_header(src, use_mmap))
+        else:
+            try:
+                rec.update(scan_header(src))
+            finally:
+                if hasattr(src, "close"):
+                    src.close()
+        rec["error"] = None
+    except Exception as e:
+        rec["error"] = f"{type(e).__name__}: {e}"
+    return rec
+
+
+def _scan_job_mmap(job: Job) -> Dict[str, Any]:
+    return scan_job(job, use_mmap=True)
+
+
+def scan_jobs(jobs: Sequence[Job], workers: Optional[int] = None, use_mmap: bool = False) -> List[Dict[str, Any]]:
+    """Înregistrările în ordinea job-urilor (în paralel dacă workers > 1)."""
+    workers = max(1, min(workers or available_workers(), len(jobs) or 1))
+    fn = _scan_job_mmap if use_mmap else scan_job
+    if workers == 1:
+        return [fn(job) for job in jobs]
+    # o scanare durează sub o milisecundă: bucăți mari, altfel domină IPC-ul
+    chunksize = max(1, min(256, len(jobs) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, jobs, chunksize=chunksize))
+
+
+def mark_duplicates(records: List[Dict[str, Any]]) -> int:
+    """`duplicate_of` = sursa primei apariții a aceleiași perechi (CUI furnizor, număr); întoarce câte s-au marcat."""
+    seen: Dict[tuple, str] = {}
+    n = 0
+    for rec in records:
+        rec["duplicate_of"] = None
+        if rec.get("error") or not rec.get("id"):
+            continue
+        key = (normalize_cui(rec.get("supplier_cui")), str(rec["id"]).strip())
+        first = seen.setdefault(key, rec["source"])
+        if first != rec["source"]:
+            rec["duplicate_of"] = first
+            n += 1
+    return n
+
+
+def sort_records(records: List[Dict[str, Any]], keys: Sequence[str] = DEFAULT_SORT,
+                 reverse: bool = False) -> List[Dict[str, Any]]:
+    """Sortare după câmpurile date; valorile lipsă ajung la final, numerele se compară ca numere."""
+    def sort_key(rec: Dict[str, Any]):
+        out = []
+        for k in keys:
+            v = rec.get(k)
+            out.append((v is None or v == "", v if isinstance(v, (int, float)) else str(v or "")))
+        return out
+    return sorted(records, key=sort_key, reverse=reverse)
+
+
+def write_index(records: List[Dict[str, Any]], out, fmt: str = "csv") -> None:
+    if fmt == "json":
+        json.dump(records, out, ensure_ascii=False, indent=2)
+        out.write("\n")
+        return
+    w = csv.DictWriter(out, fieldnames=FIELDS, extrasaction="ignore")
+    w.writeheader()
+    w.writerows(records)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.scan", description="Index rapid al antetelor e-Factura (fără linii)")
+    ap.add_argument("input", help="director cu XML-uri/ZIP-uri, arhivă ZIP sau un singur XML")
+    ap.add_argument("-o", "--out", default="-", help="fișier de ieșire (implicit: stdout)")
+    ap.add_argument("-f", "--format", choices=("csv", "json"), default="csv")
+    ap.add_argument("-s", "--sort", default=",".join(DEFAULT_SORT),
+                    help=f"câmpuri de sortare separate prin virgulă (din: {', '.join(FIELDS)})")
+    ap.add_argument("-r", "--reverse", action="store_true", help="ordine descrescătoare")
+    ap.add_argument("-w", "--workers", type=int, default=None, help="număr de procese (implicit: nucleele disponibile)")
+    ap.add_argument("--mmap", action="store_true", help="citește fișierele XML prin mmap")
+    args = ap.parse_args(argv)
+
+    keys = [k.strip() for k in args.sort.split(",") if k.strip()]
+    unknown = [k for k in keys if k not in FIELDS]
+    if unknown:
+        ap.error(f"câmp de sortare necunoscut: {', '.join(unknown)}")
+
+    t0 = time.perf_counter()
+    jobs = list(iter_jobs(args.input, out_dir=None, pdf=False, xlsx=False))
+    records = scan_jobs(jobs, args.workers, args.mmap)
+    dups = mark_duplicates(records)
+    records = sort_records(records, keys, args.reverse)
+    wall = time.perf_counter() - t0
+
+    if args.out == "-":
+        write_index(records, sys.stdout, args.format)
+    else:
+        with open(args.out, "w", encoding="utf-8", newline="") as f:
+            write_index(records, f, args.format)
+    errors = sum(1 for r in records if r["error"])
+    print(f"{len(records)} fișiere, {errors} erori, {dups} duplicate, {wall:.2f}s", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import os
+import tempfile
+
+from app.api import NirService, create_app
+
+SAMPLE = "fixtures/sample_invoice.xml"
+
+def _call(app, method, path, body=b""):
+    """Un apel ASGI direct (fără server): întoarce (status, headers, corp)."""
+    async def go():
+        sent = []
+        chunks = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if chunks:
+                return chunks.pop(0)
+            await asyncio.Event().wait()  # ca un server real: clientul rămâne conectat până la răspuns
+
+        async def send(msg):
+            sent.append(msg)
+
+        scope = {"type": "http", "method": method, "path": path, "raw_path": path.encode(), "query_string": b"",
+                 "headers": [(b"content-length", str(len(body)).encode())], "http_version": "1.1",
+                 "scheme": "http", "server": ("test", 80), "client": ("test", 1), "root_path": ""}
+        await app(scope, receive, send)
+        start = next(m for m in sent if m["type"] == "http.response.start")
+        data = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+        return start["status"], dict(start["headers"]), data
+    return asyncio.run(go())
+
+def test_api_parse_pdf_and_errors():
+    raw = open(SAMPLE, "rb").read()
+    service = NirService(workers=1, queue=0, max_bytes=len(raw) + 10)
+    app = create_app(service)
+    service.start()
+    try:
+        status, _, body = _call(app, "POST", "/parse", raw)
+        assert status == 200 and json.loads(body)["id"] == "INV-30001"
+        status, headers, body = _call(app, "POST", "/pdf", raw)
+        assert status == 200 and body.startswith(b"%PDF") and b"NIR_INV-30001.pdf" in headers[b"content-disposition"]
+        assert not [f for f in os.listdir(tempfile.gettempdir()) if f.startswith("nir_") and f.endswith(".pdf")]
+        assert _call(app, "POST", "/xlsx", b"<Invoice>")[0] == 422
+        assert _call(app, "POST", "/pdf", raw + b" " * 20)[0] == 413
+
+        # admisie plină (1 worker, coadă 0) -> 429 imediat
+        assert service.try_acquire()
+        status, headers, _ = _call(app, "POST", "/pdf", raw)
+        service.release()
+        assert status == 429 and headers[b"retry-after"] == b"1"
+
+        assert json.loads(_call(app, "GET", "/health")[2])["in_flight"] == 0
+        text = _call(app, "GET", "/metrics")[2].decode()
+        assert 'nir_api_requests_total{route="pdf",status="429"} 1' in text
+    finally:
+        service.close()
+
+def test_api_timeout_keeps_slot_until_worker_ends_and_merges_worker_metrics(monkeypatch):
+    import time
+    from benchmarks.synth import generate_invoice
+    from app.metrics import METRICS
+
+    monkeypatch.setenv("NIR_METRICS", "time")
+    METRICS.reset()
+    big = generate_invoice(20000)
+    service = NirService(workers=1, queue=0, max_bytes=len(big), timeout_s=0.3)
+    app = create_app(service)
+    service.start()
+    try:
+        assert _call(app, "POST", "/parse", big)[0] == 504
+        # worker-ul încă parsează: slotul rămâne ocupat -> 429, nu un al doilea job în pool
+        assert _call(app, "POST", "/parse", big)[0] == 429
+        deadline = time.time() + 60
+        while service.health()["in_flight"] and time.time() < deadline:
+            time.sleep(0.05)
+        assert service.health()["in_flight"] == 0
+
+        service.timeout_s = None
+        assert _call(app, "POST", "/parse", open(SAMPLE, "rb").read())[0] == 200
+        text = _call(app, "GET", "/metrics")[2].decode()
+        assert 'nir_stage_calls_total{stage="parse_invoice_stream"} 1' in text  # măsurat în worker
+    finally:
+        service.close()
+        METRICS.reset()
@@ -0,0 +1,37 @@
+from app.archive import Archive, normalize_cui
+from app.parsers.ubl_stream import parse_invoice_stream
+from benchmarks.synth import generate_invoice
+
+def test_archive_roundtrip_queries_and_duplicates(tmp_path):
+    raw = generate_invoice(120, invoice_id="F-1")
+    retransmis = generate_invoice(120, invoice_id="F-1", seed=2)   # același număr, alt conținut
+    inv = parse_invoice_stream(raw)
+
+    with Archive(str(tmp_path / "arhiva.sqlite")) as arch:
+        pk, new = arch.add(inv, raw, "f1.xml")
+        assert new and arch.add(inv, raw, "f1-copie.xml") == (pk, False)   # același XML: o singură dată
+        arch.add_many([(parse_invoice_stream(retransmis), retransmis, "f1-bis.xml")])
+        assert len(arch) == 2
+
+        back = arch.get(pk)
+        assert back["lines"] == inv["lines"] and back["totals"] == inv["totals"]
+        assert back["supplier"] == inv["supplier"] and back["attachments"] == inv["attachments"]
+
+        month = arch.by_supplier_month("RO 1234567", 2025, 10)
+        assert [h["source"] for h in month] == ["f1.xml", "f1-bis.xml"]
+        assert arch.by_supplier_month("1234567", 2025, 11) == []
+        assert arch.by_hash(raw)["pk"] == pk
+        assert arch.duplicates() == [{"supplier_key": "1234567", "invoice_id": "F-1", "copies": 2, "pks": [pk, pk + 1]}]
+
+def test_archive_missing_cui_is_null_and_not_a_duplicate():
+    base = parse_invoice_stream(generate_invoice(3, invoice_id="F-9"))
+    with Archive(":memory:") as arch:
+        pks = [arch.add(dict(base, supplier=dict(base["supplier"], cui=cui)), source=cui)[0]
+               for cui in ("-", "", "RO")]
+        assert arch.duplicates() == []
+        assert [h["pk"] for h in arch.find(supplier_cui="-")] == pks
+        assert arch.conn.execute("SELECT COUNT(*) FROM invoices WHERE supplier_key IS NULL").fetchone()[0] == 3
+
+def test_normalize_cui():
+    assert normalize_cui("RO 01234567") == normalize_cui("1234567") == "1234567"
+    assert normalize_cui(None) is normalize_cui("-") is normalize_cui(" RO ") is None
@@ -0,0 +1,100 @@
+import json
+import shutil
+import zipfile
+
+from app.batch import MANIFEST_NAME, main
+
+SAMPLE = "fixtures/sample_invoice.xml"
+
+def test_batch_zip_writes_outputs_and_manifest(tmp_path):
+    zpath = tmp_path / "facturi.zip"
+    with zipfile.ZipFile(zpath, "w") as zf:
+        zf.write(SAMPLE, "oct/f1.xml")
+        zf.writestr("oct/stricat.xml", "<Invoice>")
+        zf.writestr("oct/readme.txt", "ignorat")
+    out = tmp_path / "out"
+
+    rc = main([str(zpath), "-o", str(out), "-w", "2", "-q"])
+
+    manifest = json.loads((out / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert rc == 1  # un fișier invalid -> cod de ieșire nenul
+    assert manifest["summary"]["files"] == 2
+    assert manifest["summary"]["errors"] == 1
+    ok = [e for e in manifest["files"] if e["status"] == "ok"][0]
+    assert ok["invoice_id"] == "INV-30001" and ok["lines"] == 2
+    assert {"parse", "nir_table", "pdf", "xlsx", "total"} <= set(ok["timings_ms"])
+    for name in ok["outputs"]:
+        assert (out / name).stat().st_size > 0
+
+def test_batch_directory_pdf_only(tmp_path):
+    src = tmp_path / "in"
+    src.mkdir()
+    shutil.copy(SAMPLE, src / "a.xml")
+    out = tmp_path / "out"
+
+    assert main([str(src), "-o", str(out), "-w", "1", "-q", "--no-xlsx"]) == 0
+    assert sorted(p.name for p in out.iterdir()) == ["NIR_a.pdf", MANIFEST_NAME]
+
+def test_uploads_in_memory_to_single_zip():
+    import io
+
+    from app.batch import jobs_from_uploads, run_batch, zip_outputs
+
+    raw = open(SAMPLE, "rb").read()
+    inner = io.BytesIO()
+    with zipfile.ZipFile(inner, "w") as zf:
+        zf.writestr("a.xml", raw)
+        zf.writestr("b.xml", "<Invoice>")
+    jobs = jobs_from_uploads([("a.xml", raw), ("livrare.zip", inner.getvalue())])
+    assert [j.source for j in jobs] == ["a.xml", "livrare.zip/a.xml", "livrare.zip/b.xml"]
+
+    entries = run_batch(jobs, workers=2)
+    ok = entries[0]
+    assert ok["status"] == "ok" and ok["supplier"] and ok["validation"] in ("ok", "warning")
+    assert entries[2]["status"] == "error"
+
+    with zipfile.ZipFile(io.BytesIO(zip_outputs(entries))) as zf:
+        names = zf.namelist()
+        manifest = json.loads(zf.read(MANIFEST_NAME))
+    assert sorted(names) == sorted(["NIR_a.pdf", "NIR_a.xlsx", "NIR_livrare.zip_a.pdf", "NIR_livrare.zip_a.xlsx",
+                                    MANIFEST_NAME])
+    assert manifest["summary"]["errors"] == 1 and "files" not in manifest["files"][0]
+
+def test_spv_zip_folder_skips_signature(tmp_path):
+    src = tmp_path / "spv"
+    src.mkdir()
+    raw = open(SAMPLE, "rb").read()
+    for n in ("4100000001", "4100000002"):
+        with zipfile.ZipFile(src / f"{n}.zip", "w") as zf:
+            zf.writestr(f"{n}.xml", raw)
+            zf.writestr(f"semnatura_{n}.xml", "<Signature/>")
+    shutil.copy(SAMPLE, src / "direct.xml")
+    out = tmp_path / "out"
+
+    assert main([str(src), "-o", str(out), "-w", "2", "-q", "--no-xlsx"]) == 0
+    manifest = json.loads((out / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert sorted(e["source"] for e in manifest["files"]) == [
+        "4100000001.zip/4100000001.xml", "4100000002.zip/4100000002.xml", "direct.xml"]
+    assert all(e["invoice_id"] == "INV-30001" for e in manifest["files"])
+
+def test_group_is_validated_in_one_pass():
+    from app.batch import jobs_from_uploads, process_jobs
+    from app.parsers.ubl_stream import parse_invoice_stream
+    from benchmarks.synth import generate_invoice
+
+    bad = generate_invoice(30).replace(b"<cbc:Percent>21</cbc:Percent>", b"<cbc:Percent>9</cbc:Percent>", 1)
+    uploads = [(f"f{i}.xml", bad if i % 3 == 0 else open(SAMPLE, "rb").read()) for i in range(9)] + [("x.xml", b"<")]
+    entries = process_jobs(jobs_from_uploads(uploads, pdf=False, xlsx=False))
+
+    expected = [v["msg"] for v in parse_invoice_stream(bad)["validations"]]
+    assert expected and [e["warnings"] for e in entries[:3]] == [expected, [], []]
+    assert [e["validation"] for e in entries[:9]] == ["warning", "ok", "ok"] * 3
+    assert entries[-1]["status"] == "error" and "validate" in entries[0]["timings_ms"]
+
+def test_iter_jobs_without_out_dir_keeps_exports_in_memory():
+    from app.batch import iter_jobs, process_job
+
+    jobs = list(iter_jobs(SAMPLE, None, pdf=True, xlsx=False))
+    assert [(j.source, j.out_dir) for j in jobs] == [("sample_invoice.xml", None)]
+    entry = process_job(jobs[0])
+    assert entry["status"] == "ok" and list(entry["files"]) == ["NIR_sample_invoice.pdf"]
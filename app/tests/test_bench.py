@@ -0,0 +1,23 @@
+import xmltodict
+
+from app.parsers.ubl_parser import parse_invoice_minimal
+from app.parsers.ubl_stream import parse_invoice_stream
+from benchmarks.run import compare
+from benchmarks.synth import generate_invoice
+
+def test_synthetic_invoice_parses_clean_in_both_styles():
+    for prefixed in (True, False):
+        raw = generate_invoice(50, prefixed=prefixed, name_len=120)
+        inv = parse_invoice_minimal(xmltodict.parse(raw))
+        assert len(inv["lines"]) == 50
+        assert not inv.get("warnings")
+        assert parse_invoice_stream(raw) == inv
+
+def test_compare_flags_slowdown_normalized_by_calibration():
+    base = {"meta": {"calibration_s": 0.04},
+            "scenarios": {"s": {"stages": {"pdf": {"s": 1.0, "peak_mb": 10.0}}}}}
+    slow = {"meta": {"calibration_s": 0.04},
+            "scenarios": {"s": {"stages": {"pdf": {"s": 2.0, "peak_mb": 10.0}}}}}
+    assert compare(slow, base)
+    slow["meta"]["calibration_s"] = 0.08   # mașină de 2x mai lentă -> nu e regresie
+    assert compare(slow, base) == []
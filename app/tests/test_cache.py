@@ -0,0 +1,58 @@
+from app.parsers.cache import ParseCache
+
+SAMPLE = "fixtures/sample_invoice.xml"
+
+def _sample() -> bytes:
+    with open(SAMPLE, "rb") as f:
+        return f.read()
+
+def test_memory_lru_hits_and_evictions():
+    calls = []
+
+    def parser(b):
+        calls.append(b)
+        return {"len": len(b)}
+
+    cache = ParseCache(max_items=2, parser=parser)
+    a, b, c = b"<a/>", b"<bb/>", b"<ccc/>"
+    cache.get_or_parse(a)
+    cache.get_or_parse(b)
+    assert cache.get_or_parse(a) == {"len": 4}  # hit; `a` devine cel mai recent
+    cache.get_or_parse(c)                        # evacuează `b`
+    cache.get_or_parse(b)                        # miss din nou
+
+    st = cache.stats
+    assert calls == [a, b, c, b]
+    assert (st["hits"], st["misses"], st["evictions"], st["size"]) == (1, 4, 2, 2)
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    raw = _sample()
+    first = ParseCache(max_items=4, disk_dir=str(tmp_path))
+    inv = first.get_or_parse(raw)
+    assert inv["id"] == "INV-30001"
+    assert first.stats["disk_writes"] == 1
+
+    def boom(_):
+        raise AssertionError("nu trebuia reparsat")
+
+    second = ParseCache(max_items=4, disk_dir=str(tmp_path), parser=boom)
+    assert second.get_or_parse(raw) == inv
+    assert second.stats["disk_hits"] == 1
+    assert second.get_or_parse(raw) == inv
+    assert second.stats["hits"] == 1
+
+def test_disk_tier_is_plain_json(tmp_path):
+    import json
+    import pickle
+
+    raw = _sample()
+    cache = ParseCache(max_items=0, disk_dir=str(tmp_path))
+    inv = cache.get_or_parse(raw)
+    path = cache._disk_path(cache.key(raw))
+    assert json.loads(open(path, "rb").read())["id"] == "INV-30001"
+
+    # un fișier străin (ex. pickle) nu se încarcă: eroare numărată, reparsare
+    with open(path, "wb") as f:
+        f.write(pickle.dumps(inv))
+    assert cache.get_or_parse(raw) == inv
+    assert cache.stats["disk_errors"] == 1 and cache.stats["misses"] == 2
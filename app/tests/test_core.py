@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+
+from app import core
+
+SAMPLE = "fixtures/sample_invoice.xml"
+HEAVY = ("pandas", "fpdf", "xlsxwriter", "pydantic", "streamlit", "starlette")
+# buget generos (CI zgomotos); local, importul parserului durează ~0.15s
+IMPORT_BUDGET_S = float(os.environ.get("NIR_IMPORT_BUDGET_S", "1.5"))
+
+PROBE = f"""
+import json, sys, time
+t0 = time.perf_counter()
+from app import core
+t1 = time.perf_counter()
+inv = core.parse({SAMPLE!r})
+print(json.dumps({{"import_s": t1 - t0, "id": inv["id"],
+                  "heavy": [m for m in {HEAVY!r} if m in sys.modules]}}))
+"""
+
+def test_core_parse_cold_start_skips_export_stack():
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, env=env, check=True)
+    probe = json.loads(out.stdout)
+    assert probe["id"] == "INV-30001"
+    assert probe["heavy"] == []
+    assert probe["import_s"] < IMPORT_BUDGET_S
+
+def test_core_exports_load_on_demand():
+    inv = core.parse(SAMPLE)
+    assert core.render("pdf", inv).startswith(b"%PDF")
+    assert core.render("xlsx", inv)[:2] == b"PK"
@@ -0,0 +1,72 @@
+import io
+import zipfile
+
+from lxml import etree
+
+from app.exporters import docx_nir
+from app.exporters.docx_nir import W_NS, DocxTemplate, default_template, generate_docx, load_template
+
+NIR = {
+    "invoice_id": "INV-1",
+    "invoice_date": "2025-11-05",
+    "supplier": {"name": "Furnizor & Fiii SRL", "cui": "RO1", "address": "Str. Ștefan cel Mare, Iași"},
+    "buyer": {"name": "Cumpărător SA", "cui": "RO2", "address": "-"},
+    "columns": {"name": ["Produs țesătură", "Cablu <3x2.5> {rolă}"], "unit": ["BUC", "M"],
+                "qty": [2.0, 100.0], "price": [10.0, 1.5], "vat_pct": [21.0, 21.0],
+                "line_net": [20.0, 150.0], "vat": [4.2, 31.5], "total": [24.2, 181.5]},
+    "totals": {"subtotal": 170.0, "vat": 35.7, "grand_total": 205.7},
+}
+
+def _body(docx: bytes):
+    return etree.fromstring(zipfile.ZipFile(io.BytesIO(docx)).read("word/document.xml"))
+
+def _rows(root):
+    return [["".join(t.text or "" for t in tc.iter(f"{{{W_NS}}}t")) for tc in tr.iter(f"{{{W_NS}}}tc")]
+            for tr in root.iter(f"{{{W_NS}}}tr")]
+
+def test_docx_fills_fields_and_line_rows_from_payload():
+    root = _body(generate_docx(NIR))
+    text = "".join(root.itertext())
+    assert "INV-1" in text and "Furnizor & Fiii SRL" in text and "205.70" in text and "{{" not in text
+    rows = _rows(root)
+    assert len(rows) == 3  # capul de tabel + 2 linii
+    assert rows[2][:4] == ["2", "Cablu <3x2.5> {rolă}", "M", "100.00"] and rows[2][-1] == "181.50"
+
+    items = {k: v for k, v in NIR.items() if k != "columns"}
+    items["items"] = [{"name": "Produs", "unit": "BUC", "qty": 2, "price": 10, "vat_pct": 21}]
+    assert _rows(_body(generate_docx(items)))[1][-1] == "24.20"
+
+def test_template_compiled_once_and_split_fields_joined(tmp_path):
+    assert load_template() is load_template()
+
+    # Word a rupt câmpul în două fragmente de text
+    xml = zipfile.ZipFile(io.BytesIO(default_template())).read("word/document.xml").decode()
+    xml = xml.replace("{{invoice_id}}", "{{invoice</w:t></w:r><w:r><w:t>_id}}")
+    path = tmp_path / "sablon.docx"
+    buf = io.BytesIO(default_template())
+    with zipfile.ZipFile(buf) as src, zipfile.ZipFile(path, "w") as dst:
+        for info in src.infolist():
+            dst.writestr(info, xml if info.filename == "word/document.xml" else src.read(info))
+    tpl = load_template(str(path))
+    assert isinstance(tpl, DocxTemplate) and load_template(str(path)) is tpl
+    assert "INV-1" in "".join(_body(tpl.render(NIR)).itertext())
+    assert docx_nir._TEMPLATES  # memorat per proces
+
+def test_split_field_join_keeps_the_other_runs():
+    w = f'xmlns:w="{W_NS}"'
+    root = etree.fromstring(
+        f'<w:body {w}><w:p>'
+        '<w:r><w:t xml:space="preserve">Factura </w:t></w:r>'
+        '<w:r><w:rPr><w:b/></w:rPr><w:t>{{inv</w:t></w:r>'
+        '<w:r><w:t>oice_id}}</w:t></w:r>'
+        '<w:r><w:rPr><w:i/></w:rPr><w:t xml:space="preserve"> din {{invoice_date}}</w:t></w:r>'
+        '</w:p></w:body>')
+    docx_nir._join_split_fields(root)
+    assert [t.text for t in root.iter(f"{{{W_NS}}}t")] == ["Factura ", "{{invoice_id}}", "", " din {{invoice_date}}"]
+
+def test_batch_docx_only(tmp_path):
+    from app.batch import main
+
+    out = tmp_path / "out"
+    assert main(["fixtures/sample_invoice.xml", "-o", str(out), "-w", "1", "-q", "--no-pdf", "--no-xlsx", "--docx"]) == 0
+    assert "INV-30001" in "".join(_body((out / "NIR_sample_invoice.docx").read_bytes()).itertext())
@@ -0,0 +1,65 @@
+import json
+import logging
+
+from app.exporters.pdf_nir import generate_pdf
+from app.metrics import METRICS, Metrics
+from app.nir import build_nir_data, to_nir_df
+from app.parsers.ubl_stream import parse_invoice_stream
+
+SAMPLE = "fixtures/sample_invoice.xml"
+
+def test_nested_spans_keep_outer_peak():
+    m = Metrics()
+    m.enable(memory=True)
+    try:
+        with m.collect() as spans:
+            with m.span("outer"):
+                with m.span("inner", lines=3):
+                    buf = bytearray(2_000_000)
+                    del buf
+                small = bytearray(1000)
+                del small
+    finally:
+        m.disable()
+    inner, outer = spans
+    assert (inner.stage, inner.lines) == ("inner", 3)
+    assert inner.peak_bytes >= 2_000_000 and outer.peak_bytes >= 2_000_000
+    assert 'nir_stage_calls_total{stage="outer"} 1' in m.prometheus_text()
+
+def test_pipeline_spans_and_json_log(caplog):
+    METRICS.reset()
+    METRICS.enable(memory=False)
+    try:
+        with caplog.at_level(logging.INFO, logger="nir.metrics"), METRICS.collect() as spans:
+            inv = parse_invoice_stream(SAMPLE)
+            df = to_nir_df(inv)
+            generate_pdf(build_nir_data(inv, df))
+    finally:
+        METRICS.disable()
+    assert [sp.stage for sp in spans] == ["parse_invoice_stream", "to_nir_df", "build_nir_data", "generate_pdf"]
+    assert {sp.lines for sp in spans} == {len(inv["lines"])}
+    logged = [json.loads(r.getMessage()) for r in caplog.records]
+    assert logged[0]["event"] == "nir.span" and logged[0]["stage"] == "parse_invoice_stream"
+
+def test_xmltodict_path_and_write_pdf_have_own_spans(tmp_path):
+    from app.exporters.pdf_nir import write_pdf
+    from app.parsers.ubl_parser import parse_invoice_xml
+
+    METRICS.reset()
+    METRICS.enable(memory=False)
+    try:
+        with METRICS.collect() as spans:
+            inv = parse_invoice_xml(open(SAMPLE, "rb").read())
+            write_pdf(str(tmp_path / "nir.pdf"), build_nir_data(inv, to_nir_df(inv)))
+    finally:
+        METRICS.disable()
+    stages = [sp.stage for sp in spans]
+    assert stages == ["parse_invoice_minimal", "parse_invoice_xml", "to_nir_df", "build_nir_data", "write_pdf"]
+    assert 'nir_stage_calls_total{stage="parse_invoice_xml"} 1' in METRICS.prometheus_text()
+
+def test_disabled_records_nothing():
+    METRICS.reset()
+    assert not METRICS.enabled
+    with METRICS.collect() as spans:
+        to_nir_df(parse_invoice_stream(SAMPLE))
+    assert spans == [] and METRICS.snapshot() == {}
@@ -0,0 +1,46 @@
+import random
+
+import numpy as np
+
+from app.nir import LineView, build_nir_data, round_half_even, to_nir_df
+
+def test_round_half_even_matches_python_round():
+    rnd = random.Random(7)
+    vals = [0.125, 0.375, 2.675, 1.005, 0.5, 2.5, -0.125, -2.675, 0.0]
+    vals += [round(rnd.uniform(0, 1000), 2) * round(rnd.uniform(0, 50), 3) for _ in range(20000)]
+    got = round_half_even(np.array(vals))
+    assert got.tolist() == [round(v, 2) for v in vals]
+
+def test_nir_columns_feed_exporters_without_rows():
+    inv = {"id": "F1", "lines": [
+        {"name": "A", "unit": "BUC", "qty": 3, "price": 1.335, "line_net": None, "vat_pct": 19},
+        {"name": "B", "unit": None, "qty": None, "price": 2, "line_net": 10.005, "vat_pct": None},
+    ], "totals": {}}
+    df = to_nir_df(inv)
+    assert df["Valoare netă"].tolist() == [round(3 * 1.335, 2), round(10.005, 2)]
+    assert df["TVA (lei)"].tolist() == [round(3 * 1.335 * 19 / 100.0, 2), 0.0]
+
+    nir = build_nir_data(inv, df)
+    assert "items" not in nir
+    assert nir["columns"]["name"] == ["A", "B"]
+    assert nir["columns"]["total"] == df["Valoare (cu TVA)"].tolist()
+    assert nir["totals"]["grand_total"] == df["Valoare (cu TVA)"].sum()
+
+def test_line_view_pages_sorts_and_searches_without_copying():
+    names = ["Șurub M8", "cablu", "Surub M6", "piuliță", "SURUB inox"]
+    inv = {"lines": [{"name": n, "unit": "BUC", "qty": 1, "price": p, "line_net": p, "vat_pct": 19}
+                     for n, p in zip(names, [5, 3, 5, 1, 2])]}
+    df = to_nir_df(inv)
+    view = LineView.from_df(df)
+
+    assert len(view) == 5 and view[1]["Denumire"] == "cablu"
+    assert view.pages(2) == 3 and view.page(2, 2)["Denumire"].tolist() == ["SURUB inox"]
+    assert view.totals()["line_net"] == df["Valoare netă"].sum()
+
+    # căutare fără diacritice/majuscule, apoi sortare stabilă descrescătoare pe vederea filtrată
+    hits = view.search("surub")
+    assert [r["Denumire"] for r in hits] == ["Șurub M8", "Surub M6", "SURUB inox"]
+    by_net = hits.sort("line_net", descending=True)
+    assert [r["Denumire"] for r in by_net] == ["Șurub M8", "Surub M6", "SURUB inox"]
+    assert [r["Denumire"] for r in view.sort("name")[:2]] == ["cablu", "piuliță"]
+    assert by_net.totals() == {"lines": 3, "line_net": 12.0, "vat": 2.28, "total": 14.28}
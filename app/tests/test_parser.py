@@ -14,3 +14,62 @@ def test_parse_invoice_minimal_sample():
     # dacă există ID, să fie format "safe" (litere/cifre și - _ / .)
     if inv["id"].strip():
         assert re.match(r"^[A-Za-z0-9][A-Za-z0-9\-\_\/\.]*$", inv["id"])
+
+def _sample_bytes() -> bytes:
+    with open("fixtures/sample_invoice.xml", "rb") as f:
+        return f.read()
+
+def test_parse_invoice_minimal_unprefixed_same_output():
+    # aceeași factură fără prefixe cac:/cbc: trebuie să dea exact același payload
+    raw = _sample_bytes()
+    bare = re.sub(rb"<(/?)(cac|cbc):", rb"<\1", raw)
+
+    inv_pref = parse_invoice_minimal(xmltodict.parse(raw))
+    inv_bare = parse_invoice_minimal(xmltodict.parse(bare))
+
+    assert inv_pref == inv_bare
+    assert [l["vat_pct"] for l in inv_pref["lines"]] == [21.0, 11.0]
+    assert inv_pref["totals"]["calc_vat_from_lines"] == 160.0
+
+def test_field_plan_matches_get_semantics():
+    from app.parsers.field_plan import STYLE_MIXED, ExtractionPlan, Field
+    from app.parsers.ubl_parser import _get
+
+    doc = {
+        "a": [{"b": {"#text": "1", "@u": "KG"}}, {"b": "x"}],
+        "c": "scalar",
+        "d": [],
+    }
+    paths = ["a.b.#text", "a.b.@u", "a.b", "c.x", "d.x", "missing.x", "a"]
+    plan = ExtractionPlan([Field(p, p) for p in paths]).bind(STYLE_MIXED)
+    assert plan.values(doc) == [_get(doc, p) for p in paths]
+
+    # fallback-urile rulează doar pe valori „falsy”; `each` convertește fiecare candidat
+    fb = ExtractionPlan([
+        Field("first", "missing.x", "d", "c"),
+        Field("text", "a.b.@u", "a.b.#text", each=lambda v: (v or "").lower()),
+        Field("conv", "c.x", "a.b.#text", each=lambda v: v and int(v)),
+    ]).bind(STYLE_MIXED)
+    assert fb.extract(doc) == {"first": "scalar", "text": "kg", "conv": 1}
+
+def test_lines_are_a_column_block_with_a_plain_view():
+    import json
+    import pickle
+    from app.models.lines import plain_payload
+    from app.models.schemas import LineBlock
+    from app.rules import validate_invoice
+
+    inv = parse_invoice_minimal(xmltodict.parse(_sample_bytes()))
+    lines = inv["lines"]
+    assert isinstance(lines, LineBlock) and len(lines) == 2
+    assert lines[0] == {k: lines.column(k)[0] for k in LineBlock.FIELDS}
+    assert lines == [dict(l) for l in lines]            # interfața de listă de dict-uri
+    assert pickle.loads(pickle.dumps(lines)) == lines   # IPC (pool-uri de procese)
+
+    plain = plain_payload(inv)
+    assert plain["lines"] == list(lines) and type(plain["lines"]) is list and inv["lines"] is lines
+    assert json.loads(json.dumps(plain))["lines"][1]["qty"] == lines[1]["qty"]
+
+    bad = dict(inv, lines=LineBlock.from_rows(list(lines)))
+    bad["lines"].qty[1] = float("nan")
+    assert [v["lines"] for v in validate_invoice(bad) if v["rule"] == "NIR-01"] == [[1]]
@@ -0,0 +1,95 @@
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from app.exporters import pdf_nir
+from app.exporters.pdf_nir import NirRenderer, generate_pdf
+
+NIR = {
+    "invoice_id": "INV-1",
+    "invoice_date": "2025-11-05",
+    "supplier": {"name": "Furnizor SRL", "cui": "RO1", "address": "Str. Ștefan cel Mare, Iași"},
+    "buyer": {"name": "Cumpărător SA", "cui": "RO2", "address": "-"},
+    "items": [{"name": "Produs țesătură", "unit": "BUC", "qty": 2, "price": 10, "vat_pct": 21}] * 5,
+    "totals": {},
+}
+
+def _stable(pdf: bytes) -> bytes:
+    # /CreationDate și /ID depind de momentul generării
+    return re.sub(rb"/CreationDate \(.*?\)|/ID \[<.*?>\]", b"", pdf)
+
+def test_documents_rendered_across_threads_are_identical():
+    first = generate_pdf(NIR)
+    assert first.startswith(b"%PDF")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        outs = list(pool.map(lambda _: generate_pdf(NIR), range(8)))
+
+    assert {_stable(o) for o in outs} == {_stable(first)}
+
+def test_renderer_fonts_are_per_document():
+    r = NirRenderer()
+    a, b = r.new_pdf(), r.new_pdf()
+    fa, fb = a.fonts["dejavu"], b.fonts["dejavu"]
+    assert fa.subset is not fb.subset and fa.ttfont is not fb.ttfont
+    assert list(a.fonts) == ["dejavu", "dejavuB"]
+
+def test_fast_wrap_matches_string_width_wrap():
+    from app.exporters.text_wrap import _wrap_measured, wrap_text_to_width
+    pdf = NirRenderer().new_pdf()
+    pdf.set_font(pdf_nir.FAMILY, "", pdf_nir.TABLE_FONT_SIZE)
+    texts = [
+        "",
+        "Cablu/cupru (3x2.5mm), rolă-100m",
+        "Ș" * 400,  # token mai lung decât coloana -> rupt pe caractere
+        " ".join(f"Articol{i}-ȚĂ/(x{i})" for i in range(40)),
+    ]
+    for width in (0.0, 4.0, 22.8, pdf_nir.COL_WIDTHS[0] - 2 * pdf_nir.PAD_X):
+        for t in texts:
+            assert wrap_text_to_width(pdf, t, width) == _wrap_measured(pdf, t, width)
+
+def _pages(pdf: bytes) -> int:
+    return len(re.findall(rb"/Type /Page\b(?!s)", pdf))
+
+def test_layout_plan_drives_pagination_and_page_ranges():
+    long_nir = dict(NIR, items=[{"name": "Produs " + "descriere lungă " * 40, "unit": "BUC",
+                                 "qty": 1, "price": 10, "vat_pct": 21}] * 60)
+    r = NirRenderer()
+    layout = r.plan(long_nir)
+    assert layout.page_count > 2
+    assert [p.number for p in layout.pages] == list(range(1, layout.page_count + 1))
+    assert layout.pages[-1].totals_y is not None
+    assert all(p.repeat_header for p in layout.pages[1:] if p.row_count)
+
+    assert _pages(r.render(long_nir, layout=layout)) == layout.page_count
+    assert _pages(r.render(long_nir, pages=[1])) == 1
+    assert r.page_count(NIR) == 1
+
+def test_write_pdf_streams_same_document_as_bytes():
+    long_nir = dict(NIR, items=NIR["items"] * 40)  # mai multe pagini
+    buf = io.BytesIO()
+    pdf_nir.write_pdf(buf, long_nir)
+    expected = generate_pdf(long_nir)
+    assert _pages(expected) > 1 and _stable(buf.getvalue()) == _stable(expected)
+    with pdf_nir.spooled_pdf(long_nir, max_memory=1024) as f:
+        assert f.tell() == 0 and _stable(f.read()) == _stable(expected)
+
+def test_book_merges_chunks_with_one_bookmark_per_invoice():
+    from pypdf import PdfReader
+    from app.exporters.pdf_book import chunk_bounds, merge_pdfs
+
+    r = NirRenderer()
+    payloads = [dict(NIR, invoice_id=f"INV-{i}", items=NIR["items"] * (1 + 10 * i)) for i in range(4)]
+    whole = PdfReader(io.BytesIO(r.render_book(payloads)))
+    merged = PdfReader(io.BytesIO(
+        merge_pdfs([r.render_book(payloads[:1]), r.render_book(payloads[1:3]), r.render_book(payloads[3:])])))
+
+    assert len(merged.pages) == len(whole.pages) == sum(r.page_count(p) for p in payloads)
+    titles = [f"INV-{i} — Furnizor SRL" for i in range(4)]
+    assert [o.title for o in merged.outline] == [o.title for o in whole.outline] == titles
+    # fiecare semn de carte duce la prima pagină a facturii lui
+    starts = [sum(r.page_count(p) for p in payloads[:i]) for i in range(4)]
+    assert [merged.get_destination_page_number(o) for o in merged.outline] == starts
+    assert "INV-3" in merged.pages[starts[3]].extract_text()
+    assert chunk_bounds(1500, 4)[-1] == (1313, 1500) and len(chunk_bounds(1500, 4)) == 8
+    assert chunk_bounds(30, 4) == [(0, 30)]  # prea puține pentru a merita împărțite
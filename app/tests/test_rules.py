@@ -0,0 +1,40 @@
+from app.models.schemas import LineBlock
+from app.parsers.ubl_stream import parse_invoice_stream
+from app.rules import STRICT_RULESET, validate_batch, validate_invoice
+from benchmarks.synth import generate_invoice
+
+def _invoice(lines, subtotals, net, vat):
+    return {
+        "id": "F-1", "issue_date": "2025-10-31", "currency": "RON",
+        "supplier": {"name": "Furnizor SRL", "cui": "RO1", "address": ""},
+        "buyer":    {"name": "Client SA", "cui": "RO2", "address": ""},
+        "totals": {"net": net, "vat": vat, "gross": net + vat, "payable": net + vat,
+                   "calc_net_from_lines": net, "calc_vat_from_lines": vat, "tax_subtotals": subtotals},
+        "lines": LineBlock.from_rows(lines),
+    }
+
+def test_consistent_invoices_have_no_findings_in_both_prefix_styles():
+    pref = parse_invoice_stream(generate_invoice(200))
+    bare = parse_invoice_stream(generate_invoice(200, prefixed=False))
+    assert pref["validations"] == [] and pref == bare
+
+def test_rules_report_ids_and_line_indices():
+    good = {"name": "Produs", "qty": 2, "unit": "BUC", "price": 10.0, "line_net": 20.0, "vat_pct": 21.0}
+    lines = [good, dict(good, name="-"), dict(good, price=-10.0, line_net=-20.0), dict(good, vat_pct=9.0)]
+    bad = _invoice(lines, [{"rate": 21.0, "taxable": 40.0, "tax": 4.2}], net=20.0, vat=4.2)
+    ok = _invoice([good], [{"rate": 21.0, "taxable": 20.0, "tax": 4.2}], net=20.0, vat=4.2)
+
+    found = {v["rule"]: v for v in validate_invoice(bad)}
+    assert found["BR-25"]["lines"] == [1]
+    assert found["BR-27"]["lines"] == [2] and "linia 3" in found["BR-27"]["msg"]
+    assert found["BR-S-08"]["rate"] == 21.0   # baza din linii 20 ≠ 40 din defalcare
+    assert found["BR-CO-17"]["rate"] == 21.0  # 4.20 ≠ 40 × 21%
+    assert found["NIR-10"]["rate"] == 9.0     # cota 9% lipsește din defalcare
+    assert validate_batch([ok, bad, ok]) == [[], validate_invoice(bad), []]
+
+def test_sample_fixture_validates_clean_and_completeness_rules_are_opt_in():
+    inv = parse_invoice_stream("fixtures/sample_invoice.xml")
+    assert inv["validations"] == []
+    # fixture-ul nu are părți și nici defalcare TVA: doar setul strict le cere
+    assert [v["rule"] for v in validate_invoice(inv, STRICT_RULESET)] == ["BR-06", "BR-CO-26", "BR-07", "NIR-05",
+                                                                          "BR-CO-18"]
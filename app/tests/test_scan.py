@@ -0,0 +1,38 @@
+import csv
+import zipfile
+
+from benchmarks.synth import generate_invoice
+
+from app.parsers.header_scan import scan_header
+from app.parsers.ubl_stream import parse_invoice_stream
+from app.scan import main
+
+SAMPLE = "fixtures/sample_invoice.xml"
+
+def test_header_matches_full_parse():
+    # fixture: liniile înaintea totalurilor; sintetic: ordinea UBL (oprire la prima linie)
+    for raw in (open(SAMPLE, "rb").read(), generate_invoice(300)):
+        full = parse_invoice_stream(raw)
+        head = scan_header(raw)
+        assert head["id"] == full["id"] and head["issue_date"] == full["issue_date"]
+        assert head["supplier_cui"] == full["supplier"]["cui"]
+        assert {k: head[k] for k in ("net", "vat", "gross", "payable")} == \
+            {k: full["totals"][k] for k in ("net", "vat", "gross", "payable")}
+
+def test_scan_directory_index(tmp_path):
+    src = tmp_path / "in"
+    src.mkdir()
+    (src / "b.xml").write_bytes(open(SAMPLE, "rb").read())
+    (src / "stricat.xml").write_text("<Invoice>")
+    with zipfile.ZipFile(src / "spv.zip", "w") as zf:
+        zf.write(SAMPLE, "30001.xml")               # același furnizor + număr -> duplicat
+        zf.writestr("semnatura_30001.xml", "<x/>")
+    (src / "a.xml").write_bytes(generate_invoice(50, invoice_id="SYN-A"))
+    out = tmp_path / "index.csv"
+
+    assert main([str(src), "-o", str(out), "-w", "2", "--mmap", "--sort", "source"]) == 1
+    rows = list(csv.DictReader(out.open(encoding="utf-8")))
+    assert [r["source"] for r in rows] == ["a.xml", "b.xml", "spv.zip/30001.xml", "stricat.xml"]
+    assert rows[0]["id"] == "SYN-A" and rows[1]["id"] == "INV-30001"
+    assert rows[2]["duplicate_of"] == "b.xml"
+    assert rows[3]["error"] and not rows[3]["id"]
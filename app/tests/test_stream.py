@@ -0,0 +1,89 @@
+import io
+import re
+
+import pytest
+import xmltodict
+from app.parsers.ubl_parser import parse_invoice_minimal
+from app.parsers.ubl_stream import parse_invoice_stream
+
+SAMPLE = "fixtures/sample_invoice.xml"
+
+def test_stream_matches_xmltodict_parser():
+    with open(SAMPLE, "rb") as f:
+        raw = f.read()
+    expected = parse_invoice_minimal(xmltodict.parse(raw))
+
+    assert parse_invoice_stream(SAMPLE) == expected
+    assert parse_invoice_stream(raw) == expected
+    with open(SAMPLE, "rb") as f:
+        assert parse_invoice_stream(f) == expected
+
+def test_stream_unprefixed_and_comments():
+    with open(SAMPLE, "rb") as f:
+        raw = f.read()
+    bare = re.sub(rb"<(/?)(cac|cbc):", rb"<\1", raw)
+    bare = bare.replace(b"<ID>INV-30001</ID>", b"<ID>INV-<!-- x -->30001</ID>")
+
+    assert parse_invoice_stream(bare) == parse_invoice_minimal(xmltodict.parse(bare))
+    assert parse_invoice_stream(bare)["id"] == "INV-30001"
+
+def test_stream_skips_attachment_payload_and_extracts_on_demand(tmp_path):
+    import base64
+    from app.parsers.attachments import AttachmentFilter, extract_attachment
+
+    pdf = bytes(range(256)) * 40 + b"%%EOF"
+    b64 = base64.encodebytes(pdf)  # rânduri de 76 de caractere, ca în SPV
+    with open(SAMPLE, "rb") as f:
+        raw = f.read()
+    ref = (b'<cac:AdditionalDocumentReference><cbc:ID>F1</cbc:ID><cac:Attachment>'
+           b'<cbc:EmbeddedDocumentBinaryObject mimeCode="application/pdf" filename="f1.pdf">' + b64 +
+           b'</cbc:EmbeddedDocumentBinaryObject></cac:Attachment></cac:AdditionalDocumentReference>')
+    raw = raw.replace(b"</cbc:DocumentCurrencyCode>", b"</cbc:DocumentCurrencyCode>" + ref, 1)
+
+    inv = parse_invoice_stream(raw)
+    assert inv["attachments"] == [{"index": 0, "id": "F1", "description": "", "filename": "f1.pdf",
+                                   "mime": "application/pdf", "size": len(pdf)}]
+    assert inv == parse_invoice_minimal(xmltodict.parse(raw))
+
+    # bucăți mici: tag-ul de deschidere și base64-ul tăiate oriunde
+    for chunk in (1, 7):
+        filt = AttachmentFilter(io.BytesIO(raw), chunk_size=chunk)
+        assert filt.read() == raw.replace(b64, b"") and filt.sizes == [len(pdf)]
+
+    assert extract_attachment(raw, 0, tmp_path / "f1.pdf", chunk_size=100) == len(pdf)
+    assert (tmp_path / "f1.pdf").read_bytes() == pdf
+    with pytest.raises(IndexError):
+        extract_attachment(raw, 1, tmp_path / "lipsa.pdf")
+    assert not (tmp_path / "lipsa.pdf").exists()
+
+def test_attachment_char_refs_cdata_and_comments(tmp_path):
+    import base64
+    from app.parsers.attachments import AttachmentFilter, extract_attachment
+
+    pdf = bytes(range(256)) * 11 + b"%%EOF"
+    b64 = base64.encodebytes(pdf)
+    with open(SAMPLE, "rb") as f:
+        raw = f.read()
+
+    def ref(text: bytes) -> bytes:
+        return (b'<cac:AdditionalDocumentReference><cbc:ID>F</cbc:ID><cac:Attachment>'
+                b'<cbc:EmbeddedDocumentBinaryObject mimeCode="application/pdf" filename="a>b.pdf">' + text +
+                b'</cbc:EmbeddedDocumentBinaryObject></cac:Attachment></cac:AdditionalDocumentReference>')
+
+    half = len(b64) // 2
+    refs = (ref(b64.replace(b"\n", b"&#13;\n"))                                  # CR ca referință
+            + ref(b64.replace(b"\n", b"&#xD;"))
+            + ref(b"<![CDATA[" + b64[:half] + b"]]><!-- x -->" + b64[half:]))
+    comment = b"<!-- <cbc:EmbeddedDocumentBinaryObject>nu e atasament --><![CDATA[<x>]]>"
+    raw = raw.replace(b"</cbc:DocumentCurrencyCode>", b"</cbc:DocumentCurrencyCode>" + comment + refs, 1)
+
+    inv = parse_invoice_stream(raw)
+    assert [a["size"] for a in inv["attachments"]] == [len(pdf)] * 3
+    assert inv["attachments"][0]["filename"] == "a>b.pdf"
+    assert inv == parse_invoice_minimal(xmltodict.parse(raw))
+    for chunk in (1, 5, 64):
+        filt = AttachmentFilter(io.BytesIO(raw), chunk_size=chunk)
+        assert b"nu e atasament" in filt.read() and filt.sizes == [len(pdf)] * 3
+        for i in range(3):
+            out = io.BytesIO()
+            assert extract_attachment(raw, i, out, chunk_size=chunk) == len(pdf) and out.getvalue() == pdf
@@ -0,0 +1,25 @@
+import io
+import re
+import zipfile
+
+import pandas as pd
+
+from app.exporters.xlsx_nir import generate_xlsx, rows_from_df, write_xlsx
+from app.nir import NIR_COLUMNS
+
+NIR_META = {"invoice_id": "INV-1", "invoice_date": "2025-11-05", "currency": "RON"}
+
+def _sheet(xlsx) -> str:
+    with zipfile.ZipFile(xlsx) as z:
+        return z.read("xl/worksheets/sheet1.xml").decode("utf-8")
+
+def test_xlsx_streams_rows_once_to_file(tmp_path):
+    df = pd.DataFrame([(f"Produs {i}", "BUC", 2.0, 10.0, 20.0, 21.0, 4.2, 24.2) for i in range(500)],
+                      columns=NIR_COLUMNS)
+    path = tmp_path / "nir.xlsx"
+    write_xlsx(path, rows_from_df(df), NIR_META)
+
+    xml = _sheet(path)
+    assert len(re.findall(r"<row ", xml)) == 4 + 1 + 500   # meta + cap de tabel + corp
+    assert "Produs 499" in xml and "INV-1" in xml
+    assert _sheet(io.BytesIO(generate_xlsx(df, NIR_META))).count("<row ") == 505
@@ -1,13 +1,11 @@
 # app/ui/streamlit_app.py
 from __future__ import annotations
 
-import io
-import re
-from typing import Any, Dict, List
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
 
-import pandas as pd
 import streamlit as st
-import xmltodict
 # --- import path fix (Cloud safe) ---
 import os, sys
 _CURR = os.path.dirname(os.path.abspath(__file__))      # .../app/ui
@@ -17,51 +15,18 @@ if _REPO_ROOT not in sys.path:
 # ------------------------------------
 
 
-# parser + exportere
-from app.parsers.ubl_parser import parse_invoice_minimal
-from app.exporters.pdf_nir import generate_pdf
+# parser + exportere (fpdf/xlsxwriter/șablonul DOCX se încarcă la primul export cerut, prin app.core)
+from app import core
+from app.archive import default_archive
+from app.batch import available_workers, jobs_from_uploads, run_batch, zip_outputs
+from app.parsers.cache import default_cache
+from app.metrics import METRICS, collect
+from app.nir import NIR_FIELDS, LineView, filename_safe_id, s
 
-
-# =============== helpers UI/format ===============
-def s(x: Any) -> str:
-    """safe string for UI"""
-    return str(x or "").strip()
-
-def filename_safe_id(raw_id: str) -> str:
-    """ID sigur pentru nume de fișier (nu afectează afișarea)."""
-    cleaned = re.sub(r"[^\w\-.]+", "_", s(raw_id))
-    cleaned = cleaned.strip("_")
-    return cleaned or "invoice"
-
-def to_nir_df(inv: Dict[str, Any]) -> pd.DataFrame:
-    """Construiește DataFrame-ul NIR din payload-ul parserului (fără invenții)."""
-    rows = []
-    for ln in inv.get("lines", []):
-        qty      = float(ln.get("qty") or 0)
-        price    = float(ln.get("price") or 0)
-        line_net = float(ln.get("line_net") or (qty * price))
-        vat_pct  = float(ln.get("vat_pct") or 0)
-
-        vat_lei   = round(line_net * vat_pct / 100.0, 2)
-        total_lei = round(line_net + vat_lei, 2)
-
-        rows.append({
-            "Denumire": s(ln.get("name")),
-            "UM":       s(ln.get("unit")),
-            "Cant.":    round(qty, 2),
-            "Preț unitar": round(price, 2),
-            "Valoare netă": round(line_net, 2),
-            "TVA %":    round(vat_pct, 2),
-            "TVA (lei)": vat_lei,
-            "Valoare (cu TVA)": total_lei,
-        })
-    df = pd.DataFrame(rows, columns=[
-        "Denumire", "UM", "Cant.", "Preț unitar", "Valoare netă",
-        "TVA %", "TVA (lei)", "Valoare (cu TVA)"
-    ])
-    return df
+PAGE_SIZE = int(os.environ.get("NIR_UI_PAGE_SIZE", "500") or 500)  # rânduri NIR trimise browserului o dată
 
 
+# =============== helpers UI/format ===============
 def render_totals(inv: Dict[str, Any]):
     t = inv.get("totals", {}) or {}
     col1, col2, col3, col4 = st.columns([1,1,1,1])
@@ -79,81 +44,290 @@ def render_totals(inv: Dict[str, Any]):
         )
 
 
-def export_xlsx(df: pd.DataFrame, nir_data: Dict[str, Any], invoice_id_file: str):
-    """Generează și oferă la descărcare Excel-ul (XLSX)."""
-    excel_buffer = io.BytesIO()
-
-    with pd.ExcelWriter(excel_buffer, engine="xlsxwriter") as writer:
-        ws_name = "NIR"
-        start_row = 6
-
-        df.to_excel(writer, index=False, sheet_name=ws_name, startrow=start_row)
-        wb = writer.book
-        ws = writer.sheets[ws_name]
-
-        # formate
-        fmt_title = wb.add_format({"bold": True, "font_size": 14})
-        fmt_lbl   = wb.add_format({"bold": True})
-        fmt_head  = wb.add_format({"bold": True, "bg_color": "#EEEEEE", "border": 1})
-        fmt_cell  = wb.add_format({"border": 1})
-        fmt_num   = wb.add_format({"num_format": "#,##0.00", "border": 1})
-        fmt_pct   = wb.add_format({"num_format": "0.00", "border": 1})
-
-        # meta sus
-        ws.write(0, 0, "NIR generat din e-Factura", fmt_title)
-        ws.write(2, 0, "Număr factură:", fmt_lbl); ws.write(2, 1, s(nir_data.get("invoice_id")))
-        ws.write(3, 0, "Dată factură:",  fmt_lbl); ws.write(3, 1, s(nir_data.get("invoice_date")))
-        ws.write(4, 0, "Monedă:",        fmt_lbl); ws.write(4, 1, s(inv_payload.get("currency")))
-
-        # reformatăm header-ul
-        for c, col in enumerate(df.columns):
-            ws.write(start_row, c, col, fmt_head)
-
-        # lățimi coloane
-        ws.set_column(0, 0, 60, fmt_cell)  # Denumire
-        ws.set_column(1, 1, 8,  fmt_cell)  # UM
-        ws.set_column(2, 2, 12, fmt_num)   # Cant.
-        ws.set_column(3, 3, 14, fmt_num)   # Preț unitar
-        ws.set_column(4, 4, 14, fmt_num)   # Valoare netă
-        ws.set_column(5, 5, 8,  fmt_pct)   # TVA %
-        ws.set_column(6, 7, 14, fmt_num)   # TVA (lei), Valoare (cu TVA)
-
-        # borduri pe corp (opțional)
-        nrows, ncols = df.shape
-        for r in range(start_row + 1, start_row + nrows + 1):
-            for c in range(ncols):
-                v = df.iloc[r - (start_row + 1), c]
-                ws.write(r, c, v, fmt_num if isinstance(v, (int, float, float)) else fmt_cell)
-
-        ws.freeze_panes(start_row + 1, 0)
-
-    excel_buffer.seek(0)
+# =============== memoizare per fișier încărcat ===============
+def session_bundle(uploaded) -> Dict[str, Any]:
+    """
+    Parse + tabel NIR + payload export, memorate în session_state după `file_id`.
+    Rerun-urile (orice click) refolosesc rezultatele; exporturile se construiesc
+    abia la descărcare, pe disc, în directorul temporar al bundle-ului (`exports`
+    ține doar căile; directorul dispare odată cu bundle-ul).
+    """
+    bundle = st.session_state.get("nir_bundle")
+    if bundle is None or bundle["file_id"] != uploaded.file_id:
+        with collect() as spans:
+            raw = uploaded.getvalue()
+            inv = default_cache().get_or_parse(raw)
+            df, nir_data = core.nir_table(inv)
+        archive = default_archive()
+        if archive is not None:  # NIR_ARCHIVE_DB setat: păstrăm factura pentru căutări ulterioare
+            archive.add(inv, raw, uploaded.name)
+        bundle = {
+            "file_id":  uploaded.file_id,
+            "inv":      inv,
+            "df":       df,
+            "view":     LineView.from_df(df),
+            "nir_data": nir_data,
+            "exports":  {},
+            "tmp":      tempfile.TemporaryDirectory(prefix="nir_ui_"),
+            "errors":   {},
+            "spans":    list(spans),
+        }
+        st.session_state["nir_bundle"] = bundle
+    return bundle
+
+
+def lazy_export(bundle: Dict[str, Any], kind: str, build: Callable[[str], Any]) -> Callable[[], bytes]:
+    """
+    Callable pentru `download_button(data=...)` (Streamlit >= 1.52): `build(cale)` scrie exportul pe disc o
+    singură dată, la primul click; fiecare descărcare recitește octeții de pe disc
+    (Streamlit îi copiază oricum în media store-ul lui), deci sesiunea nu ține exportul.
+    """
+    def make() -> bytes:
+        path = bundle["exports"].get(kind)
+        if path is None:
+            try:
+                target = os.path.join(bundle["tmp"].name, f"export.{kind}")
+                with collect() as spans:
+                    build(target)
+                bundle["exports"][kind] = path = target
+                bundle["spans"].extend(spans)
+            except Exception as e:
+                # rulează pe alt thread decât scriptul: eroarea se afișează la următorul rerun
+                bundle["errors"][kind] = str(e)
+                raise
+        with open(path, "rb") as f:
+            return f.read()
+    return make
+
+
+SORT_KEYS = {"Ordinea din factură": None, **{title: key for key, title in NIR_FIELDS.items()}}
+
+
+@st.fragment
+def render_lines(bundle: Dict[str, Any]):
+    """
+    Tabelul NIR pe pagini: căutarea, sortarea și paginarea rulează pe server, peste
+    `LineView`; browserul primește doar rândurile paginii curente.
+    """
+    view: LineView = bundle["view"]
+    col_q, col_sort, col_dir = st.columns([2, 1, 1])
+    query = col_q.text_input("Caută în denumire", key="nir_q", placeholder="ex. surub, cablu")
+    sort_title = col_sort.selectbox("Sortare", list(SORT_KEYS), key="nir_sort")
+    descending = col_dir.toggle("Descrescător", key="nir_desc", disabled=SORT_KEYS[sort_title] is None)
+
+    if SORT_KEYS[sort_title] is not None:
+        view = view.sort(SORT_KEYS[sort_title], descending)
+    view = view.search(query)
+
+    pages = view.pages(PAGE_SIZE)
+    # pagina revine la 1 când se schimbă filtrul/sortarea
+    state = (query, sort_title, descending)
+    if st.session_state.get("nir_page_state") != state:
+        st.session_state["nir_page_state"] = state
+        st.session_state["nir_page"] = 1
+    st.session_state["nir_page"] = min(st.session_state.get("nir_page", 1), pages)
+
+    st.dataframe(view.page(st.session_state["nir_page"] - 1, PAGE_SIZE), use_container_width=True, hide_index=True)
+
+    col_page, col_info = st.columns([1, 3])
+    page = col_page.number_input(f"Pagina (din {pages})", min_value=1, max_value=pages, step=1, key="nir_page")
+    t = view.totals()
+    first = (page - 1) * PAGE_SIZE
+    shown = f"{first + 1 if len(view) else 0}–{min(first + PAGE_SIZE, len(view))} din {len(view)}"
+    if len(view) != view.total_lines:
+        shown += f" (filtrate din {view.total_lines})"
+    col_info.caption(f"Rândurile {shown} · Net {t['line_net']:,.2f} · TVA {t['vat']:,.2f} · Total {t['total']:,.2f}")
+
+
+@st.fragment
+def render_downloads(bundle: Dict[str, Any], invoice_id_file: str):
+    """Butoanele de export, izolate: un click nu redesenează restul paginii."""
+    col_pdf, col_xlsx, col_docx = st.columns([1,1,1])
+    with col_pdf:
+        if "pdf" in bundle["errors"]:
+            st.error(f"Eroare PDF: {bundle['errors']['pdf']}")
+        st.download_button(
+            "Descarcă NIR (PDF)",
+            data=lazy_export(bundle, "pdf", lambda path: core.save_pdf(path, bundle["nir_data"])),
+            file_name=f"NIR_{invoice_id_file}.pdf",
+            mime="application/pdf",
+            key="dl_pdf",
+            on_click="ignore",
+        )
+
+    with col_xlsx:
+        if "xlsx" in bundle["errors"]:
+            st.error(f"Eroare Excel: {bundle['errors']['xlsx']}")
+        st.download_button(
+            "Descarcă NIR (Excel)",
+            data=lazy_export(bundle, "xlsx", lambda path: core.save_xlsx(path, bundle["df"], bundle["nir_data"])),
+            file_name=f"NIR_{invoice_id_file}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            key="dl_xlsx",
+            on_click="ignore",
+        )
+
+    with col_docx:
+        if "docx" in bundle["errors"]:
+            st.error(f"Eroare Word: {bundle['errors']['docx']}")
+        st.download_button(
+            "Descarcă NIR (Word)",
+            data=lazy_export(bundle, "docx", lambda path: core.save_docx(path, bundle["nir_data"])),
+            file_name=f"NIR_{invoice_id_file}.docx",
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            key="dl_docx",
+            on_click="ignore",
+        )
+
+
+def render_attachments(bundle: Dict[str, Any], uploaded) -> None:
+    """PDF-urile încorporate în factură: parserul le știe doar numele și dimensiunea; se decodează la click."""
+    atts = bundle["inv"].get("attachments") or []
+    if not atts:
+        return
+    with st.expander(f"Atașamente ({len(atts)})"):
+        for att in atts:
+            i = att["index"]
+            name = os.path.basename(att.get("filename") or att.get("id") or "") or f"atasament_{i + 1}"
+            kind = f"att{i}"
+            if kind in bundle["errors"]:
+                st.error(f"Eroare atașament: {bundle['errors'][kind]}")
+            st.download_button(
+                f"{name} ({att.get('mime') or '-'}, {att['size'] / 1024:,.0f} KB)",
+                data=lazy_export(bundle, kind, lambda path, i=i: core.save_attachment(uploaded, i, path)),
+                file_name=name,
+                mime=att.get("mime") or "application/octet-stream",
+                key=f"dl_att_{i}",
+                on_click="ignore",
+            )
+
+
+# =============== lot: mai multe XML-uri / ZIP ===============
+def ui_workers() -> int:
+    """Procesele pentru lot: nucleele disponibile, plafonate de NIR_UI_WORKERS (serverul e partajat)."""
+    cap = int(os.environ.get("NIR_UI_WORKERS", "0") or 0)
+    return min(available_workers(), cap) if cap > 0 else available_workers()
+
+
+def batch_bundle(files: List[Any]) -> Dict[str, Any]:
+    """
+    Parse + PDF/XLSX pentru toate fișierele, în pool de procese, cu bară de progres.
+    Rezultatul (tabel sumar + ZIP) e memorat după setul de `file_id`-uri.
+    """
+    key = tuple(f.file_id for f in files)
+    bundle = st.session_state.get("nir_batch")
+    if bundle is not None and bundle["key"] == key:
+        return bundle
+
+    jobs = jobs_from_uploads(((f.name, f.getvalue()) for f in files),
+                             archive=os.environ.get("NIR_ARCHIVE_DB") or None)
+    if not jobs:
+        raise ValueError("Niciun fișier XML în încărcare.")
+    workers = max(1, min(ui_workers(), len(jobs)))
+    bar = st.progress(0.0, text=f"Procesez {len(jobs)} facturi cu {workers} procese…")
+    done = 0
+
+    def progress(entry: Dict[str, Any]) -> None:
+        nonlocal done
+        done += 1
+        bar.progress(done / len(jobs), text=f"{done}/{len(jobs)} — {entry['source']}")
+
+    t0 = time.perf_counter()
+    entries = run_batch(jobs, workers=workers, progress=progress)
+    wall = time.perf_counter() - t0
+    bar.empty()
+
+    bundle = {
+        "key":     key,
+        "entries": entries,
+        "zip":     zip_outputs(entries, workers, wall),
+        "wall_s":  wall,
+        "workers": workers,
+    }
+    for e in entries:  # exporturile sunt deja în ZIP; nu le ținem de două ori în sesiune
+        e.pop("files", None)
+    st.session_state["nir_batch"] = bundle
+    return bundle
+
+
+def summary_rows(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    rows = []
+    for e in entries:
+        t = e.get("totals") or {}
+        rows.append({
+            "Fișier":     e["source"],
+            "Număr":      s(e.get("invoice_id")),
+            "Furnizor":   s(e.get("supplier")),
+            "Linii":      e.get("lines"),
+            "Net":        t.get("net"),
+            "TVA":        t.get("vat"),
+            "Total":      t.get("gross"),
+            "Validare":   e.get("validation") or "-",
+            "Status":     "OK" if e["status"] == "ok" else f"Eroare: {e.get('error')}",
+        })
+    return rows
+
+
+def render_batch(files: List[Any]):
+    bundle = batch_bundle(files)
+    entries = bundle["entries"]
+    errors = sum(1 for e in entries if e["status"] != "ok")
+    warned = sum(1 for e in entries if e.get("validation") in ("warning", "error"))
+
+    col1, col2, col3, col4 = st.columns([1,1,1,1])
+    col1.metric("Facturi", len(entries))
+    col2.metric("Erori", errors)
+    col3.metric("Cu avertismente", warned)
+    col4.metric("Timp", f"{bundle['wall_s']:.1f}s / {bundle['workers']} proc.")
+
+    st.dataframe(summary_rows(entries), use_container_width=True, hide_index=True)
     st.download_button(
-        "Descarcă NIR (Excel)",
-        data=excel_buffer.getvalue(),
-        file_name=f"NIR_{invoice_id_file}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        key="dl_xlsx",
+        "Descarcă toate NIR-urile (ZIP)",
+        data=bundle["zip"],
+        file_name="NIR_lot.zip",
+        mime="application/zip",
+        key="dl_zip",
+        on_click="ignore",
     )
 
 
+def render_diagnostics(bundle: Dict[str, Any]):
+    """Timpii/memoria pe etape pentru fișierul curent (doar cu NIR_METRICS activ)."""
+    with st.expander("Diagnostic"):
+        spans = [sp.as_dict() for sp in bundle["spans"]]
+        if spans:
+            st.dataframe(spans, use_container_width=True, hide_index=True)
+        else:
+            st.caption("Nicio etapă măsurată încă (parsarea poate veni din cache).")
+        st.code(METRICS.prometheus_text(), language="text")
+
+
 # =============== UI ===============
 st.set_page_config(page_title="NIR e-Factura — MVP", layout="wide")
 st.title("NIR e-Factura — MVP")
 
 st.caption("Încarcă XML UBL (e-Factura) → parser → NIR → export PDF / Excel")
 
-uploaded = st.file_uploader("Încarcă fișier XML", type=["xml"])
+files = st.file_uploader("Încarcă fișiere XML sau o arhivă ZIP", type=["xml", "zip"], accept_multiple_files=True)
 
-if uploaded is None:
-    st.info("Încarcă un fișier e-Factura (UBL XML) pentru a începe.")
+if not files:
+    st.info("Încarcă unul sau mai multe fișiere e-Factura (UBL XML), ori o arhivă ZIP, pentru a începe.")
     st.stop()
 
+# mai multe fișiere sau ZIP -> procesare în lot, tabel sumar și o singură arhivă de descărcat
+if len(files) > 1 or files[0].name.lower().endswith(".zip"):
+    try:
+        render_batch(files)
+    except Exception as e:
+        st.error(f"Eroare la procesarea lotului: {e}")
+    st.stop()
+
+uploaded = files[0]
+
 try:
-    # 1) parse XML
-    xml_bytes = uploaded.read()
-    doc = xmltodict.parse(xml_bytes)
-    inv_payload = parse_invoice_minimal(doc)
+    # 1) parse XML (streaming) + tabel NIR, memorate per fișier -> rerun-urile nu recalculează
+    bundle = session_bundle(uploaded)
+    inv_payload = bundle["inv"]
 
     # 2) ID: Afișare vs. Nume fișier
     invoice_id_display = s(inv_payload.get("id")) or "N/A"
@@ -190,7 +364,7 @@ try:
         with st.expander("Validări"):
             for v in vlist:
                 lvl = s(v.get("level")).lower()
-                msg = s(v.get("msg"))
+                msg = f"[{v['rule']}] {s(v.get('msg'))}" if v.get("rule") else s(v.get("msg"))
                 if lvl == "error":
                     st.error(msg)
                 elif lvl == "warning":
@@ -198,59 +372,17 @@ try:
                 else:
                     st.info(msg)
 
-    # 5) tabel NIR
-    df_nir = to_nir_df(inv_payload)
+    # 5) tabel NIR (paginat; doar pagina curentă ajunge în browser)
     st.subheader("Tabel NIR")
-    st.dataframe(df_nir, use_container_width=True, hide_index=True)
-
-    # 6) exporturi
-    # pregătim payload-ul pentru PDF (nomenclatorul cheilor este cel așteptat de generate_pdf)
-    items_for_pdf: List[Dict[str, Any]] = []
-    for _, r in df_nir.iterrows():
-        items_for_pdf.append({
-            "name": r["Denumire"],
-            "unit": r["UM"],
-            "qty": float(r["Cant."]),
-            "price": float(r["Preț unitar"]),
-            "line_net": float(r["Valoare netă"]),
-            "vat_pct": float(r["TVA %"]),
-            "total": float(r["Valoare (cu TVA)"]),
-        })
+    render_lines(bundle)
 
-    totals_for_pdf = {
-        "subtotal": float(inv_payload.get("totals", {}).get("net") or df_nir["Valoare netă"].sum()),
-        "vat": float(inv_payload.get("totals", {}).get("vat") or df_nir["TVA (lei)"].sum()),
-        "grand_total": float(inv_payload.get("totals", {}).get("gross") or df_nir["Valoare (cu TVA)"].sum()),
-    }
-
-    nir_data = {
-        "invoice_id": invoice_id_display,   # Afișare exact cum e în XML
-        "invoice_date": s(inv_payload.get("issue_date")),
-        "supplier": inv_payload.get("supplier") or {},
-        "buyer":    inv_payload.get("buyer") or {},
-        "items":    items_for_pdf,
-        "totals":   totals_for_pdf,
-    }
+    # 6) exporturi (generate doar la click)
+    render_downloads(bundle, invoice_id_file)
+    render_attachments(bundle, uploaded)
 
-    col_pdf, col_xlsx = st.columns([1,1])
-    with col_pdf:
-        try:
-            pdf_bytes = generate_pdf(nir_data)
-            st.download_button(
-                "Descarcă NIR (PDF)",
-                data=pdf_bytes,
-                file_name=f"NIR_{invoice_id_file}.pdf",
-                mime="application/pdf",
-                key="dl_pdf",
-            )
-        except Exception as e:
-            st.error(f"Eroare PDF: {e}")
-
-    with col_xlsx:
-        try:
-            export_xlsx(df_nir, nir_data, invoice_id_file)
-        except Exception as e:
-            st.error(f"Eroare Excel: {e}")
+    # 7) diagnostic (opțional)
+    if METRICS.enabled:
+        render_diagnostics(bundle)
 
 except Exception as e:
     st.error(f"Eroare la parsare sau procesare: {e}")
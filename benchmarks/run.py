@@ -0,0 +1,222 @@
+# benchmarks/run.py
+"""
+Benchmark pe etape: parsare -> tabel NIR -> PDF -> XLSX, pe facturi sintetice.
+
+    python -m benchmarks.run                     # suita implicită, comparată cu baseline.json
+    python -m benchmarks.run --full              # + factura de 100k linii
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --only lines_1k_long --json rezultate.json
+
+Pentru fiecare etapă se raportează cel mai bun timp din `repeat` rulări, debitul
+(linii/s) și vârful de memorie alocată (tracemalloc, rulare separată). Timpii se
+compară normalizați cu un etalon CPU măsurat la fiecare rulare, ca baseline-ul să
+rămână utilizabil pe alte mașini; o încetinire peste toleranță -> cod de ieșire 1.
+"""
+from __future__ import annotations
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.exporters.pdf_nir import generate_pdf
+from app.exporters.xlsx_nir import generate_xlsx
+from app.nir import build_nir_data, to_nir_df
+from app.parsers.ubl_parser import parse_invoice_xml
+from app.parsers.ubl_stream import parse_invoice_stream
+from benchmarks.synth import generate_invoice
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+STAGES = ("parse", "parse_stream", "nir_table", "pdf", "xlsx")
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    lines: int
+    prefixed: bool = True
+    name_len: int = 40
+    vat_rates: Tuple[float, ...] = (21.0, 11.0, 9.0, 5.0, 0.0)
+    stages: Tuple[str, ...] = STAGES
+    repeat: int = 3
+    full_only: bool = False
+
+
+SCENARIOS: Tuple[Scenario, ...] = (
+    Scenario("lines_10", 10, repeat=5),
+    Scenario("lines_1k_long", 1_000, name_len=300),
+    Scenario("lines_10k_bare", 10_000, prefixed=False, name_len=80, repeat=1),
+    Scenario("lines_100k", 100_000, name_len=60, stages=("parse", "parse_stream", "nir_table", "xlsx"),
+             repeat=1, full_only=True),
+)
+
+
+# ------------------------ etape ------------------------
+def _stage_fns(raw: bytes) -> Dict[str, Callable[[Dict[str, Any]], Any]]:
+    """Funcțiile măsurate; `ctx` ține intrările pregătite (nemăsurate) ale fiecărei etape."""
+    return {
+        "parse":        lambda ctx: parse_invoice_xml(raw),
+        "parse_stream": lambda ctx: parse_invoice_stream(raw),
+        "nir_table":    lambda ctx: build_nir_data(ctx["inv"], to_nir_df(ctx["inv"])),
+        "pdf":          lambda ctx: generate_pdf(ctx["nir_data"]),
+        "xlsx":         lambda ctx: generate_xlsx(ctx["df"], ctx["nir_data"]),
+    }
+
+
+def _best_time(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _peak_mb(fn: Callable[[], Any]) -> float:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        return (tracemalloc.get_traced_memory()[1] - base) / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def calibrate() -> float:
+    """Etalon CPU (s): cod Python pur, cam cât de „interpretat” e și pipeline-ul."""
+    def work():
+        d: Dict[int, float] = {}
+        for i in range(200_000):
+            d[i % 1000] = d.get(i % 1000, 0.0) + i * 0.5
+        return sorted(str(v) for v in d.values())
+    return _best_time(work, 5)
+
+
+def run_scenario(sc: Scenario, stages: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    raw = generate_invoice(sc.lines, prefixed=sc.prefixed, name_len=sc.name_len, vat_rates=sc.vat_rates)
+    ctx: Dict[str, Any] = {"inv": parse_invoice_stream(raw)}
+    ctx["df"] = to_nir_df(ctx["inv"])
+    ctx["nir_data"] = build_nir_data(ctx["inv"], ctx["df"])
+
+    fns = _stage_fns(raw)
+    out: Dict[str, Any] = {"lines": sc.lines, "xml_mb": round(len(raw) / 1e6, 2), "stages": {}}
+    for stage in sc.stages:
+        if stages and stage not in stages:
+            continue
+        fn = fns[stage]
+        seconds = _best_time(lambda: fn(ctx), sc.repeat)
+        out["stages"][stage] = {
+            "s":           round(seconds, 4),
+            "lines_per_s": round(sc.lines / seconds, 1) if seconds > 0 else None,
+            "peak_mb":     round(_peak_mb(lambda: fn(ctx)), 2),
+        }
+    return out
+
+
+def run(scenarios: Sequence[Scenario], stages: Optional[Sequence[str]] = None,
+        progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    cal_start = calibrate()
+    results: Dict[str, Any] = {
+        "meta": {"python": platform.python_version(), "machine": platform.machine()},
+        "scenarios": {},
+    }
+    for sc in scenarios:
+        if progress:
+            progress(sc.name)
+        results["scenarios"][sc.name] = run_scenario(sc, stages)
+    # etalonul la început și la sfârșit: o mașină ocupată doar la unul din capete nu strică scala
+    results["meta"]["calibration_s"] = round(min(cal_start, calibrate()), 4)
+    return results
+
+
+# ------------------------ comparație cu baseline ------------------------
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], time_tol: float = 0.50, mem_tol: float = 0.25,
+            time_slack_s: float = 0.005, mem_slack_mb: float = 1.0) -> List[str]:
+    """
+    Regresiile față de baseline, ca mesaje. Timpul se compară după normalizarea cu
+    etalonul CPU al fiecărei rulări; memoria direct (nu depinde de viteza mașinii).
+    Marjele absolute (`*_slack`) țin zgomotul etapelor de câteva milisecunde în afara verdictului.
+    """
+    scale = results["meta"]["calibration_s"] / (baseline.get("meta", {}).get("calibration_s") or
+                                                results["meta"]["calibration_s"])
+    problems: List[str] = []
+    for name, sc in results["scenarios"].items():
+        base_sc = baseline.get("scenarios", {}).get(name)
+        if not base_sc:
+            continue
+        for stage, cur in sc["stages"].items():
+            base = base_sc.get("stages", {}).get(stage)
+            if not base:
+                continue
+            allowed_s = base["s"] * scale * (1 + time_tol) + time_slack_s
+            if cur["s"] > allowed_s:
+                problems.append(f"{name}/{stage}: {cur['s']:.3f}s > {allowed_s:.3f}s "
+                                f"(baseline {base['s']:.3f}s × etalon {scale:.2f} × {1 + time_tol:.2f} + marjă)")
+            allowed_mb = base["peak_mb"] * (1 + mem_tol) + mem_slack_mb
+            if cur["peak_mb"] > allowed_mb:
+                problems.append(f"{name}/{stage}: memorie {cur['peak_mb']:.1f} MB > {allowed_mb:.1f} MB")
+    return problems
+
+
+def _print_table(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    print(f"{'scenariu':<16} {'etapă':<13} {'timp (ms)':>10} {'linii/s':>11} {'vârf MB':>9} {'vs baseline':>12}")
+    scale = 1.0
+    if baseline:
+        scale = results["meta"]["calibration_s"] / (baseline["meta"].get("calibration_s") or results["meta"]["calibration_s"])
+    for name, sc in results["scenarios"].items():
+        for stage, cur in sc["stages"].items():
+            base = ((baseline or {}).get("scenarios", {}).get(name, {}).get("stages", {}).get(stage))
+            delta = f"{(cur['s'] / (base['s'] * scale) - 1) * 100:+.0f}%" if base and base["s"] else "-"
+            lps = f"{cur['lines_per_s']:,.0f}" if cur["lines_per_s"] else "-"
+            print(f"{name:<16} {stage:<13} {cur['s'] * 1000:>10.1f} {lps:>11} {cur['peak_mb']:>9.1f} {delta:>12}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.run", description="benchmark NIR pe etape")
+    ap.add_argument("--full", action="store_true", help="include și scenariile mari (100k linii)")
+    ap.add_argument("--only", action="append", help="rulează doar scenariul dat (repetabil)")
+    ap.add_argument("--stage", action="append", choices=STAGES, help="doar etapa dată (repetabil)")
+    ap.add_argument("--baseline", default=BASELINE_PATH, help="fișierul de baseline (implicit: benchmarks/baseline.json)")
+    ap.add_argument("--no-compare", action="store_true", help="nu compara cu baseline-ul")
+    ap.add_argument("--save-baseline", metavar="PATH", help="scrie rezultatele ca baseline nou")
+    ap.add_argument("--json", metavar="PATH", help="scrie rezultatele în JSON")
+    ap.add_argument("--time-tol", type=float, default=0.50, help="încetinire tolerată (implicit 0.50 = 50%%)")
+    ap.add_argument("--mem-tol", type=float, default=0.25, help="creștere de memorie tolerată (implicit 0.25)")
+    args = ap.parse_args(argv)
+
+    scenarios = [sc for sc in SCENARIOS
+                 if (args.only and sc.name in args.only) or (not args.only and (args.full or not sc.full_only))]
+    if not scenarios:
+        ap.error(f"niciun scenariu; disponibile: {', '.join(sc.name for sc in SCENARIOS)}")
+
+    results = run(scenarios, args.stage, progress=lambda n: print(f"... {n}", file=sys.stderr))
+
+    baseline = None
+    if not args.no_compare and os.path.isfile(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print_table(results, baseline)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if baseline:
+        problems = compare(results, baseline, args.time_tol, args.mem_tol)
+        for p in problems:
+            print(f"REGRESIE {p}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+# benchmarks/synth.py
+"""
+Generator de facturi UBL 2.1 / RO_CIUS sintetice, pentru benchmark-uri și teste de volum.
+
+    python -m benchmarks.synth 20000 -o /tmp/f20k.xml --bare --name-len 300
+
+Facturile sunt consistente (totaluri = suma liniilor, câte un TaxSubtotal pe cotă),
+deci parserul nu trebuie să emită avertismente; ordinea elementelor e cea din UBL
+(liniile după LegalMonetaryTotal).
+"""
+from __future__ import annotations
+import argparse
+import base64
+import random
+import sys
+from typing import List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+NS_INVOICE = "urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"
+NS_CAC     = "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2"
+NS_CBC     = "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2"
+
+DEFAULT_VAT_RATES = (21.0, 11.0, 9.0, 5.0, 0.0)
+UNITS = ("H87", "KGM", "MTR", "LTR", "SET", "BUC")
+WORDS = ("cablu", "țeavă", "șurub", "flanșă", "garnitură", "profil", "oțel", "inox", "PVC",
+         "Ø20mm", "(set)", "3x2.5", "alb/negru", "ambalaj-carton", "rolă", "galvanizat")
+
+
+def _name(r: random.Random, i: int, name_len: int) -> str:
+    words: List[str] = [f"Produs {i}"]
+    size = len(words[0])
+    target = r.randint(max(1, name_len // 2), max(1, name_len))
+    while size < target:
+        w = r.choice(WORDS)
+        words.append(w)
+        size += len(w) + 1
+    return " ".join(words)[:max(name_len, 10)]
+
+
+def generate_invoice(lines: int, prefixed: bool = True, name_len: int = 40,
+                     vat_rates: Sequence[float] = DEFAULT_VAT_RATES, seed: int = 1,
+                     invoice_id: Optional[str] = None, attachment_kb: int = 0) -> bytes:
+    """
+    Factura ca bytes UTF-8.
+      lines      — numărul de `InvoiceLine` (0..N)
+      prefixed   — `cac:`/`cbc:` (ca în SPV) sau fără prefixe (namespace implicit)
+      name_len   — lungimea maximă a denumirilor (unele linii au ~jumătate)
+      vat_rates  — cotele folosite, alese aleator pe linie
+      attachment_kb — un PDF încorporat (base64, rânduri de 76) de atâția KiB; 0 = fără
+    """
+    r = random.Random(seed)
+
+    def cac(t: str) -> str:
+        return f"cac:{t}" if prefixed else t
+
+    def cbc(t: str) -> str:
+        return f"cbc:{t}" if prefixed else t
+
+    def el(tag: str, text, attrs: str = "") -> str:
+        return f"<{tag}{attrs}>{text}</{tag}>"
+
+    def party(role: str, name: str, cui: str, city: str) -> str:
+        return (
+            f"<{cac(role)}><{cac('Party')}>"
+            f"<{cac('PostalAddress')}>{el(cbc('StreetName'), 'Str. Zorilor nr. 12')}"
+            f"{el(cbc('CityName'), city)}{el(cbc('CountrySubentity'), 'RO-CJ')}"
+            f"<{cac('Country')}>{el(cbc('IdentificationCode'), 'RO')}</{cac('Country')}></{cac('PostalAddress')}>"
+            f"<{cac('PartyTaxScheme')}>{el(cbc('CompanyID'), cui)}"
+            f"<{cac('TaxScheme')}>{el(cbc('ID'), 'VAT')}</{cac('TaxScheme')}></{cac('PartyTaxScheme')}>"
+            f"<{cac('PartyLegalEntity')}>{el(cbc('RegistrationName'), escape(name))}</{cac('PartyLegalEntity')}>"
+            f"</{cac('Party')}></{cac(role)}>"
+        )
+
+    attachment = ""
+    if attachment_kb:
+        # generator separat: liniile rămân aceleași cu sau fără atașament
+        blob = base64.encodebytes(random.Random(seed).randbytes(attachment_kb * 1024)).decode("ascii")
+        pdf_attrs = ' mimeCode="application/pdf" filename="factura.pdf"'
+        attachment = (
+            f"<{cac('AdditionalDocumentReference')}>{el(cbc('ID'), 'factura.pdf')}"
+            f"<{cac('Attachment')}>{el(cbc('EmbeddedDocumentBinaryObject'), blob, pdf_attrs)}"
+            f"</{cac('Attachment')}></{cac('AdditionalDocumentReference')}>"
+        )
+
+    cur = ' currencyID="RON"'
+    body: List[str] = []
+    per_rate = {}
+    for i in range(1, lines + 1):
+        qty   = r.choice((1, 2, 5, 10, 12, 100)) if r.random() < 0.7 else round(r.uniform(0.1, 500), 3)
+        price = round(r.uniform(0.5, 2500), 2)
+        base  = r.choice((1, 1, 1, 10, 100))
+        rate  = r.choice(vat_rates)
+        net   = round(qty * price / base, 2)
+        per_rate[rate] = per_rate.get(rate, 0.0) + net
+        unit_attr = f' unitCode="{r.choice(UNITS)}"'
+        base_el   = el(cbc("BaseQuantity"), base, ' unitCode="H87"') if base != 1 else ""
+        body.append(
+            f"<{cac('InvoiceLine')}>{el(cbc('ID'), i)}"
+            f"{el(cbc('InvoicedQuantity'), qty, unit_attr)}"
+            f"{el(cbc('LineExtensionAmount'), f'{net:.2f}', cur)}"
+            f"<{cac('Item')}>{el(cbc('Name'), escape(_name(r, i, name_len)))}"
+            f"<{cac('ClassifiedTaxCategory')}>{el(cbc('ID'), 'S' if rate else 'Z')}{el(cbc('Percent'), f'{rate:g}')}"
+            f"<{cac('TaxScheme')}>{el(cbc('ID'), 'VAT')}</{cac('TaxScheme')}></{cac('ClassifiedTaxCategory')}></{cac('Item')}>"
+            f"<{cac('Price')}>{el(cbc('PriceAmount'), f'{price:.2f}', cur)}{base_el}</{cac('Price')}>"
+            f"</{cac('InvoiceLine')}>"
+        )
+
+    subtotals = []
+    net_sum = vat_sum = 0.0
+    for rate in sorted(per_rate):
+        taxable = round(per_rate[rate], 2)
+        tax = round(taxable * rate / 100.0, 2)
+        net_sum += taxable
+        vat_sum += tax
+        subtotals.append(
+            f"<{cac('TaxSubtotal')}>{el(cbc('TaxableAmount'), f'{taxable:.2f}', cur)}"
+            f"{el(cbc('TaxAmount'), f'{tax:.2f}', cur)}"
+            f"<{cac('TaxCategory')}>{el(cbc('ID'), 'S' if rate else 'Z')}{el(cbc('Percent'), f'{rate:g}')}"
+            f"<{cac('TaxScheme')}>{el(cbc('ID'), 'VAT')}</{cac('TaxScheme')}></{cac('TaxCategory')}></{cac('TaxSubtotal')}>"
+        )
+    net_sum, vat_sum = round(net_sum, 2), round(vat_sum, 2)
+
+    ns = (f'xmlns="{NS_INVOICE}" xmlns:cac="{NS_CAC}" xmlns:cbc="{NS_CBC}"' if prefixed
+          else f'xmlns="{NS_INVOICE}"')
+    head = (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n<Invoice {ns}>'
+        f"{el(cbc('CustomizationID'), 'urn:cen.eu:en16931:2017#compliant#urn:efactura.mfinante.ro:CIUS-RO:1.0.1')}"
+        f"{el(cbc('ID'), escape(invoice_id or f'SYN-{seed}-{lines}'))}"
+        f"{el(cbc('IssueDate'), '2025-10-31')}{el(cbc('InvoiceTypeCode'), 380)}"
+        f"{el(cbc('DocumentCurrencyCode'), 'RON')}{attachment}"
+        + party("AccountingSupplierParty", "Furnizor Sintetic SRL", "RO1234567", "Cluj-Napoca")
+        + party("AccountingCustomerParty", "Cumpărător Ștefan & Fiii SA", "RO7654321", "Iași")
+        + f"<{cac('TaxTotal')}>{el(cbc('TaxAmount'), f'{vat_sum:.2f}', cur)}{''.join(subtotals)}</{cac('TaxTotal')}>"
+        + f"<{cac('LegalMonetaryTotal')}>{el(cbc('LineExtensionAmount'), f'{net_sum:.2f}', cur)}"
+        f"{el(cbc('TaxExclusiveAmount'), f'{net_sum:.2f}', cur)}"
+        f"{el(cbc('TaxInclusiveAmount'), f'{net_sum + vat_sum:.2f}', cur)}"
+        f"{el(cbc('PayableAmount'), f'{net_sum + vat_sum:.2f}', cur)}</{cac('LegalMonetaryTotal')}>"
+    )
+    return (head + "".join(body) + "</Invoice>").encode("utf-8")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.synth", description="factură UBL sintetică")
+    ap.add_argument("lines", type=int)
+    ap.add_argument("-o", "--out", help="fișier de ieșire (implicit: stdout)")
+    ap.add_argument("--bare", action="store_true", help="fără prefixe cac:/cbc:")
+    ap.add_argument("--name-len", type=int, default=40)
+    ap.add_argument("--vat", default=",".join(f"{v:g}" for v in DEFAULT_VAT_RATES), help="cote TVA, separate prin virgulă")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--attachment-kb", type=int, default=0, help="PDF încorporat (base64) de N KiB")
+    args = ap.parse_args(argv)
+
+    data = generate_invoice(args.lines, prefixed=not args.bare, name_len=args.name_len,
+                            vat_rates=[float(v) for v in args.vat.split(",")], seed=args.seed, attachment_kb=args.attachment_kb)
+    if args.out:
+        with open(args.out, "wb") as f:
+            f.write(data)
+    else:
+        sys.stdout.buffer.write(data)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())